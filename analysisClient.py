@@ -0,0 +1,92 @@
+# file: analysisClient - thin command line client of analysisService
+#   only imports the standard library (no pandas), so a request costs the
+#   python start up plus the analysis itself in the warm service
+#   protocol: one json request line per connection, one json response line
+#
+#   python analysisClient.py analyze "Joe/Loop Report 2019-10-01.md"
+#   python analysisClient.py append "Joe/Loop Report 2019-10-01.md"
+#   python analysisClient.py latest [--append]
+#   python analysisClient.py ping | shutdown
+import os
+import sys
+import json
+import socket
+import argparse
+
+# where analysisService listens: a Unix socket file, or host:port (Windows)
+if hasattr(socket, 'AF_UNIX') and os.name != 'nt':
+    DEFAULT_ADDRESS = os.path.join(os.path.expanduser('~'), '.loopReportAnalysis.sock')
+else:
+    DEFAULT_ADDRESS = '127.0.0.1:48433'
+
+def parseAddress(address):
+    # (family, socket address) for a Unix socket path or host:port
+    host, _, port = address.rpartition(':')
+    if host and port.isdigit():
+        return socket.AF_INET, (host, int(port))
+    return socket.AF_UNIX, address
+
+def sendMessage(stream, message):
+    # write one json line to a socket file
+    stream.write(json.dumps(message).encode('UTF8') + b'\n')
+    stream.flush()
+
+def receiveMessage(stream):
+    # read one json line from a socket file, None if the connection closed
+    line = stream.readline()
+    if not line:
+        return None
+    return json.loads(line.decode('UTF8'))
+
+def request(command, address=DEFAULT_ADDRESS, timeout=None, **arguments):
+    """
+    Send one request to analysisService and return its response dict
+    (response['ok'] False => response['error'] has the traceback)
+    raises OSError if the service is not running
+    """
+    family, socketAddress = parseAddress(address)
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socketAddress)
+        with sock.makefile('rwb') as stream:
+            sendMessage(stream, dict(arguments, command=command))
+            response = receiveMessage(stream)
+    if response is None:
+        return {'ok': False, 'error': 'analysisService closed the connection'}
+    return response
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='client of analysisService')
+    parser.add_argument('command', choices=('analyze', 'append', 'latest', 'ping', 'shutdown'))
+    parser.add_argument('file', nargs='?', help='report, relative to --path')
+    parser.add_argument('--path', help='LoopReportFiles folder (default: the service one)')
+    parser.add_argument('--out', help='master csv for append / latest --append')
+    parser.add_argument('--append', action='store_true', help='latest: append to master csv')
+    parser.add_argument('--address', default=DEFAULT_ADDRESS)
+    args = parser.parse_args(argv)
+    if args.command in ('analyze', 'append') and not args.file:
+        parser.error(args.command + ' needs a file')
+
+    arguments = {x: y for x, y in (('file', args.file), ('path', args.path),
+                                    ('outFile', args.out)) if y}
+    if args.command == 'latest':
+        arguments['append'] = args.append
+    try:
+        response = request(args.command, args.address, **arguments)
+    except OSError as error:
+        print('analysisService is not running at {} ({})'.format(args.address, error),
+              file=sys.stderr)
+        return 2
+    if not response['ok']:
+        print(response['error'], file=sys.stderr)
+        return 1
+    if args.command == 'latest':
+        print('Last Loop Report is {:s}'.format(response['file']))
+    if response.get('output'):
+        sys.stdout.write(response['output'])
+    if args.command == 'ping':
+        print(response['status'])
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
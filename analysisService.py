@@ -0,0 +1,204 @@
+# file: analysisService - long lived analysis service on a local socket
+#   keeps pandas, the parsers and the report list warm between requests, so
+#   runLastLoopReport / whatIsLastReport style requests (see analysisClient)
+#   cost the analysis only, not the imports
+#   connections are handled on threads, the reports are analyzed by a pool
+#   of worker processes (each imports the analysis stack once) and the csv
+#   rows are appended to the master csv by the service, one at a time
+#
+#   python analysisService.py [--address ADDR] [--workers N] [--cache DIR]
+#   requests (json, see analysisClient):
+#       analyze   file [path]           -> output (printed report), csvRow
+#       append    file [path] [outFile] -> same, csvRow appended to outFile
+#       latest    [path] [append] [outFile] -> file, output, csvRow of the last report
+#       ping, shutdown
+import io
+import os
+import socket
+import argparse
+import threading
+import contextlib
+import traceback
+import socketserver
+from concurrent.futures import ProcessPoolExecutor
+
+from analysisClient import DEFAULT_ADDRESS, parseAddress, sendMessage, receiveMessage
+from analyzeMessageLogsRev3 import analyzeLoopReport, writeCsvRows
+from followLoopReport import followLoopReport
+from get_file_list import get_report_list
+from getAnalysisIO import getAnalysisIO
+from reportCache import ReportCache
+
+# ReportCache of each worker process (see _initWorker)
+_workerCache = None
+
+def _initWorker(cacheDir, cacheMaxBytes):
+    global _workerCache
+    if cacheDir:
+        _workerCache = ReportCache(cacheDir, cacheMaxBytes)
+
+def _analyzeInWorker(thisPath, thisFile, checkpointDir):
+    # (printed report, csvRow) of one report, runs in a worker process
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        if checkpointDir:
+            csvRow = followLoopReport(thisPath, thisFile, True, checkpointDir,
+                                      cache=_workerCache)[3]
+        else:
+            csvRow = analyzeLoopReport(thisPath, thisFile, True, cache=_workerCache)[4]
+    return output.getvalue(), csvRow
+
+class AnalysisService:
+    """
+    Request handling of the service, without the socket:
+
+        service = AnalysisService(numWorkers=2)
+        response = service.handle({'command': 'analyze', 'file': thisFile})
+        service.close()
+
+    filePath, outFile    defaults for requests without path / outFile
+                         (None => getAnalysisIO(1,1))
+    cacheDir             ReportCache folder for the workers (optional)
+    checkpointDir        'latest' continues from the followLoopReport
+                         checkpoint of the pod, as runLastLoopReport (optional)
+    listSnapshotFile     get_report_list snapshot for 'latest' (optional)
+    """
+    def __init__(self, numWorkers=2, filePath=None, outFile=None, cacheDir=None,
+                 cacheMaxBytes=500e6, checkpointDir=None, listSnapshotFile=None):
+        if filePath is None or outFile is None:
+            defaultPath, defaultOut = getAnalysisIO(1,1)
+            filePath = defaultPath if filePath is None else filePath
+            outFile = defaultOut if outFile is None else outFile
+        self.filePath = filePath
+        self.outFile = outFile
+        self.checkpointDir = checkpointDir
+        self.listSnapshotFile = listSnapshotFile
+        self.writeLock = threading.Lock()
+        self.listLock = threading.Lock()
+        self.pool = ProcessPoolExecutor(max_workers=numWorkers, initializer=_initWorker,
+                                        initargs=(cacheDir, cacheMaxBytes))
+        # start every worker now, so the first request does not pay for the imports
+        for future in [self.pool.submit(os.getpid) for _ in range(numWorkers)]:
+            future.result()
+
+    def analyze(self, thisPath, thisFile, checkpointDir=None):
+        return self.pool.submit(_analyzeInWorker, thisPath, thisFile, checkpointDir).result()
+
+    def appendRow(self, outFile, csvRow):
+        # rows of concurrent requests are appended one at a time
+        with self.writeLock:
+            writeCsvRows(outFile, [csvRow])
+
+    def getLatest(self, thisPath):
+        # filename of the most recent report in thisPath
+        with self.listLock:
+            reportList = get_report_list(thisPath, snapshotFile=self.listSnapshotFile)
+        if not reportList:
+            raise FileNotFoundError('no reports in ' + thisPath)
+        return reportList[-1].filename
+
+    def handle(self, message):
+        """
+        Response dict for a request dict: {'ok': True, ...} or
+        {'ok': False, 'error': traceback string}
+        """
+        try:
+            command = message.get('command')
+            thisPath = message.get('path') or self.filePath
+            outFile = message.get('outFile') or self.outFile
+            if command == 'ping':
+                return {'ok': True, 'status': 'analysisService pid {:d}'.format(os.getpid())}
+            if command in ('analyze', 'append'):
+                thisFile = message['file']
+                output, csvRow = self.analyze(thisPath, thisFile)
+                if command == 'append':
+                    self.appendRow(outFile, csvRow)
+                return {'ok': True, 'file': thisFile, 'output': output, 'csvRow': csvRow}
+            if command == 'latest':
+                thisFile = self.getLatest(thisPath)
+                output, csvRow = self.analyze(thisPath, thisFile, self.checkpointDir)
+                if message.get('append') and csvRow:
+                    self.appendRow(outFile, csvRow)
+                return {'ok': True, 'file': thisFile, 'output': output, 'csvRow': csvRow}
+            return {'ok': False, 'error': 'unknown command {!r}'.format(command)}
+        except Exception:
+            return {'ok': False, 'error': traceback.format_exc()}
+
+    def close(self):
+        self.pool.shutdown()
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        message = receiveMessage(self.rfile)
+        if message is None:
+            return
+        if message.get('command') == 'shutdown':
+            sendMessage(self.wfile, {'ok': True})
+            # shutdown waits for serve_forever, so not from this thread
+            threading.Thread(target=self.server.shutdown).start()
+            return
+        sendMessage(self.wfile, self.server.service.handle(message))
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+def _isListening(family, socketAddress):
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socketAddress)
+        except OSError:
+            return False
+    return True
+
+def serveAnalysis(address=DEFAULT_ADDRESS, **serviceArguments):
+    """
+    Purpose: run the analysis service until a shutdown request (or Ctrl-C)
+
+    Input:
+        address             Unix socket file or host:port (see analysisClient)
+        serviceArguments    numWorkers, filePath, outFile, cacheDir,
+                            checkpointDir, listSnapshotFile (see AnalysisService)
+    """
+    family, socketAddress = parseAddress(address)
+    if _isListening(family, socketAddress):
+        raise OSError('an analysisService is already running at ' + address)
+    if family == socket.AF_INET:
+        server = _TCPServer(socketAddress, _RequestHandler)
+    else:
+        # left over from a service that did not exit cleanly
+        if os.path.exists(socketAddress):
+            os.remove(socketAddress)
+        server = _UnixServer(socketAddress, _RequestHandler)
+    server.service = AnalysisService(**serviceArguments)
+    print('analysisService listening at', address, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.close()
+        if family != socket.AF_INET and os.path.exists(socketAddress):
+            os.remove(socketAddress)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='warm Loop Report analysis service')
+    parser.add_argument('--address', default=DEFAULT_ADDRESS)
+    parser.add_argument('--workers', type=int, default=2, help='worker processes')
+    parser.add_argument('--path', help='LoopReportFiles folder (default: getAnalysisIO)')
+    parser.add_argument('--out', help='master csv (default: getAnalysisIO)')
+    parser.add_argument('--cache', help='ReportCache folder')
+    parser.add_argument('--checkpoints', help='followLoopReport checkpoint folder for latest')
+    parser.add_argument('--snapshot', help='get_report_list snapshot file for latest')
+    args = parser.parse_args(argv)
+    serveAnalysis(args.address, numWorkers=args.workers, filePath=args.path,
+                  outFile=args.out, cacheDir=args.cache, checkpointDir=args.checkpoints,
+                  listSnapshotFile=args.snapshot)
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,166 @@
+from collections import namedtuple
+
 import pandas as pd
 from messageLogs_functions import *
 from byteUtils import *
 from podStateAnalysis import *
 from messagePatternParsing import *
 from checkAction import *
+from stageRecorder import *
+from reportCache import hashReport
+
+# column headers for the csv file (outFile)
+CSV_HEADER = 'Who, finish State, Finish2, lastMsg Date, podOn (hrs), radioOn (hrs), radioOn (%), ' + \
+   '#Messages, #Completed, % Completed, #Send, #Recv, ' + \
+   '#Nonce Resync, #TB, #Bolus, ' \
+   '#Basal, #Status Check, ' + \
+   '#Schedule Before TempBasal, #TB Spaced <30s, ' + \
+   '#Repeat TB Value, #Repeat TB <30s, ' + \
+   ' #RepTB 30s to 19min, #incomplete TB, ' + \
+   'insulin Delivered, # Initialize Cmds, # AssignID (0x07), ' + \
+   '# SetUpPod (0x03), Pod Lot, PI Version, PM Version, ' + \
+   'raw fault, filename'
+
+# values of one csv row, in CSV_HEADER order (see getSummaryRecord)
+SummaryRecord = namedtuple('SummaryRecord', ('thisPerson', 'thisFinish', 'thisFinish2',
+    'lastDate', 'msgLogHrs', 'radioOnHrs', 'number_of_messages', 'totalCompletedMessages',
+    'percentCompleted', 'numberOfSend', 'numberOfRecv', 'numberOfNonceResync', 'numberOfTB',
+    'numberOfBolus', 'numberOfBasal', 'numberOfStatusRequests',
+    'numberScheduleBeforeTempBasal', 'numberTBSepLessThan30sec', 'numRepeatedTB',
+    'numRepeatedShortTB', 'numrepeated19MinTB', 'numIncomplCancelTB', 'insulinDelivered',
+    'numberOfInitCmds', 'numberOfAssignID', 'numberOfSetUpPod', 'lot', 'piVersion',
+    'pmVersion', 'rawFault', 'filename'))
+
+# a report with the action instances and fault details, used by resultsDatabase
+#   and reportManifest (see summarizeLoopReport and analyzeLoopReport withDetails)
+#   reportHash    sha256 of the report file
+#   actionTable   actionFrame columns (see matchActionColumns), by podState position
+ReportResult = namedtuple('ReportResult', ('reportHash', 'podDict', 'summaryRecord',
+                                           'actionTable', 'faultProcessedMsg'))
+
+def _countFrom(actionSummary, actionName, key):
+    # actionSummary[actionName][key], 0 if that action never completed
+    subDict = actionSummary.get(actionName)
+    if subDict:
+        return subDict[key]
+    return 0
+
+def getSummaryRecord(thisFile, podDict, reportStats, actionSummary, totalCompletedMessages,
+                     numberOfInitCmds):
+    """
+    Purpose: the values of the csv row for one report (no printing)
+
+    Input:
+        thisFile                 report filename (person, finish and antenna)
+        podDict                  from read_file
+        reportStats              see getReportStats
+        actionSummary, totalCompletedMessages    from processActionFrame
+        numberOfInitCmds         number of messages used to initialize the pod
+
+    Output:
+        SummaryRecord, formatCsvRow turns it into the csv row
+    """
+    thisPerson, thisFinish, thisAntenna = parse_info_from_filename(thisFile)
+    thisFinish2 = 'Success' # default is 'Success'
+    if thisFinish == 'WIP':
+        thisFinish2 = 'WIP'  # pod is still running
+
+    insulinDelivered = getUnitsFromPulses(reportStats['insulinPulses'])
+    faultProcessedMsg = reportStats['faultProcessedMsg']
+    rawFault = 'n/a'
+    if len(faultProcessedMsg):
+        # special handling if an 0x02 messages aka fault was received
+        thisFinish = faultProcessedMsg['logged_fault']
+        thisFinish2 = 'Success' if thisFinish in ('0x1C', '0x18') else 'Fault'
+        rawFault = faultProcessedMsg['raw_value']
+        if faultProcessedMsg['insulinDelivered'] >= insulinDelivered:
+            insulinDelivered = faultProcessedMsg['insulinDelivered']
 
-def analyzeMessageLogsRev3(thisPath, thisFile, outFile):
+    number_of_messages = reportStats['number_of_messages']
+    send_receive_commands = np.asarray(reportStats['send_receive_commands'])
+    return SummaryRecord(
+        thisPerson=thisPerson, thisFinish=thisFinish, thisFinish2=thisFinish2,
+        lastDate=reportStats['last_command'].date(),
+        msgLogHrs=reportStats['msgLogHrs'], radioOnHrs=reportStats['radioOnHrs'],
+        number_of_messages=number_of_messages,
+        totalCompletedMessages=totalCompletedMessages,
+        percentCompleted=100*totalCompletedMessages/number_of_messages,
+        numberOfSend=send_receive_commands[1], numberOfRecv=send_receive_commands[0],
+        numberOfNonceResync=reportStats['numberOfNonceResync'],
+        numberOfTB=_countFrom(actionSummary, 'TB', 'countCompleted'),
+        numberOfBolus=_countFrom(actionSummary, 'Bolus', 'countCompleted'),
+        numberOfBasal=_countFrom(actionSummary, 'Basal', 'countCompleted'),
+        numberOfStatusRequests=_countFrom(actionSummary, 'StatusCheck', 'countCompleted'),
+        numberScheduleBeforeTempBasal=_countFrom(actionSummary, 'TB', 'numSchBasalbeforeTB'),
+        numberTBSepLessThan30sec=_countFrom(actionSummary, 'TB', 'numShortTB'),
+        numRepeatedTB=_countFrom(actionSummary, 'TB', 'numRepeatedTB'),
+        numRepeatedShortTB=_countFrom(actionSummary, 'TB', 'numRepeatedShortTB'),
+        numrepeated19MinTB=_countFrom(actionSummary, 'TB', 'numrepeated19MinTB'),
+        numIncomplCancelTB=_countFrom(actionSummary, 'CancelTB', 'countIncomplete'),
+        insulinDelivered=insulinDelivered,
+        numberOfInitCmds=numberOfInitCmds,
+        numberOfAssignID=reportStats['numberOfAssignID'],
+        numberOfSetUpPod=reportStats['numberOfSetUpPod'],
+        lot=podDict['lot'], piVersion=podDict['piVersion'], pmVersion=podDict['pmVersion'],
+        rawFault=rawFault, filename=thisFile)
+
+def formatCsvRow(record):
+    # build the information for csv (don't want extra spaces for this )
+    r = record
+    csvRow = f'{r.thisPerson},{r.thisFinish},{r.thisFinish2},{r.lastDate},' + \
+        '{:.1f},'.format(r.msgLogHrs) + \
+        '{:.2f},'.format(r.radioOnHrs) + \
+        '{:.2f},'.format(100*r.radioOnHrs/r.msgLogHrs) + \
+        '{:d},'.format(r.number_of_messages) + \
+        f'{r.totalCompletedMessages},' + \
+        '{:.2f},'.format(r.percentCompleted) + \
+        f'{r.numberOfSend},{r.numberOfRecv},' + \
+        f'{r.numberOfNonceResync},{r.numberOfTB},{r.numberOfBolus},{r.numberOfBasal},' + \
+        f'{r.numberOfStatusRequests},{r.numberScheduleBeforeTempBasal},' + \
+        f'{r.numberTBSepLessThan30sec},{r.numRepeatedTB},{r.numRepeatedShortTB},' + \
+        f'{r.numrepeated19MinTB},{r.numIncomplCancelTB},' + \
+        '{:.2f},'.format(r.insulinDelivered) + \
+        '{:d}, {:d}, {:d},'.format(r.numberOfInitCmds, r.numberOfAssignID, r.numberOfSetUpPod) + \
+        '{:s}, {:s}, {:s},'.format(r.lot, r.piVersion, r.pmVersion) + \
+        f'{r.rawFault},{r.filename}'
+    return csvRow
+
+def writeCsvRows(outFile, csvRows):
+    # append rows to outFile (csv format), write the header first if new file
+    isItThere = os.path.isfile(outFile)
+    stream_out = open(outFile, mode='at')
+    if not isItThere:
+        stream_out.write(CSV_HEADER)
+        stream_out.write('\n')
+    for csvRow in csvRows:
+        stream_out.write(csvRow)
+        stream_out.write('\n')
+    stream_out.close()
+
+def analyzeMessageLogsRev3(thisPath, thisFile, outFile, recorder=NULL_RECORDER, cache=None,
+                           compact=False, withDetails=False):
+    # if an output filename is provided - write statistics to it (csv format)
+    # recorder (a StageRecorder) collects timing and memory for every stage
+    # cache (a ReportCache) replaces read_file when provided
+    # compact True returns podState in the compact schema (see compactPodState)
+    # withDetails True => also return the ReportResult (for a ResultsDatabase)
+    result = analyzeLoopReport(thisPath, thisFile, outFile, recorder, cache, compact,
+                               withDetails)
+    csvRow = result[4]
+    if csvRow:
+        with recorder.stage('writeCsv') as record:
+            writeCsvRows(outFile, [csvRow])
+            record['rows'] = 1
+    return result[:4] + result[5:]
+
+def analyzeLoopReport(thisPath, thisFile, outFile, recorder=NULL_RECORDER, cache=None,
+                      compact=False, withDetails=False):
+    # Same as analyzeMessageLogsRev3 but the csv row is returned, not written
+    #   csvRow is None unless outFile is a filename
+    #   (used by the batch runners so workers never touch outFile)
+    #   compact True => podState in the compact schema, same report and csvRow
+    #   withDetails True => the ReportResult is returned after csvRow (same as
+    #     summarizeLoopReport(..., withDetails=True), without a second analysis)
     # Rev3 uses the new checkAction code
     #  this replaces code used by New (rev2)
     #       deprecated: getPodSuccessfulActions
@@ -15,9 +170,15 @@ def analyzeMessageLogsRev3(thisPath, thisFile, outFile):
     radio_on_time   = 30
 
     filename = thisPath + '/' + thisFile
+    recorder.startReport(thisFile)
 
     # read the MessageLogs from the file
-    commands, podDict = read_file(filename)
+    with recorder.stage('read_file') as record:
+        if cache:
+            commands, podDict = cache.read_file(filename)
+        else:
+            commands, podDict = read_file(filename)
+        record['rows'] = len(commands)
 
     # add quick and dirty fix for new Issue Reports (Aug 2019)
     tempRaw = commands[-1]['raw_value']
@@ -25,57 +186,100 @@ def analyzeMessageLogsRev3(thisPath, thisFile, outFile):
     commands[-1]['raw_value'] = lastRaw
 
     # add more stuff and return as a DataFrame
-    df = generate_table(commands, radio_on_time)
-
-    # set up a few reportable values here from df, time is in UTC
-    first_command = df.iloc[0]['time']
-    last_command = df.iloc[-1]['time']
-    send_receive_commands = df.groupby(['type']).size()
-    number_of_messages = len(df)
-    thisPerson, thisFinish, thisAntenna = parse_info_from_filename(thisFile)
-    thisFinish2 = 'Success' # default is 'Success'
-    if thisFinish == 'WIP':
-        thisFinish2 = 'WIP'  # pod is still running
-
-    lastDate = last_command.date()
+    with recorder.stage('generate_table') as record:
+        df = generate_table(commands, radio_on_time)
+        record['rows'] = len(df)
 
     # Process df to generate the podState associated with every message
     #   Updates to states occur with pod message (mostly 1d) status
     #     (the state for extended_bolus_active is NOT included (always False))
     #   Includes values for requested bolus and TB
     # Note that .iloc for df and podState are identical
-    podState, emptyMessageList, faultProcessedMsg = getPodState(df)
-
-    # From the podState, extract some values to use in reports
-    msgLogHrs = podState.iloc[-1]['timeCumSec']/3600
-    radioOnHrs = podState.iloc[-1]['radioOnCumSec']/3600
-    numberOfAssignID = len(podState[podState.message_type=='0x7'])
-    numberOfSetUpPod = len(podState[podState.message_type=='0x3'])
-    numberOfNonceResync = len(podState[podState.message_type=='06'])
-    insulinDelivered = podState.iloc[-1]['insulinDelivered']
+    with recorder.stage('getPodState') as record:
+        podState, emptyMessageList, faultProcessedMsg = getPodState(df, compact=compact)
+        record['rows'] = len(podState)
+
+    # From df and the podState, extract some values to use in reports
+    reportStats = getReportStats(df, podState, emptyMessageList, faultProcessedMsg)
+
+    # checkAction returns actionFrame with indices and times for every action
+    #     one row per action instance, completed or incomplete
+    #     see also function getActionDict
+    #   actionFrame  dataframe of processed analysis from podState (by action)
+    #   initIdx      indices in podState to extract pod initilization
+    with recorder.stage('checkAction') as record:
+        actionFrame, initIdx = checkAction(podState)
+        record['rows'] = len(actionFrame)
+
+    summary = reportSummary(thisFile, outFile, podDict, reportStats, actionFrame, initIdx,
+                            podState, recorder, withDetails)
+    if not withDetails:
+        actionSummary, csvRow = summary
+        return df, podState, actionFrame, actionSummary, csvRow
+    actionSummary, csvRow, summaryRecord = summary
+    actionTable = {x: actionFrame[x].to_numpy() for x in actionColumnNames[1:]}
+    reportResult = ReportResult(hashReport(filename), podDict, summaryRecord, actionTable,
+                                faultProcessedMsg)
+    return df, podState, actionFrame, actionSummary, csvRow, reportResult
+
+def getReportStats(df, podState, emptyMessageList, faultProcessedMsg):
+    """
+    Purpose: the reportable values that come from df and podState
+
+    Output:
+        dict with first_command, last_command (UTC), send_receive_commands
+        (number of messages by type), number_of_messages, msgLogHrs,
+        radioOnHrs, numberOfAssignID, numberOfSetUpPod, numberOfNonceResync,
+        insulinPulses (last 1d), emptyMessageList and faultProcessedMsg
+    """
+    reportStats = {
+        'first_command': df.iloc[0]['time'],
+        'last_command': df.iloc[-1]['time'],
+        'send_receive_commands': df.groupby(['type']).size(),
+        'number_of_messages': len(df),
+        'msgLogHrs': podState.iloc[-1]['timeCumSec']/3600,
+        'radioOnHrs': podState.iloc[-1]['radioOnCumSec']/3600,
+        'numberOfAssignID': len(podState[podState.message_type=='0x7']),
+        'numberOfSetUpPod': len(podState[podState.message_type=='0x3']),
+        'numberOfNonceResync': len(podState[podState.message_type=='06']),
+        'insulinPulses': int(podState['insulinPulses'].iloc[-1]),
+        'emptyMessageList': emptyMessageList,
+        'faultProcessedMsg': faultProcessedMsg}
+    return reportStats
+
+def reportSummary(thisFile, outFile, podDict, reportStats, actionFrame, initIdx, podState,
+                  recorder=NULL_RECORDER, withRecord=False):
+    # print the summary for one report and build its csv row
+    #   podState is only used by processActionFrame (reqTBTenthPulses at the TB actions)
+    #   returns actionSummary, csvRow (None unless outFile is a filename)
+    #   withRecord True => also returns the SummaryRecord (None if outFile == 2)
+    first_command = reportStats['first_command']
+    last_command = reportStats['last_command']
+    number_of_messages = reportStats['number_of_messages']
+    msgLogHrs = reportStats['msgLogHrs']
+    radioOnHrs = reportStats['radioOnHrs']
+    numberOfAssignID = reportStats['numberOfAssignID']
+    numberOfSetUpPod = reportStats['numberOfSetUpPod']
+    numberOfNonceResync = reportStats['numberOfNonceResync']
+    insulinDelivered = getUnitsFromPulses(reportStats['insulinPulses'])
+    emptyMessageList = reportStats['emptyMessageList']
+    faultProcessedMsg = reportStats['faultProcessedMsg']
     sourceString = 'from last 0x1d'
 
+    thisPerson, thisFinish, thisAntenna = parse_info_from_filename(thisFile)
+
     # special handling if an 0x02 messages aka fault was received
     if len(faultProcessedMsg):
         hasFault = True
         thisFault = faultProcessedMsg['logged_fault']
         checkInsulin = faultProcessedMsg['insulinDelivered']
-        rawFault = faultProcessedMsg['raw_value']
         if checkInsulin >= insulinDelivered:
             insulinDelivered = checkInsulin
             sourceString = 'from 0x02 msg'
     else:
         hasFault = False
-        rawFault = 'n/a'
         thisFault = thisFinish
 
-    # checkAction returns actionFrame with indices and times for every action
-    #     completed actions and incomplete requests are separate columns
-    #     see also function getActionDict
-    #   actionFrame  dataframe of processed analysis from podState (by action)
-    #   initIdx      indices in podState to extract pod initilization
-    actionFrame, initIdx = checkAction(podState)
-
     if outFile == 2:
         # print a few things then returns
         lot = podDict['lot']
@@ -83,7 +287,7 @@ def analyzeMessageLogsRev3(thisPath, thisFile, outFile):
         piv = podDict['piVersion']
         print(f'{thisPerson},{thisAntenna},{thisFault},{first_command},{last_command},{msgLogHrs},{lot},{tid},{piv}')
         actionSummary = []
-        return df, podState, actionFrame, actionSummary
+        return (actionSummary, None, None) if withRecord else (actionSummary, None)
 
     if True:
         # print out summary information to command window
@@ -100,14 +304,10 @@ def analyzeMessageLogsRev3(thisPath, thisFile, outFile):
         print('        Number of nonce resyncs   : {:6d}'.format(numberOfNonceResync))
         print('        Insulin delivered (u)     : {:6.2f} ({:s})'.format(insulinDelivered, sourceString))
         if hasFault:
-            thisFinish = thisFault
-            thisFinish2 = 'Fault'
             if thisFault == '0x1C':
                 print('    An 0x0202 message of {:s} reported - 80 hour time limit'.format(thisFault))
-                thisFinish2 = 'Success'
             elif thisFault == '0x18':
                 print('    An 0x0202 message of {:s} reported - out of insulin'.format(thisFault))
-                thisFinish2 = 'Success'
             elif thisFault == '0x34':
                 print('    An 0x0202 message of {:s} reported - this wipes out registers'.format(thisFault))
             else:
@@ -119,7 +319,9 @@ def analyzeMessageLogsRev3(thisPath, thisFile, outFile):
             print('    ***  indices:', emptyMessageList)
 
         # process the action frame (returns a dictionary plus total completed message count)
-        actionSummary, totalCompletedMessages = processActionFrame(actionFrame, podState)
+        with recorder.stage('processActionFrame') as record:
+            actionSummary, totalCompletedMessages = processActionFrame(actionFrame, podState)
+            record['rows'] = len(actionSummary)
         printActionSummary(actionSummary)
 
         percentCompleted = 100*totalCompletedMessages/number_of_messages
@@ -130,87 +332,15 @@ def analyzeMessageLogsRev3(thisPath, thisFile, outFile):
         print('\nFault Details')
         printDict(faultProcessedMsg)
 
-    # if an output filename is provided - write statistics to it (csv format)
+    csvRow = None
+    summaryRecord = None
+    # if an output filename is provided - build the statistics row (csv format)
+    if outFile or withRecord:
+        summaryRecord = getSummaryRecord(thisFile, podDict, reportStats, actionSummary,
+                                         totalCompletedMessages, len(initIdx))
     if outFile:
-        # check if file exists
-        isItThere = os.path.isfile(outFile)
-
-        # now open the file
-        stream_out = open(outFile,mode='at')
-
-        # write the column headers if this is a new file
-        if not isItThere:
-            # set up a table format order
-            headerString = 'Who, finish State, Finish2, lastMsg Date, podOn (hrs), radioOn (hrs), radioOn (%), ' + \
-               '#Messages, #Completed, % Completed, #Send, #Recv, ' + \
-               '#Nonce Resync, #TB, #Bolus, ' \
-               '#Basal, #Status Check, ' + \
-               '#Schedule Before TempBasal, #TB Spaced <30s, ' + \
-               '#Repeat TB Value, #Repeat TB <30s, ' + \
-               ' #RepTB 30s to 19min, #incomplete TB, ' + \
-               'insulin Delivered, # Initialize Cmds, # AssignID (0x07), ' + \
-               '# SetUpPod (0x03), Pod Lot, PI Version, PM Version, ' + \
-               'raw fault, filename'
-            stream_out.write(headerString)
-            stream_out.write('\n')
-
-        # Extract items from actionSummary
-        if actionSummary.get('TB'):
-            subDict = actionSummary.get('TB')
-            numberOfTB = subDict['countCompleted']
-            numberScheduleBeforeTempBasal = subDict['numSchBasalbeforeTB']
-            numberTBSepLessThan30sec = subDict['numShortTB']
-            numRepeatedTB = subDict['numRepeatedTB']
-            numRepeatedShortTB = subDict['numRepeatedShortTB']
-            numrepeated19MinTB = subDict['numrepeated19MinTB']
-        else:
-            numberOfTB = 0
-            numberScheduleBeforeTempBasal = 0
-            numberTBSepLessThan30sec = 0
-            numRepeatedTB = 0
-
-        if actionSummary.get('Bolus'):
-            subDict = actionSummary.get('Bolus')
-            numberOfBolus = subDict['countCompleted']
-        else:
-            numberOfBolus = 0
-
-        if actionSummary.get('Basal'):
-            subDict = actionSummary.get('Basal')
-            numberOfBasal = subDict['countCompleted']
-        else:
-            numberOfBasal = 0
-
-        if actionSummary.get('StatusCheck'):
-            subDict = actionSummary.get('StatusCheck')
-            numberOfStatusRequests = subDict['countCompleted']
-        else:
-            numberOfStatusRequests = 0
-
-        if actionSummary.get('CancelTB'):
-            subDict = actionSummary.get('CancelTB')
-            numIncomplCancelTB = subDict['countIncomplete']
-        else:
-            numIncomplCancelTB = 0
-
-        # write out the information for csv (don't want extra spaces for this )
-        stream_out.write(f'{thisPerson},{thisFinish},{thisFinish2},{lastDate},')
-        stream_out.write('{:.1f},'.format(msgLogHrs))
-        stream_out.write('{:.2f},'.format(radioOnHrs))
-        stream_out.write('{:.2f},'.format(100*radioOnHrs/msgLogHrs))
-        stream_out.write('{:d},'.format(number_of_messages))
-        stream_out.write(f'{totalCompletedMessages},')
-        stream_out.write('{:.2f},'.format(percentCompleted))
-        stream_out.write(f'{send_receive_commands[1]},{send_receive_commands[0]},')
-        stream_out.write(f'{numberOfNonceResync},{numberOfTB},{numberOfBolus},{numberOfBasal},')
-        stream_out.write(f'{numberOfStatusRequests},{numberScheduleBeforeTempBasal},')
-        stream_out.write(f'{numberTBSepLessThan30sec},{numRepeatedTB},{numRepeatedShortTB},')
-        stream_out.write(f'{numrepeated19MinTB},{numIncomplCancelTB},')
-        stream_out.write('{:.2f},'.format(insulinDelivered))
-        stream_out.write('{:d}, {:d}, {:d},'.format(len(initIdx), numberOfAssignID, numberOfSetUpPod))
-        stream_out.write('{:s}, {:s}, {:s},'.format(podDict['lot'], podDict['piVersion'], podDict['pmVersion']))
-        stream_out.write(f'{rawFault},{thisFile}')
-        stream_out.write('\n')
-        stream_out.close()
+        csvRow = formatCsvRow(summaryRecord)
 
-    return df, podState, actionFrame, actionSummary
+    if withRecord:
+        return actionSummary, csvRow, summaryRecord
+    return actionSummary, csvRow
@@ -0,0 +1,121 @@
+# file: asyncPipeline - overlap report reads from slow storage with the analysis
+#   read stage      readConcurrency files read at a time (threads, file I/O blocks)
+#   queue           at most queueSize reports read and waiting for the analysis,
+#                   a full queue stops the reads (memory stays flat)
+#   process stage   processItem(item, data) on an executor, numProcessors at a time
+#   write stage     writeResult(index, item, result) in item order
+#   used by analyzeBatch(..., readConcurrency=N)
+import time
+import asyncio
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+def readReportBytes(filename):
+    # contents of a report
+    with open(filename, 'rb') as stream_in:
+        return stream_in.read()
+
+class ThrottledReader:
+    """
+    Stand-in for slow storage (e.g., a network share), for benchmarks: reads
+    like readReportBytes but each file takes at least latency seconds plus
+    size / bytesPerSec. Can be sent to worker processes.
+    """
+    def __init__(self, bytesPerSec, latency=0.0):
+        self.bytesPerSec = bytesPerSec
+        self.latency = latency
+
+    def __call__(self, filename):
+        startTime = time.perf_counter()
+        data = readReportBytes(filename)
+        delay = self.latency + len(data) / self.bytesPerSec - (time.perf_counter() - startTime)
+        if delay > 0:
+            time.sleep(delay)
+        return data
+
+def _raiseError(item, errorString):
+    raise RuntimeError('{}:\n{}'.format(item, errorString))
+
+async def _runStages(items, readItem, processItem, writeResult, readConcurrency,
+                     queueSize, executor, numProcessors, onError):
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=queueSize)
+    readSlots = asyncio.Semaphore(readConcurrency)
+    results = {}
+    nextToWrite = 0
+
+    async def readOne(index, item, readPool):
+        try:
+            data = await loop.run_in_executor(readPool, readItem, item)
+            entry = (index, item, data, None)
+        except Exception:
+            entry = (index, item, None, traceback.format_exc())
+        # waits here while the queue is full, holding the read slot
+        await queue.put(entry)
+        readSlots.release()
+
+    async def readAll(readPool):
+        readTasks = []
+        for index, item in enumerate(items):
+            await readSlots.acquire()
+            readTasks.append(asyncio.ensure_future(readOne(index, item, readPool)))
+        await asyncio.gather(*readTasks)
+        for _ in range(numProcessors):
+            await queue.put(None)
+
+    async def processAll():
+        nonlocal nextToWrite
+        while True:
+            entry = await queue.get()
+            if entry is None:
+                return
+            index, item, data, errorString = entry
+            entry = None
+            if errorString is None:
+                try:
+                    result = await loop.run_in_executor(executor, processItem, item, data)
+                except Exception:
+                    result = onError(item, traceback.format_exc())
+            else:
+                result = onError(item, errorString)
+            data = None
+            # write every result that has no unfinished item in front of it
+            results[index] = result
+            while nextToWrite in results:
+                writeResult(nextToWrite, items[nextToWrite], results.pop(nextToWrite))
+                nextToWrite += 1
+
+    with ThreadPoolExecutor(max_workers=readConcurrency) as readPool:
+        await asyncio.gather(readAll(readPool), *[processAll() for _ in range(numProcessors)])
+
+def runPipeline(items, readItem, processItem, writeResult, readConcurrency=4, queueSize=8,
+                executor=None, numProcessors=1, onError=None):
+    """
+    Purpose: read, process and write every item, the reads overlap the processing
+
+    Input:
+        items            list of items (e.g., report filenames)
+        readItem         readItem(item) -> data, blocking I/O (run on threads)
+        processItem      processItem(item, data) -> result, run on executor
+                         (must be picklable for a ProcessPoolExecutor)
+        writeResult      writeResult(index, item, result), called in item order
+        readConcurrency  number of reads at a time
+        queueSize        number of items read and waiting to be processed
+        executor         concurrent.futures executor for processItem, None =>
+                         a thread pool of numProcessors threads
+        numProcessors    number of items processed at a time (e.g., the number
+                         of worker processes of executor)
+        onError          onError(item, traceback string) -> result for an item
+                         whose read or process raised, None => raise
+
+    At most readConcurrency + queueSize + numProcessors items are held in
+    memory at once, whatever the number of items.
+    """
+    onError = onError or _raiseError
+    if executor is None:
+        with ThreadPoolExecutor(max_workers=numProcessors) as threadPool:
+            asyncio.run(_runStages(items, readItem, processItem, writeResult, readConcurrency,
+                                   queueSize, threadPool, numProcessors, onError))
+    else:
+        asyncio.run(_runStages(items, readItem, processItem, writeResult, readConcurrency,
+                               queueSize, executor, numProcessors, onError))
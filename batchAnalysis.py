@@ -0,0 +1,209 @@
+# file: batchAnalysis - run many Loop Reports through summarizeLoopReport
+#   reports are spread across a pool of worker processes, each worker returns
+#   its csv row and the parent writes them in the order of fileDateList, so
+#   outFile is byte-identical to running the reports one at a time
+import os
+import sys
+import time
+import contextlib
+import functools
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from analyzeMessageLogsRev3 import formatCsvRow, writeCsvRows
+from summaryAnalysis import summarizeLoopReport
+from messageLake import writeLakeReport
+from messageLogs_functions import parse_info_from_filename
+from get_file_list import ReportEntry
+from asyncPipeline import runPipeline, readReportBytes
+from stageRecorder import StageRecorder, NULL_RECORDER
+
+def select433Reports(fileDateList):
+    """
+    Return the list of filenames (in fileDateList order) to be processed
+    by runAll433_Rev3, skipping any report with a non-433Mhz antenna
+    fileDateList rows are (filename, mtime) from get_file_list or ReportEntry
+    from get_report_list (antenna already parsed)
+    """
+    fileList = []
+    for row in fileDateList:
+        thisFile = row[0]
+        if isinstance(row, ReportEntry):
+            thisAntenna = row.antenna
+        else:
+            (thisPerson, thisFinish, thisAntenna) = parse_info_from_filename(thisFile)
+        if thisAntenna != '433Mhz':
+            print('    Skipping : ', thisFile)
+            continue
+        fileList.append(thisFile)
+    return fileList
+
+def analyzeReportRow(thisPath, thisFile, outFile, recordStages=None, cache=None,
+                     withDetails=False, lakeDir=None, data=None, readReport=None):
+    """
+    Worker for analyzeBatch: the csv row of one report from the summary-only
+    analysis (summarizeLoopReport), no report is printed
+
+    recordStages None => no instrumentation, otherwise the traceMemory
+    setting for a StageRecorder whose records are returned
+    cache None => parse the report, otherwise a ReportCache
+    withDetails True => also return the ReportResult (for a ResultsDatabase)
+    lakeDir None => no Parquet export, otherwise writeLakeReport to that folder
+    data None => read the report, otherwise its contents (bytes)
+    readReport None => read_file, otherwise data = readReport(filename)
+
+    Returns:
+        (csvRow, None, records, reportResult) on success or
+        (None, traceback string, records, None) on failure
+        reportResult is None unless withDetails
+    """
+    if recordStages is None:
+        recorder = NULL_RECORDER
+    else:
+        recorder = StageRecorder(traceMemory=recordStages)
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            if data is None and readReport is not None:
+                data = readReport(thisPath + '/' + thisFile)
+            reportResult = summarizeLoopReport(thisPath, thisFile, recorder, cache,
+                                               withDetails=True, data=data)
+            if lakeDir:
+                writeLakeReport(lakeDir, thisPath, thisFile, cache)
+        # same as analyzeLoopReport: a csv row only if outFile is a filename
+        csvRow = formatCsvRow(reportResult.summaryRecord) if outFile and outFile != 2 else None
+        result = (csvRow, None)
+    except Exception:
+        reportResult = None
+        result = (None, traceback.format_exc())
+    if not withDetails:
+        reportResult = None
+    if recordStages is None:
+        return result + ([], reportResult)
+    recorder.close()
+    return result + (recorder.records, reportResult)
+
+def analyzeReportData(thisFile, data, thisPath, outFile, **kwargs):
+    # analyzeReportRow for runPipeline: processItem(item, data)
+    return analyzeReportRow(thisPath, thisFile, outFile, data=data, **kwargs)
+
+def analyzeBatch(thisPath, fileList, outFile, numWorkers=None, progressEvery=25,
+                 recorder=None, cache=None, resultsDb=None, lakeDir=None, manifest=None,
+                 readConcurrency=None, readReport=None):
+    """
+    Purpose: analyze every report in fileList using a pool of worker processes
+
+    Input:
+        thisPath       folder holding the reports (as for analyzeMessageLogsRev3)
+        fileList       filenames relative to thisPath, in the order rows are written
+        outFile        csv file to append rows to (0 => rows are only returned)
+        numWorkers     number of worker processes (None => os.cpu_count())
+                       1 runs every report in this process
+        progressEvery  print a progress line after this many reports
+        recorder       optional StageRecorder, gets the stage records of every report
+        cache          optional ReportCache, reports already in it are not parsed again
+        resultsDb      optional ResultsDatabase, every report is stored in it
+                       (in the same order and batches as the csv rows)
+        lakeDir        optional folder, each worker also writes its report to
+                       this message level Parquet lake (see messageLake)
+        manifest       optional ReportManifest, gets the row of every report
+        readConcurrency  None => each worker reads its own report, otherwise
+                       reports are read ahead by runPipeline (asyncPipeline),
+                       this many at a time, while the workers analyze
+                       (use for slow storage, e.g., a network share)
+        readReport     function filename -> report contents (bytes), None =>
+                       read_file (workers) or readReportBytes (read ahead)
+
+    Output:
+        csvRows        list of csv row strings (None for a failed report)
+        errorList      list of (filename, traceback string) for failed reports
+
+    A report that raises is reported in errorList and skipped, the remaining
+    reports are still processed. Rows are written as soon as every earlier
+    report has finished, so outFile grows in fileList order.
+    """
+    if numWorkers is None:
+        numWorkers = os.cpu_count() or 1
+    numReports = len(fileList)
+    csvRows = [None] * numReports
+    errorList = []
+    isDone = [False] * numReports
+    reportResults = [None] * numReports
+    nextToWrite = 0
+    numDone = 0
+    startTime = time.time()
+
+    def collect(index, result):
+        nonlocal nextToWrite, numDone
+        csvRow, errorString, records, reportResult = result
+        if recorder is not None:
+            recorder.extend(records)
+        csvRows[index] = csvRow
+        reportResults[index] = reportResult
+        if manifest is not None and reportResult:
+            manifest.update(fileList[index], reportResult)
+        isDone[index] = True
+        numDone += 1
+        if errorString:
+            errorList.append((fileList[index], errorString))
+            print('    Error    : ', fileList[index], file=sys.stderr)
+        # write every finished row that has no unfinished report in front of it
+        readyRows = []
+        readyResults = []
+        while nextToWrite < numReports and isDone[nextToWrite]:
+            if csvRows[nextToWrite]:
+                readyRows.append(csvRows[nextToWrite])
+            if reportResults[nextToWrite]:
+                readyResults.append(reportResults[nextToWrite])
+                reportResults[nextToWrite] = None
+            nextToWrite += 1
+        if outFile and readyRows:
+            writeCsvRows(outFile, readyRows)
+        if resultsDb is not None and readyResults:
+            resultsDb.storeReports(readyResults)
+        if progressEvery and (numDone % progressEvery == 0 or numDone == numReports):
+            elapsed = time.time() - startTime
+            print('  Completed {:5d} of {:5d} reports, {:6.2f} reports/sec'.format(
+                numDone, numReports, numDone / max(elapsed, 1e-9)))
+
+    recordStages = None if recorder is None else recorder.traceMemory
+    withDetails = resultsDb is not None or manifest is not None
+    if readConcurrency:
+        processItem = functools.partial(analyzeReportData, thisPath=thisPath, outFile=outFile,
+                                        recordStages=recordStages, cache=cache,
+                                        withDetails=withDetails, lakeDir=lakeDir)
+        readItem = readReport or readReportBytes
+        pipelineArgs = dict(
+            readItem=lambda thisFile: readItem(thisPath + '/' + thisFile),
+            processItem=processItem,
+            writeResult=lambda index, thisFile, result: collect(index, result),
+            readConcurrency=readConcurrency, queueSize=2 * max(numWorkers, readConcurrency),
+            numProcessors=numWorkers,
+            onError=lambda thisFile, errorString: (None, errorString, [], None))
+        if numWorkers == 1:
+            runPipeline(fileList, **pipelineArgs)
+        else:
+            with ProcessPoolExecutor(max_workers=numWorkers) as executor:
+                runPipeline(fileList, executor=executor, **pipelineArgs)
+    elif numWorkers == 1:
+        for index, thisFile in enumerate(fileList):
+            collect(index, analyzeReportRow(thisPath, thisFile, outFile, recordStages, cache,
+                                            withDetails, lakeDir, readReport=readReport))
+    else:
+        with ProcessPoolExecutor(max_workers=numWorkers) as executor:
+            futures = {executor.submit(analyzeReportRow, thisPath, thisFile, outFile,
+                                       recordStages, cache, withDetails, lakeDir,
+                                       readReport=readReport): index
+                       for index, thisFile in enumerate(fileList)}
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    result = future.result()
+                except Exception:
+                    # e.g., the worker process died
+                    result = (None, traceback.format_exc(), [], None)
+                collect(index, result)
+
+    elapsed = time.time() - startTime
+    print('Completed running {:d} files in {:.1f} sec with {:d} worker(s), {:d} error(s)'.format(
+        numReports - len(errorList), elapsed, numWorkers, len(errorList)))
+    return csvRows, errorList
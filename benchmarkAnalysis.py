@@ -0,0 +1,347 @@
+# file: benchmarkAnalysis - time each analysis stage on synthetic Loop Reports
+#
+#   python benchmarkAnalysis.py                     # default sizes, writes bench_results.json
+#   python benchmarkAnalysis.py --hours 4 24 80 --fleet 100 300 --out new.json
+#   python benchmarkAnalysis.py --compare old.json new.json
+#   python benchmarkAnalysis.py --hours --fleet --slow 40 --throttle 5 0.02   # slow storage only
+#   python benchmarkAnalysis.py --imports           # import time budgets only, exit 1 if over
+#                                                   # (also checked by tests/test_importBudgets.py)
+#
+# Reports are built by loopReportGenerator in a temporary folder. Each stage
+# (read_file, generate_table, getPodState, checkAction, processActionFrame)
+# is timed on its own and end to end (analyzeLoopReport, no printing); the
+# best of --repeat runs is kept. Peak memory is measured with tracemalloc in
+# a separate run so it does not slow down the timing runs. The memory of the
+# podState frame is measured in the full and compact (compactPodState) schema.
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import contextlib
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+import loopReportGenerator
+from messageLogs_functions import read_file, generate_table
+from podStateAnalysis import getPodState, compactPodState
+from checkAction import checkAction, processActionFrame
+from analyzeMessageLogsRev3 import analyzeLoopReport
+from batchAnalysis import analyzeBatch
+from asyncPipeline import ThrottledReader
+
+radio_on_time = 30
+
+def _runStages(thisPath, thisFile):
+    # the stages of analyzeLoopReport, returns list of (stageName, function)
+    state = {}
+    filename = thisPath + '/' + thisFile
+
+    def stageRead():
+        state['commands'], state['podDict'] = read_file(filename)
+    def stageTable():
+        state['df'] = generate_table(state['commands'], radio_on_time)
+    def stagePodState():
+        state['podState'] = getPodState(state['df'])[0]
+    def stageCheckAction():
+        state['actionFrame'] = checkAction(state['podState'])[0]
+    def stageProcess():
+        processActionFrame(state['actionFrame'], state['podState'])
+    def stageEndToEnd():
+        analyzeLoopReport(thisPath, thisFile, 1)
+
+    return [('read_file', stageRead), ('generate_table', stageTable),
+            ('getPodState', stagePodState), ('checkAction', stageCheckAction),
+            ('processActionFrame', stageProcess), ('endToEnd', stageEndToEnd)]
+
+def timeReport(thisPath, thisFile, numMessages, repeat=3):
+    """ time every stage on one report, return dict stageName -> result dict """
+    results = {}
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        # timing runs
+        for ii in range(repeat):
+            for stageName, stage in _runStages(thisPath, thisFile):
+                startTime = time.perf_counter()
+                stage()
+                elapsed = time.perf_counter() - startTime
+                best = results.setdefault(stageName, {'seconds': np.inf})
+                best['seconds'] = min(best['seconds'], elapsed)
+        # memory run
+        tracemalloc.start()
+        for stageName, stage in _runStages(thisPath, thisFile):
+            tracemalloc.reset_peak()
+            baseMemory = tracemalloc.get_traced_memory()[0]
+            stage()
+            results[stageName]['peakMB'] = (tracemalloc.get_traced_memory()[1] - baseMemory) / 1e6
+        tracemalloc.stop()
+    for stageName, result in results.items():
+        result['messages'] = numMessages
+        result['msgPerSec'] = numMessages / max(result['seconds'], 1e-9)
+    return results
+
+def measurePodStateMemory(thisPath, thisFile):
+    """ podState memory (deep, MB) of one report: full and compact schema """
+    commands, podDict = read_file(thisPath + '/' + thisFile)
+    df = generate_table(commands, radio_on_time)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        podState = getPodState(df)[0]
+    compact = compactPodState(podState)
+    return {'fullMB': podState.memory_usage(deep=True).sum() / 1e6,
+            'compactMB': compact.memory_usage(deep=True).sum() / 1e6}
+
+def benchmarkSizes(workPath, hoursList, repeat=3, seed=0):
+    """ one report per pod duration in hoursList, every stage timed """
+    sizeResults = []
+    for podHours in hoursList:
+        thisFile = 'Loop_Report_{:g}h.md'.format(podHours)
+        numMessages = loopReportGenerator.writeReport(
+            os.path.join(workPath, thisFile), podHours=podHours, seed=seed, fault=0x14)
+        stages = timeReport(workPath, thisFile, numMessages, repeat=repeat)
+        podStateMemory = measurePodStateMemory(workPath, thisFile)
+        sizeResults.append({'podHours': podHours, 'messages': numMessages, 'stages': stages,
+                            'podStateMemory': podStateMemory})
+        print('  {:5g} hrs {:6d} msgs : '.format(podHours, numMessages) + ', '.join(
+            '{:s} {:.4f}s'.format(k, v['seconds']) for k, v in stages.items()))
+        print('                        podState {:.2f} MB, compact {:.2f} MB'.format(
+            podStateMemory['fullMB'], podStateMemory['compactMB']))
+    return sizeResults
+
+def benchmarkFleet(workPath, numReports, podHours=80, numWorkers=None, seed=0):
+    """ end to end batch run (analyzeBatch) over numReports reports """
+    fleetPath = os.path.join(workPath, 'fleet{:d}'.format(numReports))
+    numPeople = max(1, numReports // 4)
+    fileList = loopReportGenerator.writeFleet(fleetPath, numPeople=numPeople,
+        reportsPerPerson=-(-numReports // numPeople), podHours=podHours, seed=seed)[:numReports]
+    fleetResults = {'reports': len(fileList), 'podHours': podHours}
+    for workers in (1, numWorkers):
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            startTime = time.perf_counter()
+            csvRows, errorList = analyzeBatch(fleetPath, fileList, 0, numWorkers=workers,
+                                              progressEvery=0)
+            elapsed = time.perf_counter() - startTime
+        key = 'serial' if workers == 1 else 'parallel'
+        fleetResults[key] = {'seconds': elapsed, 'reportsPerSec': len(fileList) / elapsed,
+                             'workers': workers or os.cpu_count(), 'errors': len(errorList)}
+        print('  fleet {:4d} reports {:8s}: {:.2f}s, {:.1f} reports/sec'.format(
+            len(fileList), key, elapsed, len(fileList) / elapsed))
+    return fleetResults
+
+def benchmarkSlowStorage(workPath, numReports, bytesPerSec=5e6, latency=0.02, podHours=80,
+                         numWorkers=None, readConcurrency=8, seed=0):
+    """
+    batch run with every read throttled (ThrottledReader): reports read by the
+    workers (inWorker) vs read ahead by asyncPipeline (readAhead)
+    """
+    fleetPath = os.path.join(workPath, 'slow{:d}'.format(numReports))
+    numPeople = max(1, numReports // 4)
+    fileList = loopReportGenerator.writeFleet(fleetPath, numPeople=numPeople,
+        reportsPerPerson=-(-numReports // numPeople), podHours=podHours, seed=seed)[:numReports]
+    reader = ThrottledReader(bytesPerSec, latency)
+    slowResults = {'reports': len(fileList), 'podHours': podHours, 'bytesPerSec': bytesPerSec,
+                   'latency': latency}
+    for key, concurrency in (('inWorker', None), ('readAhead', readConcurrency)):
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            startTime = time.perf_counter()
+            csvRows, errorList = analyzeBatch(fleetPath, fileList, 0, numWorkers=numWorkers,
+                                              progressEvery=0, readConcurrency=concurrency,
+                                              readReport=reader)
+            elapsed = time.perf_counter() - startTime
+        slowResults[key] = {'seconds': elapsed, 'reportsPerSec': len(fileList) / elapsed,
+                            'workers': numWorkers or os.cpu_count(), 'errors': len(errorList)}
+        print('  slow {:4d} reports {:9s}: {:.2f}s, {:.1f} reports/sec'.format(
+            len(fileList), key, elapsed, len(fileList) / elapsed))
+    return slowResults
+
+# import budgets of the command line entry points:
+#   name -> (import statement, seconds, modules it must not import)
+#   the seconds are generous for a laptop; the module lists are what keep the
+#   start up fast (see the lazy imports in messageLogs_functions and messageLake)
+lightModules = ('numpy', 'pandas', 'markdown', 'bs4', 'pyarrow')
+importBudgets = {
+    'whatIsLastReport':  ('import get_file_list, getAnalysisIO', 0.1, lightModules),
+    'analysisClient':    ('import analysisClient', 0.1, lightModules),
+    'runLastLoopReport': ('import analyzeMessageLogsRev3, get_file_list, getAnalysisIO', 1.5,
+                          ('markdown', 'bs4', 'pyarrow.dataset')),
+    'runAll433_Rev3':    ('import runAll433_Rev3', 2.0, ('markdown', 'bs4', 'pyarrow.dataset'))}
+
+def measureImport(statement, repeat=3):
+    """
+    run statement in a new python (python -X importtime), best of repeat runs
+    returns dict: seconds, modules (every module imported, sorted) and
+    slowest (the 5 modules imported by the statement modules with the
+    largest cumulative time, i.e., where the time goes)
+    """
+    thisDir = os.path.dirname(os.path.abspath(__file__))
+    code = 'import sys, time\nstartTime = time.perf_counter()\n{}\n' \
+           'print(time.perf_counter() - startTime)\nprint(" ".join(sorted(sys.modules)))'.format(statement)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        [thisDir] + [x for x in os.environ.get('PYTHONPATH', '').split(os.pathsep) if x]))
+    result = None
+    for ii in range(repeat):
+        run = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=thisDir,
+                             env=env, capture_output=True, text=True, check=True)
+        seconds, modules = run.stdout.splitlines()[-2:]
+        # import time: self [us] | cumulative | imported package (indented by depth)
+        secondLevel = []
+        for line in run.stderr.splitlines():
+            parts = line.split('|')
+            name = parts[-1][1:]
+            if len(parts) == 3 and parts[1].strip().isdigit() and \
+               name.startswith('  ') and not name.startswith('    '):
+                secondLevel.append((int(parts[1]) / 1e6, name.strip()))
+        if result is None or float(seconds) < result['seconds']:
+            result = {'seconds': float(seconds), 'modules': modules.split(),
+                      'slowest': sorted(secondLevel, reverse=True)[:5]}
+    return result
+
+def benchmarkImports(budgets=None, repeat=3):
+    """
+    import time of every entry point in budgets (None => importBudgets),
+    returns dict name -> seconds, budget, forbidden (modules imported that
+    must not be) and ok
+    """
+    importResults = {}
+    for name, (statement, budget, forbiddenModules) in (budgets or importBudgets).items():
+        measured = measureImport(statement, repeat)
+        forbidden = [x for x in forbiddenModules if x in measured['modules']]
+        isOk = measured['seconds'] <= budget and not forbidden
+        importResults[name] = {'seconds': measured['seconds'], 'budget': budget,
+                               'forbidden': forbidden, 'ok': isOk}
+        print('  {:18s}: {:.3f}s (budget {:.2f}s) {:s}'.format(
+            name, measured['seconds'], budget, 'ok' if isOk else 'OVER BUDGET'))
+        if not isOk:
+            if forbidden:
+                print('      imports', ', '.join(forbidden))
+            print('      slowest:', ', '.join('{:s} {:.3f}s'.format(y, x)
+                                                for x, y in measured['slowest']))
+    return importResults
+
+def _gitCommit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ''
+
+def runBenchmarks(hoursList=(4, 12, 24, 48, 80), fleetList=(100,), repeat=3,
+                  numWorkers=None, outFile='bench_results.json', slowList=(),
+                  throttle=(5e6, 0.02)):
+    """ run the size and fleet benchmarks, save the results as json """
+    results = {
+        'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'commit': _gitCommit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'cpu_count': os.cpu_count(),
+        'sizes': [], 'fleets': [], 'slowStorage': []}
+    print('Import time of the entry points')
+    results['imports'] = benchmarkImports(repeat=repeat)
+    workPath = tempfile.mkdtemp(prefix='loopReportBench')
+    try:
+        print('Stage timing by pod duration')
+        results['sizes'] = benchmarkSizes(workPath, hoursList, repeat=repeat)
+        if fleetList:
+            print('Fleet timing')
+        for numReports in fleetList:
+            results['fleets'].append(benchmarkFleet(workPath, numReports, numWorkers=numWorkers))
+        if slowList:
+            print('Slow storage timing ({:g} bytes/sec, {:g} sec per file)'.format(*throttle))
+        for numReports in slowList:
+            results['slowStorage'].append(benchmarkSlowStorage(
+                workPath, numReports, *throttle, numWorkers=numWorkers))
+    finally:
+        shutil.rmtree(workPath, ignore_errors=True)
+    if outFile:
+        with open(outFile, 'w') as stream_out:
+            json.dump(results, stream_out, indent=1)
+        print('Results saved to', outFile)
+    return results
+
+def compareResults(oldFile, newFile):
+    """ print new/old time ratios for two json result files """
+    with open(oldFile) as stream_in:
+        old = json.load(stream_in)
+    with open(newFile) as stream_in:
+        new = json.load(stream_in)
+    print('Comparing {} ({}) to {} ({}), ratio < 1 is faster'.format(
+        newFile, new.get('commit'), oldFile, old.get('commit')))
+    oldImports = old.get('imports', {})
+    for name, newImport in new.get('imports', {}).items():
+        if name in oldImports:
+            print('  import {:18s}: {:8.3f}s -> {:8.3f}s  ratio {:6.2f}'.format(
+                name, oldImports[name]['seconds'], newImport['seconds'],
+                newImport['seconds'] / oldImports[name]['seconds']))
+    oldSizes = {x['podHours']: x for x in old['sizes']}
+    for newSize in new['sizes']:
+        oldSize = oldSizes.get(newSize['podHours'])
+        if not oldSize:
+            continue
+        print('  {:5g} hrs:'.format(newSize['podHours']))
+        for stageName, newStage in newSize['stages'].items():
+            oldStage = oldSize['stages'].get(stageName)
+            if not oldStage:
+                continue
+            print('    {:20s}: {:9.4f}s -> {:9.4f}s  ratio {:6.2f}   peak {:7.1f} -> {:7.1f} MB'.format(
+                stageName, oldStage['seconds'], newStage['seconds'],
+                newStage['seconds'] / oldStage['seconds'],
+                oldStage.get('peakMB', np.nan), newStage.get('peakMB', np.nan)))
+        oldMemory, newMemory = oldSize.get('podStateMemory'), newSize.get('podStateMemory')
+        if oldMemory and newMemory:
+            print('    {:20s}: {:8.2f}MB -> {:8.2f}MB  (compact {:.2f}MB -> {:.2f}MB)'.format(
+                'podState memory', oldMemory['fullMB'], newMemory['fullMB'],
+                oldMemory['compactMB'], newMemory['compactMB']))
+    oldFleets = {x['reports']: x for x in old['fleets']}
+    for newFleet in new['fleets']:
+        oldFleet = oldFleets.get(newFleet['reports'])
+        if not oldFleet:
+            continue
+        for key in ('serial', 'parallel'):
+            if key in newFleet and key in oldFleet:
+                print('  fleet {:4d} {:8s}: {:8.2f}s -> {:8.2f}s  ratio {:6.2f}'.format(
+                    newFleet['reports'], key, oldFleet[key]['seconds'], newFleet[key]['seconds'],
+                    newFleet[key]['seconds'] / oldFleet[key]['seconds']))
+    oldSlows = {x['reports']: x for x in old.get('slowStorage', [])}
+    for newSlow in new.get('slowStorage', []):
+        oldSlow = oldSlows.get(newSlow['reports'])
+        if not oldSlow:
+            continue
+        for key in ('inWorker', 'readAhead'):
+            if key in newSlow and key in oldSlow:
+                print('  slow  {:4d} {:9s}: {:8.2f}s -> {:8.2f}s  ratio {:6.2f}'.format(
+                    newSlow['reports'], key, oldSlow[key]['seconds'], newSlow[key]['seconds'],
+                    newSlow[key]['seconds'] / oldSlow[key]['seconds']))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the Loop Report analysis stages')
+    parser.add_argument('--hours', type=float, nargs='*', default=[4, 12, 24, 48, 80],
+                        help='pod durations (hours) for the per stage timing')
+    parser.add_argument('--fleet', type=int, nargs='*', default=[100],
+                        help='number of 80 hour reports for the batch timing')
+    parser.add_argument('--repeat', type=int, default=3, help='keep the best of this many runs')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes for fleet runs')
+    parser.add_argument('--slow', type=int, nargs='*', default=[],
+                        help='number of 80 hour reports for the slow storage timing')
+    parser.add_argument('--throttle', type=float, nargs=2, default=[5e6, 0.02],
+                        metavar=('BYTES_PER_SEC', 'LATENCY'),
+                        help='read speed and per file latency of the slow storage stand-in')
+    parser.add_argument('--out', default='bench_results.json', help='json results file')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='compare two json results files instead of running')
+    parser.add_argument('--imports', action='store_true',
+                        help='only check the import time budgets, exit status 1 if over')
+    args = parser.parse_args()
+    if args.compare:
+        compareResults(*args.compare)
+    elif args.imports:
+        importResults = benchmarkImports(repeat=args.repeat)
+        sys.exit(0 if all(x['ok'] for x in importResults.values()) else 1)
+    else:
+        runBenchmarks(args.hours, args.fleet, args.repeat, args.workers, args.out, args.slow,
+                      args.throttle)
@@ -0,0 +1,360 @@
+# file: binaryLog - compact binary form of a parsed Loop Report (.lrb file)
+#   layout (little endian):
+#       header    magic, version, info length, number of records, payload length
+#       info      json: podDict (as read_file), typeNames (type of each direction
+#                 code, e.g., send, receive) and, only if a time is not in
+#                 LOG_TIME_FORMAT, the original times; padded to 8 bytes
+#       records   one binaryRecordType (24 bytes) per MessageLog entry
+#       payload   the bytes of every message (the hex raw_value decoded)
+#   BinaryLog memory maps the file: the record columns and the payload are
+#   numpy views of the map, so nothing is parsed or copied when it is opened
+#
+#   convertReport('Loop Report.md') writes 'Loop Report.lrb'
+#   with BinaryLog('Loop Report.lrb') as log:
+#       stateTable, isEmpty, faultProcessedMsg = log.getPodStateColumns()
+import os
+import json
+import mmap
+import struct
+
+import numpy as np
+
+from messageLogs_functions import read_file, parseLogTimes, getTimeDelta, getTimeAsleep
+from messageBatchParsing import processMsgBuffer, getBufferKeys, batchKeyName
+from messagePatternParsing import processBufferRecords
+from podStateAnalysis import getPodState, getPodStateColumns
+
+BINARY_LOG_MAGIC = b'LOOPLRB\x00'
+# bump this when the layout changes, BinaryLog refuses other versions
+BINARY_LOG_VERSION = 1
+
+# magic, version, info length, number of records, payload length
+_headerStruct = struct.Struct('<8sIIQQ')
+
+# one MessageLog entry
+#   timeNs      time, int64 nanoseconds since the epoch (UTC)
+#   offset      start of the message in the payload
+#   length      number of payload bytes (0 => empty message)
+#   direction   index into typeNames (send / receive)
+#   mtype       first byte of the message
+#   subType     byte 16 of a 1a message (0x16 TB, 0x17 bolus, ...), otherwise 0
+#   flags       FLAG_TEXT => the payload is the raw_value text, not decoded hex
+binaryRecordType = np.dtype([('timeNs', '<i8'), ('offset', '<u8'), ('length', '<u4'),
+                             ('direction', 'u1'), ('mtype', 'u1'), ('subType', 'u1'),
+                             ('flags', 'u1')])
+
+# raw_value that is not lower case hex with an even number of digits (e.g.,
+#   the '\nstatus:' tail of a newer report), kept as text so it reads back as is
+FLAG_TEXT = 1
+
+def _messageBytes(raw_value):
+    # (payload bytes, flags, mtype, subType) of one raw_value
+    try:
+        byteMsg = bytes.fromhex(raw_value)
+    except ValueError:
+        byteMsg = None
+    if byteMsg is not None and byteMsg.hex() == raw_value:
+        payload, flags = byteMsg, 0
+    else:
+        payload, flags = raw_value.encode('UTF8'), FLAG_TEXT
+        byteMsg = _textBytes(raw_value)
+    mtype = byteMsg[0] if byteMsg else 0
+    subType = byteMsg[16] if mtype == 0x1a and len(byteMsg) > 16 else 0
+    return payload, flags, mtype, subType
+
+def _textBytes(text):
+    # bytes of a text raw_value as the hex string decoders see them (whole
+    #   bytes only), empty if it is not hex
+    try:
+        return bytes.fromhex(text[:len(text) // 2 * 2])
+    except ValueError:
+        return b''
+
+def writeBinaryLog(binFile, commands, podDict):
+    """
+    Write the commands and podDict of read_file to binFile (binaryLog format)
+    """
+    times = [x['time'] for x in commands]
+    timeNs = parseLogTimes(times)
+    info = {'podDict': podDict}
+    if timeNs is None:
+        # some other time format, keep the text so commands() gives it back
+        import pandas as pd
+        timeNs = pd.to_datetime(times).asi8
+        info['times'] = times
+    typeNames = list(dict.fromkeys(x['type'] for x in commands))
+    if len(typeNames) > 256:
+        raise ValueError('more than 256 MessageLog types')
+    info['typeNames'] = typeNames
+    typeCodes = {name: ii for ii, name in enumerate(typeNames)}
+
+    records = np.zeros(len(commands), dtype=binaryRecordType)
+    records['timeNs'] = timeNs
+    records['direction'] = [typeCodes[x['type']] for x in commands]
+    messages = [_messageBytes(x['raw_value']) for x in commands]
+    chunks = [x[0] for x in messages]
+    lengths = np.array([len(x) for x in chunks], dtype=np.int64)
+    records['offset'] = np.cumsum(lengths) - lengths
+    records['length'] = lengths
+    for ii, name in enumerate(('flags', 'mtype', 'subType'), 1):
+        records[name] = [x[ii] for x in messages]
+    position = int(lengths.sum())
+
+    infoBytes = json.dumps(info).encode('UTF8')
+    infoBytes += b' ' * (-(_headerStruct.size + len(infoBytes)) % 8)
+    tempName = binFile + '.{:d}.tmp'.format(os.getpid())
+    with open(tempName, 'wb') as stream_out:
+        stream_out.write(_headerStruct.pack(BINARY_LOG_MAGIC, BINARY_LOG_VERSION, len(infoBytes),
+                                            len(records), position))
+        stream_out.write(infoBytes)
+        stream_out.write(records.tobytes())
+        stream_out.write(b''.join(chunks))
+    os.replace(tempName, binFile)
+
+def convertReport(mdFile, binFile=None):
+    """
+    Convert a Loop Report (.md) to a binaryLog file, returns binFile
+    (None => the report name with .lrb)
+    """
+    if binFile is None:
+        binFile = os.path.splitext(mdFile)[0] + '.lrb'
+    commands, podDict = read_file(mdFile)
+    writeBinaryLog(binFile, commands, podDict)
+    return binFile
+
+class HexColumn:
+    """
+    raw_value column of a BinaryLog: len(), column[ii] and column == ''
+    work without making the hex strings, np.asarray(column) makes them all
+
+    lastRawValue    replaces the raw_value of the last message (the
+                    analyzeLoopReport fix of the '\\nstatus:' tail)
+    """
+    def __init__(self, log, lastRawValue=None):
+        self.log = log
+        self.lastRawValue = lastRawValue
+
+    def __len__(self):
+        return len(self.log)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            index = int(index) % len(self) if index < 0 else int(index)
+            if index == len(self) - 1 and self.lastRawValue is not None:
+                return self.lastRawValue
+            return self.log.getRawValue(index)
+        return np.asarray(self)[index]
+
+    def __eq__(self, other):
+        if isinstance(other, str) and other == '' and self.lastRawValue is None:
+            return self.log.length == 0
+        return np.asarray(self) == other
+
+    __hash__ = None
+
+    def __array__(self, dtype=None, copy=None):
+        column = np.empty(len(self), dtype=object)
+        text = self.log.payload.tobytes().hex()
+        starts = (2 * self.log.offset).tolist()
+        stops = (2 * (self.log.offset + self.log.length)).tolist()
+        column[:] = [text[start:stop] for start, stop in zip(starts, stops)]
+        for ii in np.flatnonzero(self.log.flags & FLAG_TEXT).tolist():
+            column[ii] = self.log.getRawValue(ii)
+        if self.lastRawValue is not None and len(column):
+            column[-1] = self.lastRawValue
+        return column if dtype is None else column.astype(dtype)
+
+class BinaryLog:
+    """
+    Memory mapped binaryLog file (see convertReport)
+
+        with BinaryLog(binFile) as log:
+            log.timeNs, log.direction, log.mtype, log.subType, log.offset,
+            log.length, log.flags    record columns (read only numpy views)
+            log.payload              message bytes (uint8 view)
+            log.podDict, log.typeNames
+
+    getPodStateColumns() decodes the messages straight from the payload
+    (processMsgBuffer), no hex string is made; getTable() and getPodState()
+    return the DataFrames of generate_table and getPodState. Views handed
+    out must be dropped before close().
+    """
+    def __init__(self, binFile):
+        self.binFile = binFile
+        self._file = open(binFile, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError('{} is not a binaryLog file'.format(binFile))
+        if len(self._map) < _headerStruct.size:
+            self.close()
+            raise ValueError('{} is not a binaryLog file'.format(binFile))
+        magic, version, infoLength, numRecords, payloadLength = \
+            _headerStruct.unpack_from(self._map, 0)
+        if magic != BINARY_LOG_MAGIC or version != BINARY_LOG_VERSION:
+            self.close()
+            raise ValueError('{} is not a version {:d} binaryLog file'.format(
+                binFile, BINARY_LOG_VERSION))
+        info = json.loads(bytes(self._map[_headerStruct.size:_headerStruct.size + infoLength]))
+        self.podDict = info['podDict']
+        self.typeNames = info['typeNames']
+        self._times = info.get('times')
+        recordStart = _headerStruct.size + infoLength
+        payloadStart = recordStart + numRecords * binaryRecordType.itemsize
+        self.records = np.frombuffer(self._map, dtype=binaryRecordType, count=numRecords,
+                                     offset=recordStart)
+        self.payload = np.frombuffer(self._map, dtype=np.uint8, count=payloadLength,
+                                     offset=payloadStart)
+        for name in binaryRecordType.names:
+            setattr(self, name, self.records[name])
+
+    def __len__(self):
+        return len(self.records)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        for name in ('records', 'payload') + binaryRecordType.names:
+            self.__dict__.pop(name, None)
+        self._map.close()
+        self._file.close()
+
+    def getRawValue(self, index):
+        # raw_value of one message
+        start = int(self.offset[index])
+        data = self.payload[start:start + int(self.length[index])].tobytes()
+        if self.flags[index] & FLAG_TEXT:
+            return data.decode('UTF8')
+        return data.hex()
+
+    def commands(self):
+        """ the commands of read_file (list of dicts with time, type and raw_value) """
+        if self._times is None:
+            seconds = (self.timeNs // 1000000000).astype('datetime64[s]')
+            times = [x.replace('T', ' ') + ' +0000' for x in np.datetime_as_string(seconds).tolist()]
+        else:
+            times = self._times
+        typeNames = self.typeNames
+        rawValues = HexColumn(self).__array__().tolist()
+        return [{'time': thisTime, 'type': typeNames[direction], 'raw_value': raw_value}
+                for thisTime, direction, raw_value in zip(times, self.direction.tolist(), rawValues)]
+
+    def _lastRawValue(self):
+        # raw_value of the last message with the analyzeLoopReport fix, None if
+        #   the fix changes nothing
+        if not len(self) or not self.flags[-1] & FLAG_TEXT:
+            return None
+        lastRaw = self.getRawValue(len(self) - 1)
+        fixed = lastRaw.replace('\nstatus:', '')
+        return fixed if fixed != lastRaw else None
+
+    def getRawValues(self):
+        """ raw_value column (HexColumn) as analyzeLoopReport sees it """
+        return HexColumn(self, self._lastRawValue())
+
+    def getMessageBuffer(self):
+        """
+        (payload, offset, length) of every message as analyzeLoopReport sees
+        it: the payload is the memory map unless a message is stored as text,
+        then a copy with the bytes of those messages added at the end
+        """
+        isText = (self.flags & FLAG_TEXT) != 0
+        if not isText.any():
+            return self.payload, self.offset, self.length
+        offset = self.offset.astype(np.int64)
+        length = self.length.astype(np.int64)
+        lastRawValue = self._lastRawValue()
+        extra = []
+        position = len(self.payload)
+        for ii in np.flatnonzero(isText).tolist():
+            text = self.getRawValue(ii)
+            if ii == len(self) - 1 and lastRawValue is not None:
+                text = lastRawValue
+            byteMsg = _textBytes(text)
+            offset[ii] = position
+            length[ii] = len(byteMsg)
+            extra.append(byteMsg)
+            position += len(byteMsg)
+        payload = np.concatenate((self.payload, np.frombuffer(b''.join(extra), dtype=np.uint8)))
+        return payload, offset, length
+
+    def getRecords(self):
+        """
+        processMsgRecords of the raw_value column, the records reference the
+        payload (no hex string is made until a record.raw_value is read);
+        drop them before close(), like the other views of the memory map
+        """
+        payload, offset, length = self.getMessageBuffer()
+        rawValues = None
+        isText = np.flatnonzero(self.flags & FLAG_TEXT).tolist()
+        if isText:
+            # these keep their text as raw_value
+            textValues = self.getRawValues()
+            rawValues = [None] * len(self)
+            for ii in isText:
+                rawValues[ii] = textValues[ii]
+        return processBufferRecords(payload, offset, length, rawValues)
+
+    def getTimeNs(self):
+        # the times as generate_table reads them (int64 nanoseconds)
+        if self._times is None:
+            return self.timeNs
+        import pandas as pd
+        return pd.DatetimeIndex(pd.to_datetime(self._times)).asi8
+
+    def getPodStateColumns(self, initialState=None, radio_on_time=30):
+        """
+        getPodStateColumns of the report, decoded straight from the payload
+
+        Output:
+            stateTable, isEmpty, faultProcessedMsg (see getPodStateColumns)
+        """
+        time_delta = getTimeDelta(self.getTimeNs())
+        tableDict = processMsgBuffer(*self.getMessageBuffer())
+        return getPodStateColumns(self.getRawValues(), time_delta,
+                                  getTimeAsleep(time_delta, radio_on_time), initialState,
+                                  tableDict)
+
+    def getTable(self, radio_on_time=30):
+        """ generate_table of the report (after the analyzeLoopReport fix) """
+        import pandas as pd
+        payload, offset, length = self.getMessageBuffer()
+        codes, inverse = np.unique(getBufferKeys(payload, offset, length), return_inverse=True)
+        commandNames = np.array([batchKeyName(x) if x >= 0 else '' for x in codes.tolist()],
+                                dtype=object)
+        timeNs = self.getTimeNs()
+        if self._times is None:
+            times = pd.DatetimeIndex(timeNs.view('datetime64[ns]')).tz_localize('UTC')
+        else:
+            times = pd.to_datetime(self._times)
+        df = pd.DataFrame({
+            'time': times,
+            'type': np.array(self.typeNames, dtype=object)[self.direction],
+            'raw_value': np.asarray(self.getRawValues()),
+            'command': commandNames[inverse.ravel()]})
+        # messages stored as text keep the command generate_table takes from the text
+        isText = np.flatnonzero(self.flags & FLAG_TEXT)
+        if len(isText):
+            from messageLogs_functions import getCommandColumn
+            df.loc[isText, 'command'] = getCommandColumn(df['raw_value'].to_numpy()[isText])
+        df['time_delta'] = getTimeDelta(timeNs)
+        df['time_asleep'] = getTimeAsleep(df['time_delta'].to_numpy(), radio_on_time)
+        return df
+
+    def getPodState(self, df=None, initialState=None, compact=False):
+        """
+        getPodState of the report, the messages decoded from the payload
+        (compact True => the compact schema, see compactPodState)
+
+        Output:
+            podStateFrame, emptyMessageList, faultProcessedMsg (see getPodState)
+        """
+        if df is None:
+            df = self.getTable()
+        return getPodState(df, initialState, processMsgBuffer(*self.getMessageBuffer()),
+                           compact)
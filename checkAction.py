@@ -1,6 +1,11 @@
 from utils import *
 from podUtils import *
 import numpy as np
+import pandas as pd
+
+# column names of the actionFrame returned by checkAction
+actionColumnNames = ('actionName', 'actionId', 'startIdx', 'cumStartSec', \
+    'responseTime', 'SchBasalState', 'completed')
 
 def checkAction(frame):
     """
@@ -10,173 +15,222 @@ def checkAction(frame):
         frame       output from getPodState function
 
     Output:
-        actionFrame  dataframe of processed analysis from podState (by action)
+        actionFrame  dataframe with one row per action instance
         initIdx      indices in podState to extract pod initilization
 
     Method:
-        actionFrame is a dataframe with indices and times for every action
+        actionFrame has one row for every complete action and one for every
+        identifying message (e.g., '1a16' for 'TB') without all its messages
         Uses the actionDict for which send-recv patterns go with actions
         Steps:
             # - identify the indices associated with initilizing the pod
                 (use pod_progress < 8) plus next 1d messages
-            # - build up actionFrame
-                (note that incompleteList remain in frameBalance)
-                frameBalance = frame
-                for each item in actionDict
-                    * find prime-indices for action, e.g., for 'TB' find all '1a16'
-                    * check adjacent indices for correct message types
-                    * incorrect adjacency => prime-index into incompleteList
-                    * the completedList includes prime + adjacent msg indices
-                    * fill in the actionFrame row for these column headers
-                    ['actionName', 'msgPerAction', 'cumStartSec', 'responseTime', \
-                        'SchBasalState', 'incompleteList', 'completedList']
-                    frameBalance = frame.drop(completedList)
+            # - encode message_type as integer tokens, then for each item in
+                actionDict (in order)
+                    * find unclaimed prime-indices, e.g., for 'TB' all '1a16'
+                    * compare the tokens at the adjacent indices to the pattern
+                    * incorrect adjacency => incomplete row for the prime-index
+                    * correct adjacency => complete row and the prime plus
+                      adjacent indices are claimed, so later actions skip them
+        actionFrame columns:
+            actionName     name from actionDict (categorical)
+            actionId       position of actionName in actionDict
+            startIdx       podState index of the first message of the action
+                           (index of the prime message for an incomplete row)
+            cumStartSec    timeCumSec of the first message (nan if incomplete)
+            responseTime   timeCumSec of the last - first message (nan if incomplete)
+            SchBasalState  scheduled basal state at the beginning of the action
+            completed      True if all the messages of the action were found
     """
 
-    actionDict = getActionDict()
+    initIdx = getInitIdx(frame)
+    actionFrame = matchActions(frame)
+    return actionFrame, initIdx
 
-    # determine initIdx from pod_progress value
-    podInit = frame[frame.pod_progress < 8]
+def getInitIdx(frame, podInitIdx=None):
+    # indices in frame for initializing the pod: every pod_progress < 8 row
+    #   (or podInitIdx if provided) plus the rows up to the next '1d'
+    if podInitIdx is None:
+        # determine initIdx from pod_progress value
+        podInit = frame[frame.pod_progress < 8]
+        podInitIdx = podInit.index.to_list()
     # get list of indices for initializing the pod
-    initIdx = np.array(podInit.index.to_list())
+    initIdx = np.array(podInitIdx)
     # need to add the next row too - but keep going until it is a '1d'
     checkIdx = initIdx[-1]
     while (frame.loc[checkIdx,'message_type']) != '1d':
         checkIdx += 1
         initIdx = np.append(initIdx, checkIdx)
+    return initIdx
+
+def matchActions(frame):
+    # the actionFrame part of checkAction (see checkAction for the columns)
+    #   an instance only depends on the message_type of rows within
+    #   actionMatchRadius() of its prime message
+    actionTable = matchActionColumns(frame['message_type'].to_numpy(),
+                                     frame['timeCumSec'].to_numpy(),
+                                     frame['SchBasal'].to_numpy(dtype=bool),
+                                     frame.index.to_numpy())
+    if len(actionTable['actionId']) == 0:
+        return pd.DataFrame(columns=actionColumnNames)
+    actionTable['actionName'] = pd.Categorical.from_codes(actionTable['actionId'],
+                                                          categories=list(getActionDict().keys()))
+    return pd.DataFrame(actionTable, columns=actionColumnNames)
+
+def matchActionColumns(message_type, timeCumSec, schBasal, frameIndex=None):
+    """
+    matchActions without the DataFrames: takes the podState columns as arrays
+    and returns the actionFrame columns, except actionName, as a column table
+    (dict of numpy arrays); frameIndex None => startIdx is the row position
+    """
+    actionDict = getActionDict()
+
+    # encode message_type as tokens, pattern names never seen get token -1
+    tokens, tokenNames = pd.factorize(message_type)
+    tokenDict = {name: ii for ii, name in enumerate(tokenNames)}
+    numRows = len(tokens)
+    claimed = np.zeros(numRows, dtype=bool)
+    if frameIndex is None:
+        frameIndex = np.arange(numRows)
+
+    actionId = []
+    startIdx = []
+    cumStartSec = []
+    responseTime = []
+    SchBasalState = []
+    completed = []
 
-    # prepare to search by actions
-    frameBalance = frame
-
-    # now search the frame for actions:
-    #    actionName from actionDic
-    #    list of lists of the completedList for that action,
-    #             e.g., (34, 35, 36, 37), (60, 61, 62, 63)
-    #    responseTime calculated by taking timeCumSec at end - timeCumSec at end
-    #    SchBasal is the scheduled basal state at the beginning of the action
-    # if all the expected messages are found in the correct order, then the
-    #     indices for all the messages are removed from frameBalance before
-    #     searching for the next actionDict item
-    actionColumnNames = ('actionName', 'msgPerAction', 'cumStartSec', \
-      'responseTime' , 'SchBasalState', 'incompleteList','completedList' )
-
-    actionList = []
-
-    for keys,values in actionDict.items():
-        badIdx = []         # accumulate action identifier indices that don't have all their messages
-        incompleteList = [] # list of badIdx lists by action
-        thisAction = keys
-        thisID = values[0]           # used to index into matchList, identifier for Action
+    for thisId, (thisAction, values) in enumerate(actionDict.items()):
+        primeOffset = values[0]     # index into matchList, identifier for Action
         matchList = values[1]
         msgPerAction = len(matchList)  # always 2 or 4
-        thisFrame = frameBalance[frameBalance.message_type == matchList[thisID]]
-        if len(thisFrame) == 0:
+        primeToken = tokenDict.get(matchList[primeOffset], -1)
+        primeIdx = np.flatnonzero((tokens == primeToken) & ~claimed)
+        if len(primeIdx) == 0:
             continue
-        thisIdx = np.array(thisFrame.index.to_list())
         # go thru adjacent messages to ensure they match the matchList
-        for ii in range (-thisID, msgPerAction-thisID):
-            if ii == thisID:
-                # we already know it matches the ID for this action
+        #   adjacent messages already claimed by an earlier action still count
+        isGood = np.ones(len(primeIdx), dtype=bool)
+        for ii in range(msgPerAction):
+            if ii == primeOffset:
                 continue
-            thisList = thisIdx+ii
-            # to avoid missing indices already removed from frameBalance, use frame here
-            checkFrame=frame.loc[thisList,:]
-            # identify any mismatches with respect to action message
-            badFrame = checkFrame[checkFrame.message_type != matchList[ii+thisID]]
-            if len(badFrame) > 0:
-                thisBad = np.array(badFrame.index.to_list())
-                thisBad = thisBad-ii
-                badIdx  = np.append(badIdx, thisBad)
-
-        # all required messages in the action have now been checked
-        if len(badIdx):
-            # need to remove the "bad" aka incomplete action indices from thisIdx
-            badIdx = np.unique(badIdx)
-            incompleteList = thisFrame.loc[badIdx,'df_idx'].to_list()
-            # use thisFrame to transfer completed indices in next step
-            thisFrame = thisFrame.drop(badIdx)
-
-        # now work on success
-        idx = np.array(thisFrame.index.to_list())
-        if len(idx) == 0:
-            continue
+            thisIdx = primeIdx + ii - primeOffset
+            inRange = (thisIdx >= 0) & (thisIdx < numRows)
+            isGood &= inRange
+            isGood[inRange] &= tokens[thisIdx[inRange]] == tokenDict.get(matchList[ii], -1)
 
-        #print('Status: ', thisAction, 'Complete: ', len(idx), 'Incomplete: ', len(badIdx))
-
-        if msgPerAction == 4:
-            thisList = np.unique(flatten([idx-2, idx-1, idx, idx+1 ]))
-            t0 = np.array(frame.loc[idx-2,'timeCumSec'].to_list())
-            t1 = np.array(frame.loc[idx+1,'timeCumSec'].to_list())
-            responseTime = t1-t0
-            SchBasalState = frame.loc[idx-2,'SchBasal'].to_list()
-        else:
-            thisList = np.unique(flatten([idx, idx+1]))
-            t0 = np.array(frame.loc[idx,'timeCumSec'].to_list())
-            t1 = np.array(frame.loc[idx+1,'timeCumSec'].to_list())
-            responseTime = t1-t0
-            SchBasalState = frame.loc[idx,'SchBasal'].to_list()
-
-        # append this action to the list
-        # go from np.array to list as appropriate
-        actionList.append(( thisAction, msgPerAction, t0, \
-          responseTime, SchBasalState, incompleteList, thisList))
-
-        # remove these indices from the frameBalance, reset and keep going
-        frameBalance = frameBalance.drop(thisList)
-
-    actionFrame = pd.DataFrame(actionList, columns=actionColumnNames)
-    return actionFrame, initIdx
+        badIdx = primeIdx[~isGood]
+        firstIdx = primeIdx[isGood] - primeOffset
+        lastIdx = firstIdx + msgPerAction - 1
+        for ii in range(msgPerAction):
+            claimed[firstIdx + ii] = True
+
+        numGood = len(firstIdx)
+        numBad = len(badIdx)
+        actionId.append(np.full(numGood + numBad, thisId, dtype=np.int8))
+        startIdx.append(frameIndex[np.concatenate((firstIdx, badIdx))])
+        cumStartSec.append(np.concatenate((timeCumSec[firstIdx], np.full(numBad, np.nan))))
+        responseTime.append(np.concatenate((timeCumSec[lastIdx] - timeCumSec[firstIdx],
+                                            np.full(numBad, np.nan))))
+        SchBasalState.append(np.concatenate((schBasal[firstIdx], schBasal[badIdx])))
+        completed.append(np.concatenate((np.ones(numGood, dtype=bool),
+                                         np.zeros(numBad, dtype=bool))))
+
+    if not actionId:
+        return {'actionId': np.array([], dtype=np.int8),
+                'startIdx': np.array([], dtype=np.int64),
+                'cumStartSec': np.array([]), 'responseTime': np.array([]),
+                'SchBasalState': np.array([], dtype=bool), 'completed': np.array([], dtype=bool)}
+    return {'actionId': np.concatenate(actionId),
+            'startIdx': np.concatenate(startIdx),
+            'cumStartSec': np.concatenate(cumStartSec),
+            'responseTime': np.concatenate(responseTime),
+            'SchBasalState': np.concatenate(SchBasalState),
+            'completed': np.concatenate(completed)}
+
+def actionMatchRadius():
+    # rows on either side of a prime message that can change its match:
+    #   each action looks up to 3 rows away and skips rows claimed by
+    #   the actions before it in actionDict
+    actionDict = getActionDict()
+    maxLength = max(len(values[1]) for values in actionDict.values())
+    return (maxLength - 1) * (len(actionDict) + 1)
+
+def getPrimeIdx(actionFrame):
+    # podState index of the identifying (prime) message of every action instance
+    primeOffset = np.array([values[0] for values in getActionDict().values()])
+    offset = primeOffset[actionFrame['actionId'].to_numpy(dtype=np.int64)]
+    offset[~actionFrame['completed'].to_numpy(dtype=bool)] = 0
+    return actionFrame['startIdx'].to_numpy(dtype=np.int64) + offset
+
+def _reqTBTenthPulses(podState, idx):
+    # reqTBTenthPulses at podState index idx (by position for a column table)
+    if isinstance(podState, pd.DataFrame):
+        return podState.loc[idx, 'reqTBTenthPulses'].to_numpy(dtype=np.int64)
+    return np.asarray(podState['reqTBTenthPulses'], dtype=np.int64)[idx]
 
 def processActionFrame(actionFrame, podState):
-    if len(actionFrame) == 0:
+    # actionSummary by action (counts, response times and the repeated TB checks)
+    #   actionFrame and podState may also be column tables (dict of numpy arrays,
+    #   see matchActionColumns and getPodStateColumns)
+    if len(actionFrame['actionId']) == 0:
         return
+    actionDict = getActionDict()
     actionSummary = {}
     totalCompletedMessages = 0
     numShortTB = np.nan
     numSchBasalbeforeTB = np.nan
-    for index, row in actionFrame.iterrows():
-        respTime = row['responseTime']
-        totalCompletedMessages += len(row['completedList'])
-        numCompleted = len(row['completedList'])/row['msgPerAction']
-        numIncomplete = len(row['incompleteList'])
-        thisName = row['actionName']
+    actionId = np.asarray(actionFrame['actionId'])
+    isCompleted = np.asarray(actionFrame['completed'], dtype=bool)
+    for thisId, (thisName, values) in enumerate(actionDict.items()):
+        msgPerAction = len(values[1])
+        isThis = actionId == thisId
+        thisCompleted = isThis & isCompleted
+        numCompleted = int(np.count_nonzero(thisCompleted))
+        if numCompleted == 0:
+            continue
+        respTime = np.asarray(actionFrame['responseTime'])[thisCompleted]
+        totalCompletedMessages += numCompleted*msgPerAction
         subDict = { \
-          'msgPerAction': row['msgPerAction'], \
-          'countCompleted': numCompleted, \
-          'countIncomplete': numIncomplete, \
+          'msgPerAction': msgPerAction, \
+          'countCompleted': numCompleted*msgPerAction/msgPerAction, \
+          'countIncomplete': int(np.count_nonzero(isThis & ~isCompleted)), \
           'meanResponseTime': np.mean(respTime), \
           'minResponseTime':  np.min(respTime), \
           'maxResponseTime': np.max(respTime) }
         # for Temp Basal, add a few more items to the subDict
         if thisName == 'TB':
-            startTime = row['cumStartSec']
+            startTime = np.asarray(actionFrame['cumStartSec'])[thisCompleted]
             deltaTime = np.diff(startTime)
             deltaTime = list(deltaTime)
             # insert 399 as the first index result for timeSinceLastTB
             deltaTime[:0] = [399]
             timeSinceLastTB = np.array(deltaTime)
             numShortTB = np.sum(timeSinceLastTB<30)
-            numSchBasalbeforeTB = np.sum(row['SchBasalState'])
-            SchBasalState = row['SchBasalState']
-            completedList = row['completedList']
+            SchBasalState = np.asarray(actionFrame['SchBasalState'])[thisCompleted]
+            numSchBasalbeforeTB = np.sum(SchBasalState)
             # find TB that are enacted while SchBasalState is false
             # with initial TB and final TB the same value
-            priorIdx   = list(range(0,len(completedList), 4)) # current status before cancel
-            postIdx    = list(range(2, len(completedList), 4)) # req TB
-            priorReqTB = np.array(podState.loc[completedList[priorIdx]]['reqTB'])
-            postReqTB  = np.array(podState.loc[completedList[postIdx]]['reqTB'])
-            deltaReqTB = postReqTB - priorReqTB
+            priorIdx   = np.asarray(actionFrame['startIdx'])[thisCompleted] # current status before cancel
+            postIdx    = priorIdx + 2 # req TB
+            # TB rates in 1/10th pulses per half hour, so the comparison is exact
+            priorReqTB = _reqTBTenthPulses(podState, priorIdx)
+            postReqTB  = _reqTBTenthPulses(podState, postIdx)
+            isRepeated = ~SchBasalState.astype(bool) & (postReqTB == priorReqTB)
                 # by definition, prior and post TB are same, so only need to include one value along with time
-            repeatedTB = [x[2:6] for x in zip(SchBasalState, deltaReqTB, startTime, priorReqTB, completedList[postIdx], timeSinceLastTB) if (not x[0] and x[1]==0)]
+            repeatedValues = (startTime, getRateFromTenthPulses(priorReqTB), postIdx, timeSinceLastTB)
+            repeatedTB = list(zip(*[x[isRepeated] for x in repeatedValues]))
             subDict['numShortTB'] = numShortTB
             subDict['numSchBasalbeforeTB'] = numSchBasalbeforeTB
             subDict['numRepeatedTB'] = len(repeatedTB)
             subDict['repeatedTB'] = repeatedTB
-            repeatedShortTB = [x[2:6] for x in zip(SchBasalState, deltaReqTB, startTime, priorReqTB, completedList[postIdx], timeSinceLastTB) if (not x[0] and x[1]==0 and x[5]<30)]
+            isShort = isRepeated & (timeSinceLastTB < 30)
+            repeatedShortTB = list(zip(*[x[isShort] for x in repeatedValues]))
             subDict['numRepeatedShortTB'] = len(repeatedShortTB)
             subDict['repeatedShortTB'] = repeatedShortTB
             # in practice - there were many repeated TB that were just under 20 min, so change to 19 min
-            repeated19MinTB = [x[2:6] for x in zip(SchBasalState, deltaReqTB, startTime, priorReqTB, completedList[postIdx], timeSinceLastTB) if (not x[0] and x[1]==0 and (x[5]>=30 and x[5]<1140))]
+            is19Min = isRepeated & (timeSinceLastTB >= 30) & (timeSinceLastTB < 1140)
+            repeated19MinTB = list(zip(*[x[is19Min] for x in repeatedValues]))
             subDict['numrepeated19MinTB'] = len(repeated19MinTB)
             subDict['repeated19MinTB'] = repeated19MinTB
 
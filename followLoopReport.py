@@ -0,0 +1,236 @@
+# file: followLoopReport - incremental analysis of the WIP reports of a running pod
+#   every copy of a WIP report holds the messages of the copy before it plus
+#   the ones sent since; followLoopReport saves a checkpoint per pod (lot, tid)
+#   and the next copy only runs the appended messages through generate_table,
+#   getPodState and matchActions, then merges them with the checkpoint
+import os
+import pickle
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from analyzeMessageLogsRev3 import *
+
+# bump this when the checkpoint contents change, older checkpoints are ignored
+CHECKPOINT_VERSION = 2
+
+# podState columns kept for the rows at the end of the report (matcher tail)
+tailColumnNames = ('message_type', 'timeCumSec', 'SchBasal', 'reqTBTenthPulses')
+
+def _prefixHash(commands, numCommands):
+    # hash of the first numCommands messages, used to confirm a newer copy
+    # of the report starts with the messages in the checkpoint
+    thisHash = hashlib.sha256()
+    for command in commands[:numCommands]:
+        thisHash.update('{time} {type} {raw_value}\n'.format(**command).encode())
+    return thisHash.hexdigest()
+
+def _emptyCheckpoint(podDict):
+    # checkpoint before the first message of a pod
+    return {'version': CHECKPOINT_VERSION, 'lot': podDict['lot'], 'tid': podDict['tid'],
+            'numMessages': 0, 'prefixHash': _prefixHash([], 0),
+            'runningState': getInitialPodState(),
+            'first_command': None, 'typeCounts': {}, 'messageTypeCounts': {},
+            'emptyMessageList': [], 'faultProcessedMsg': {},
+            'podInitIdx': [], 'initIdx': np.array([]),
+            'actionFrame': pd.DataFrame(columns=actionColumnNames),
+            'tail': pd.DataFrame(columns=tailColumnNames), 'tbReqTB': {}}
+
+def checkpointFilename(checkpointDir, podDict):
+    return os.path.join(checkpointDir, 'pod_{:s}_{:s}.pkl'.format(podDict['lot'], podDict['tid']))
+
+def loadCheckpoint(checkpointDir, podDict, commands):
+    """
+    Return the saved checkpoint for this pod if commands starts with its
+    messages, otherwise an empty checkpoint (so every message is analyzed)
+    """
+    filename = checkpointFilename(checkpointDir, podDict)
+    if not os.path.isfile(filename):
+        return _emptyCheckpoint(podDict)
+    try:
+        with open(filename, 'rb') as stream_in:
+            checkpoint = pickle.load(stream_in)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        return _emptyCheckpoint(podDict)
+    numMessages = checkpoint.get('numMessages', 0)
+    if checkpoint.get('version') != CHECKPOINT_VERSION or \
+       numMessages > len(commands) or \
+       checkpoint['prefixHash'] != _prefixHash(commands, numMessages):
+        # not an earlier copy of this report (or an old checkpoint)
+        return _emptyCheckpoint(podDict)
+    return checkpoint
+
+def saveCheckpoint(checkpointDir, checkpoint):
+    os.makedirs(checkpointDir, exist_ok=True)
+    filename = checkpointFilename(checkpointDir, checkpoint)
+    tempName = filename + '.{:d}.tmp'.format(os.getpid())
+    with open(tempName, 'wb') as stream_out:
+        pickle.dump(checkpoint, stream_out, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tempName, filename)
+
+def _addCounts(counts, newCounts):
+    counts = dict(counts)
+    for key, value in newCounts.items():
+        counts[key] = counts.get(key, 0) + int(value)
+    return counts
+
+def followLoopReport(thisPath, thisFile, outFile, checkpointDir, recorder=NULL_RECORDER,
+                     cache=None):
+    """
+    Purpose: same summary and csv row as analyzeLoopReport, but continue from
+             the checkpoint of an earlier copy of the same report
+
+    Input:
+        thisPath, thisFile, outFile    as for analyzeLoopReport
+        checkpointDir   folder for the checkpoints (one file per lot and tid)
+        recorder        StageRecorder (optional)
+        cache           ReportCache (optional)
+
+    Output:
+        podState        podState for the messages analyzed by this call
+                        (every message if there was no usable checkpoint)
+        actionFrame     actionFrame for the whole report
+        actionSummary   as for analyzeLoopReport
+        csvRow          None unless outFile is a filename
+
+    Method:
+        The checkpoint holds the running state (last row of podState), the
+        actionFrame, the counts for the summary and the last rows of podState
+        (the matcher tail). An action instance only depends on the messages
+        within actionMatchRadius() of its prime message, so the tail is
+        2*radius rows long: instances found in the checkpoint more than one
+        radius before its end are kept, the others are replaced by matching
+        tail plus appended messages. If the report does not start with the
+        messages in the checkpoint, every message is analyzed.
+    """
+    radio_on_time = 30
+    filename = thisPath + '/' + thisFile
+    recorder.startReport(thisFile)
+
+    with recorder.stage('read_file') as record:
+        if cache:
+            commands, podDict = cache.read_file(filename)
+        else:
+            commands, podDict = read_file(filename)
+        record['rows'] = len(commands)
+
+    # add quick and dirty fix for new Issue Reports (Aug 2019)
+    tempRaw = commands[-1]['raw_value']
+    lastRaw = tempRaw.replace('\nstatus:','')
+    commands[-1]['raw_value'] = lastRaw
+
+    checkpoint = loadCheckpoint(checkpointDir, podDict, commands)
+    numOld = checkpoint['numMessages']
+    numMessages = len(commands)
+    if numOld:
+        print('  Continuing from checkpoint: {:d} of {:d} messages already analyzed'.format(
+              numOld, numMessages))
+
+    # time_delta of the first new message is from the last message in the checkpoint
+    with recorder.stage('generate_table') as record:
+        if numOld:
+            df = generate_table(commands[numOld-1:], radio_on_time).iloc[1:]
+        else:
+            df = generate_table(commands, radio_on_time)
+        df.index = pd.RangeIndex(numOld, numMessages)
+        record['rows'] = len(df)
+
+    with recorder.stage('getPodState') as record:
+        if len(df):
+            podState, emptyMessageList, faultProcessedMsg = \
+                getPodState(df, checkpoint['runningState'])
+        else:
+            podState = pd.DataFrame(columns=podStateColumnNames)
+            emptyMessageList, faultProcessedMsg = [], {}
+        record['rows'] = len(podState)
+
+    with recorder.stage('checkAction') as record:
+        # match the tail plus new messages, keep the instances that could not change
+        radius = actionMatchRadius()
+        tail = checkpoint['tail']
+        newTail = podState.loc[:, tailColumnNames]
+        if len(tail) and len(newTail):
+            window = pd.concat([tail, newTail])
+        else:
+            window = tail if len(tail) else newTail
+        if len(podState):
+            windowFrame = matchActions(window)
+        else:
+            windowFrame = pd.DataFrame(columns=actionColumnNames)
+        oldFrame = checkpoint['actionFrame']
+        boundary = numOld - radius if numMessages > numOld else numOld
+        oldFrame = oldFrame[getPrimeIdx(oldFrame) < boundary]
+        windowFrame = windowFrame[getPrimeIdx(windowFrame) >= boundary]
+        actionFrame = pd.concat([x for x in (oldFrame, windowFrame) if len(x)]) \
+            if len(oldFrame) or len(windowFrame) else oldFrame
+        # same order as checkAction: by action, completed, then by index
+        order = np.lexsort((actionFrame['startIdx'].to_numpy(dtype=np.int64),
+                            ~actionFrame['completed'].to_numpy(dtype=bool),
+                            actionFrame['actionId'].to_numpy(dtype=np.int64)))
+        actionFrame = actionFrame.iloc[order].reset_index(drop=True)
+        record['rows'] = len(actionFrame)
+
+        # initialization: every pod_progress < 8 row plus the rows up to the next 1d
+        newInitIdx = podState.index[podState['pod_progress'] < 8].to_list() if len(podState) else []
+        podInitIdx = checkpoint['podInitIdx'] + newInitIdx
+        if newInitIdx:
+            initIdx = getInitIdx(podState, podInitIdx)
+        else:
+            initIdx = checkpoint['initIdx']
+
+    # reqTBTenthPulses before and after every completed TB, for processActionFrame
+    tbReqTB = dict(checkpoint['tbReqTB'])
+    isTB = (actionFrame['actionName'] == 'TB').to_numpy() & \
+        actionFrame['completed'].to_numpy(dtype=bool)
+    tbIdx = actionFrame['startIdx'].to_numpy(dtype=np.int64)[isTB]
+    for thisIdx in np.concatenate((tbIdx, tbIdx + 2)).tolist():
+        if thisIdx not in tbReqTB:
+            tbReqTB[thisIdx] = int(window.loc[thisIdx, 'reqTBTenthPulses'])
+    tbReqTB = {x: tbReqTB[x] for x in np.concatenate((tbIdx, tbIdx + 2)).tolist()}
+    reqTBFrame = pd.DataFrame({'reqTBTenthPulses': pd.Series(tbReqTB, dtype=np.int64)})
+
+    # merge the reportable values (see getReportStats)
+    typeCounts = _addCounts(checkpoint['typeCounts'], df.groupby(['type']).size().to_dict()
+                            if len(df) else {})
+    messageTypeCounts = _addCounts(checkpoint['messageTypeCounts'],
+                                   podState['message_type'].value_counts().to_dict()
+                                   if len(podState) else {})
+    if len(podState):
+        runningState = {x: podState.iloc[-1][x] for x in podStateRunningNames}
+    else:
+        runningState = checkpoint['runningState']
+    first_command = checkpoint['first_command']
+    if first_command is None:
+        first_command = df.iloc[0]['time']
+    last_command = df.iloc[-1]['time'] if len(df) else checkpoint['last_command']
+    send_receive_commands = pd.Series(typeCounts, dtype=np.int64).sort_index()
+    send_receive_commands.index.name = 'type'
+    reportStats = {
+        'first_command': first_command,
+        'last_command': last_command,
+        'send_receive_commands': send_receive_commands,
+        'number_of_messages': numMessages,
+        'msgLogHrs': runningState['timeCumSec']/3600,
+        'radioOnHrs': runningState['radioOnCumSec']/3600,
+        'numberOfAssignID': messageTypeCounts.get('0x7', 0),
+        'numberOfSetUpPod': messageTypeCounts.get('0x3', 0),
+        'numberOfNonceResync': messageTypeCounts.get('06', 0),
+        'insulinPulses': int(runningState['insulinPulses']),
+        'emptyMessageList': checkpoint['emptyMessageList'] + emptyMessageList,
+        'faultProcessedMsg': faultProcessedMsg or checkpoint['faultProcessedMsg']}
+
+    saveCheckpoint(checkpointDir, {
+        'version': CHECKPOINT_VERSION, 'lot': podDict['lot'], 'tid': podDict['tid'],
+        'numMessages': numMessages, 'prefixHash': _prefixHash(commands, numMessages),
+        'runningState': runningState,
+        'first_command': first_command, 'last_command': last_command,
+        'typeCounts': typeCounts, 'messageTypeCounts': messageTypeCounts,
+        'emptyMessageList': reportStats['emptyMessageList'],
+        'faultProcessedMsg': reportStats['faultProcessedMsg'],
+        'podInitIdx': podInitIdx, 'initIdx': initIdx,
+        'actionFrame': actionFrame, 'tail': window.iloc[-2*radius:], 'tbReqTB': tbReqTB})
+
+    actionSummary, csvRow = reportSummary(thisFile, outFile, podDict, reportStats,
+                                          actionFrame, initIdx, reqTBFrame, recorder)
+    return podState, actionFrame, actionSummary, csvRow
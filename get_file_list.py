@@ -1,46 +1,132 @@
 import os
-from os import listdir
+import re
+import json
+import fnmatch
+import operator
+from collections import namedtuple
 
-def get_file_list(thisPath):
+from messageLogs_functions import parse_info_from_filename
+
+# bump this when the snapshot contents change, an older snapshot is ignored
+SNAPSHOT_VERSION = 2
+
+# one report found by get_report_list, filename is relative to thisPath ('/' separated)
+#   person, finish and antenna are from parse_info_from_filename
+ReportEntry = namedtuple('ReportEntry', ('filename', 'mtime', 'size', 'person', 'finish',
+                                         'antenna'))
+
+def _globMatcher(patterns):
+    # match(name, relName) is True if the base name matches a pattern without
+    #   a '/' or the relative name matches a pattern with one
+    def compiled(thesePatterns):
+        if not thesePatterns:
+            return lambda x: None
+        return re.compile('|'.join(fnmatch.translate(x) for x in thesePatterns)).match
+    nameMatch = compiled([x for x in patterns if '/' not in x])
+    pathMatch = compiled([x for x in patterns if '/' in x])
+    return lambda name, relName: bool(nameMatch(name) or pathMatch(relName))
+
+def _scanFolder(folder, prefix):
+    # (mtimeNs of folder, files, subfolder names) from one scandir
+    #   files are [name, mtime, size, person, finish, antenna]
+    #   symlinked folders are skipped (no loops, no report listed twice)
+    files = []
+    subdirs = []
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.name)
+            elif entry.is_file():
+                thisStat = entry.stat()
+                files.append([entry.name, thisStat.st_mtime, thisStat.st_size] +
+                             list(parse_info_from_filename(prefix + entry.name)))
+    return os.stat(folder).st_mtime_ns, sorted(files), sorted(subdirs)
+
+def _loadSnapshot(snapshotFile, thisPath):
+    try:
+        with open(snapshotFile, 'rt') as stream_in:
+            snapshot = json.load(stream_in)
+    except (OSError, ValueError):
+        return {}
+    if snapshot.get('version') != SNAPSHOT_VERSION or \
+       snapshot.get('root') != os.path.abspath(thisPath):
+        return {}
+    return snapshot['folders']
+
+def _saveSnapshot(snapshotFile, thisPath, folders):
+    tempName = snapshotFile + '.{:d}.tmp'.format(os.getpid())
+    with open(tempName, 'wt') as stream_out:
+        stream_out.write(json.dumps({'version': SNAPSHOT_VERSION,
+                                     'root': os.path.abspath(thisPath), 'folders': folders}))
+    os.replace(tempName, snapshotFile)
+
+def get_report_list(thisPath, include=('*.md',), exclude=('.DS_Store',), maxDepth=None,
+                    snapshotFile=None):
+    """
+    Returns every report below thisPath as a ReportEntry list sorted by mtime
+
+    PARAMS:
+        thisPath:      top folder, reports can be at any depth below it
+                       (e.g., LoopReportFiles/person/Loop Report.md)
+        include:       glob patterns, a file is listed if its name matches one
+                       of them (patterns with a '/' match the path relative
+                       to thisPath, e.g., 'Joe/*.md'); the default skips the
+                       .lrb files of binaryLog.convertReport and other files
+                       next to the reports
+        exclude:       glob patterns for files and folders to skip
+        maxDepth:      number of folder levels below thisPath to look in
+                       (None => all, 0 => only thisPath)
+        snapshotFile:  json file with the listing of every folder; a folder
+                       whose mtime did not change is not listed again, so an
+                       unchanged tree costs one os.stat per folder. Reports
+                       added, removed or renamed change their folder mtime;
+                       a report rewritten in place keeps its old mtime and
+                       size until its folder changes.
+
+    RETURNS:
+        returnList list of ReportEntry sorted by mtime (then filename)
+    """
+    snapshot = _loadSnapshot(snapshotFile, thisPath) if snapshotFile else {}
+    isIncluded = _globMatcher(include)
+    isExcluded = _globMatcher(exclude)
+    folders = {}
+    reportList = []
+    pending = [('', 0)]
+    while pending:
+        relDir, depth = pending.pop()
+        folder = os.path.join(thisPath, relDir) if relDir else thisPath
+        prefix = relDir + '/' if relDir else ''
+        cached = snapshot.get(relDir)
+        if cached and os.stat(folder).st_mtime_ns == cached['mtimeNs']:
+            folders[relDir] = cached
+        else:
+            mtimeNs, files, subdirs = _scanFolder(folder, prefix)
+            folders[relDir] = {'mtimeNs': mtimeNs, 'files': files, 'subdirs': subdirs}
+        for row in folders[relDir]['files']:
+            relName = prefix + row[0]
+            if isIncluded(row[0], relName) and not isExcluded(row[0], relName):
+                reportList.append(ReportEntry(relName, *row[1:]))
+        if maxDepth is not None and depth >= maxDepth:
+            continue
+        for name in folders[relDir]['subdirs']:
+            if not isExcluded(name, prefix + name):
+                pending.append((prefix + name, depth + 1))
+
+    if snapshotFile and folders != snapshot:
+        _saveSnapshot(snapshotFile, thisPath, folders)
+    return sorted(reportList, key=operator.itemgetter(1, 0))
+
+def get_file_list(thisPath, snapshotFile=None):
     """
     Returns a filenames with associated creation times in a list
 
     PARAMS:
         thisPath: path folder where the MessageLog files by person are stored
-                  if directory contains Loop Reports, then just return that list
+                  (reports directly in thisPath or in folders at any depth)
+        snapshotFile: optional folder listing snapshot, see get_report_list
 
     RETURNS:
         returnList list of filename(relative to thisPath), creation time for file
                 where returnList is sorted by creation time
     """
-    list_of_reports = []
-    list_of_dates = []
-
-    thisLevel = listdir(thisPath)
-
-    if thisLevel[0][0:4] == 'Loop':
-        for y in thisLevel:
-            if y == '.DS_Store':
-                continue
-            thisFile =  y
-            list_of_reports.append(thisFile)
-            list_of_dates.append(os.path.getmtime(thisPath + '/' + thisFile))
-
-    else:
-        for x in thisLevel:
-            if x == '.DS_Store':
-                continue
-            #print(x)
-            for y in listdir(thisPath + '/' + x):
-                if y == '.DS_Store':
-                    continue
-                thisFile = x + '/' + y
-                list_of_reports.append(thisFile)
-                list_of_dates.append(os.path.getmtime(thisPath + '/' + thisFile))
-
-    zippedTuple = zip(list_of_reports, list_of_dates)
-    zippedList = list(zippedTuple)
-    returnList = sorted(zippedList, key = lambda x: x[1])
-
-    # return the list of files and dates sorted by date
-    return returnList
+    return [(x.filename, x.mtime) for x in get_report_list(thisPath, snapshotFile=snapshotFile)]
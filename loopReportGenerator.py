@@ -0,0 +1,242 @@
+# file: loopReportGenerator - builds synthetic Loop Report .md files
+#   used by benchmarkAnalysis to exercise the parsers at realistic sizes
+import os
+import random
+import datetime
+
+# radio address written into every MessageLog entry (4 bytes) plus B9 and BLEN
+POD_ADDRESS = '1f0b3557'
+
+def _crc(rng):
+    # the parsers never check the CRC16, random bytes are good enough
+    return '{:04x}'.format(rng.getrandbits(16))
+
+def _nonce(rng):
+    return '{:08x}'.format(rng.getrandbits(32))
+
+def msg0e(rng, requestCode=0):
+    return '0e01{:02x}'.format(requestCode) + _crc(rng)
+
+def msg1d(rng, podProgress, deliveryBits, pulses, seq, minutes, reservoir, alerts=0):
+    byte_1 = (deliveryBits << 4) | podProgress
+    dword_3 = ((pulses & 0x1FFF) << 15) | ((seq & 0xF) << 11)
+    dword_4 = ((alerts & 0xFF) << 23) | ((minutes & 0x1FFF) << 10) | (reservoir & 0x3FF)
+    return '1d{:02x}{:08x}{:08x}'.format(byte_1, dword_3, dword_4) + _crc(rng)
+
+def msg1f(rng, cancelByte):
+    return '1f05' + _nonce(rng) + '{:02x}'.format(cancelByte) + _crc(rng)
+
+def msg1a16(rng, rateUperHr):
+    # fixed rate, one half hour segment (what Loop sends)
+    x10pulses = int(round(100*rateUperHr))
+    hhpulses = x10pulses // 10
+    if x10pulses:
+        delay = int(1800e6 / x10pulses)
+    else:
+        delay = 0x6b49d200
+    first = '1a0e' + _nonce(rng) + '01' + _crc(rng) + '01' + '3840' + \
+        '{:04x}{:04x}'.format(hhpulses, hhpulses)
+    second = '160e0000' + '{:04x}{:08x}{:04x}{:08x}'.format(x10pulses, delay, x10pulses, delay)
+    return first + second + _crc(rng)
+
+def msg1a17(rng, pulses, reminders=0):
+    first = '1a0e' + _nonce(rng) + '02' + _crc(rng) + '01' + \
+        '{:04x}{:04x}{:04x}'.format(pulses*0x10 & 0xFFFF, pulses, pulses)
+    second = '170d{:02x}{:04x}00030d40'.format(reminders, 10*pulses) + '0000' + '00000000'
+    return first + second + _crc(rng)
+
+def msg1a13(rng, rateUperHr, currentHH=0):
+    hhpulses = int(round(10*rateUperHr))
+    napp = '{:04x}'.format(0xF000 | hhpulses) * 3   # 3 x 16 half hours
+    mlen = 4 + 1 + 2 + 1 + 2 + 2 + 6
+    first = '1a{:02x}'.format(mlen) + _nonce(rng) + '00' + _crc(rng) + \
+        '{:02x}3840{:04x}'.format(currentHH, hhpulses) + napp
+    x10pulses = 48*10*hhpulses
+    delay = int(1800e6 / max(10*hhpulses, 1))
+    second = '13{:02x}0001{:04x}{:08x}{:04x}{:08x}'.format(
+        2 + 4 + 6, 10*hhpulses, delay, x10pulses, delay)
+    return first + second + _crc(rng)
+
+def msg06(rng):
+    return '060314' + '{:04x}'.format(rng.getrandbits(16)) + _crc(rng)
+
+def msg02(rng, loggedFault, podProgress, pulses, minutes):
+    return '021602{:02x}00000000{:04x}{:02x}{:04x}03ff{:04x}0000189708{:02x}0000'.format(
+        podProgress, pulses, loggedFault, minutes, minutes, podProgress) + _crc(rng)
+
+def _podInitMessages(rng, seq):
+    # AssignID, SetUpPod, configure alerts, prime, basal, cannula insertion
+    msgs = [
+        ('send', '0704' + POD_ADDRESS + _crc(rng)),
+        ('receive', '0115020700020700020e0000a5ad0006e0e7' + POD_ADDRESS + _crc(rng)),
+        ('send', '0313' + POD_ADDRESS + '1404081308130000aa640008c7d9' + _crc(rng)),
+        ('receive', '011b13881008340a5002070002070002030000a5ad0006e0e7' + _crc(rng)),
+        ('send', '1910' + _nonce(rng) + '4c0000640102' + _crc(rng)),
+        ('receive', msg1d(rng, 2, 0, 0, next(seq), 0, 0x3ff)),
+        ('send', msg1a17(rng, 52)),
+        ('receive', msg1d(rng, 4, 4, 0, next(seq), 1, 0x3ff)),
+        ('send', msg0e(rng)),
+        ('receive', msg1d(rng, 5, 0, 52, next(seq), 2, 0x3ff)),
+        ('send', msg1a13(rng, 1.0)),
+        ('receive', msg1d(rng, 6, 1, 52, next(seq), 3, 0x3ff)),
+        ('send', msg1a17(rng, 10)),
+        ('receive', msg1d(rng, 7, 5, 52, next(seq), 4, 0x3ff)),
+        ('send', msg0e(rng)),
+        ('receive', msg1d(rng, 8, 1, 62, next(seq), 5, 0x3ff)),
+    ]
+    return msgs
+
+def generateMessages(podHours=72, tbRate=0.5, bolusRate=0.05, statusRate=0.4,
+                     nonceResyncRate=0.02, emptyRate=0.0, fault=None, seed=0,
+                     startTime=None):
+    """
+    Build the list of (time, direction, raw packet) tuples for one pod
+
+    Loop wakes up every 5 minutes; each wake up is either a temp basal
+    (1f02 1d 1a16 1d), a bolus (0e 1d 1a17 1d), a status check (0e 1d) or
+    nothing. Rates are the probability of each per Loop cycle. A nonce resync
+    (06) inserts a repeat of the command. emptyRate gives the probability a
+    message is logged with no content. If fault is given (e.g., 0x14) the
+    log ends with a 02 response reporting that fault.
+    """
+    rng = random.Random(seed)
+    if startTime is None:
+        startTime = datetime.datetime(2019, 8, 10, 12, 0, 0)
+
+    seqCounter = iter(range(1 << 30))
+    seq = (x & 0xF for x in seqCounter)
+
+    msgList = []
+    now = startTime
+    for direction, msg in _podInitMessages(rng, seq):
+        msgList.append((now, direction, msg))
+        now += datetime.timedelta(seconds=rng.randint(2, 4))
+
+    pulses = 62
+    reservoir = 0x3ff
+    remaining = 200*20  # pulses in the reservoir
+    deliveryBits = 1
+    reqTB = 0.0
+    podStart = startTime
+    endTime = startTime + datetime.timedelta(hours=podHours)
+
+    def addPair(sendMsg, podProgress=8):
+        nonlocal now
+        if rng.random() < nonceResyncRate:
+            msgList.append((now, 'send', sendMsg))
+            now += datetime.timedelta(seconds=rng.randint(1, 3))
+            msgList.append((now, 'receive', msg06(rng)))
+            now += datetime.timedelta(seconds=rng.randint(1, 3))
+        msgList.append((now, 'send', sendMsg))
+        now += datetime.timedelta(seconds=rng.randint(1, 4))
+        minutes = int((now - podStart).total_seconds() // 60)
+        if remaining <= 50*20:
+            reservoirField = remaining
+            podProgress = 9
+        else:
+            reservoirField = reservoir
+        msgList.append((now, 'receive', msg1d(rng, podProgress, deliveryBits,
+                        pulses, next(seq), minutes, reservoirField)))
+        now += datetime.timedelta(seconds=rng.randint(1, 4))
+
+    while now < endTime:
+        # basal delivery since last cycle (approx 1 U/hr)
+        delivered = rng.randint(1, 2)
+        pulses += delivered
+        remaining -= delivered
+        draw = rng.random()
+        if draw < tbRate:
+            # cancel TB then set new TB
+            addPair(msg1f(rng, 0x02))
+            newTB = rng.choice([0.0, 0.35, 0.5, 0.85, 1.0, 1.25, 2.15, reqTB])
+            deliveryBits = 2
+            addPair(msg1a16(rng, newTB))
+            reqTB = newTB
+        elif draw < tbRate + bolusRate:
+            bolusPulses = rng.randint(1, 100)
+            addPair(msg0e(rng))
+            deliveryBits = (deliveryBits & 0x3) | 4
+            addPair(msg1a17(rng, bolusPulses))
+            pulses += bolusPulses
+            remaining -= bolusPulses
+            deliveryBits &= 0x3
+        elif draw < tbRate + bolusRate + statusRate:
+            addPair(msg0e(rng))
+        if rng.random() < emptyRate:
+            msgList.append((now, 'send', ''))
+            now += datetime.timedelta(seconds=1)
+        now += datetime.timedelta(seconds=300 - rng.randint(0, 30))
+
+    if fault is not None:
+        msgList.append((now, 'send', msg0e(rng)))
+        now += datetime.timedelta(seconds=2)
+        minutes = int((now - podStart).total_seconds() // 60)
+        msgList.append((now, 'receive', msg02(rng, fault, 13, pulses, minutes)))
+
+    return msgList
+
+def formatReport(msgList, lot='43620', tid='560313', piVersion='2.7.0', pmVersion='2.7.0'):
+    """ return the markdown text of a Loop Report holding msgList """
+    lines = []
+    lines.append('# Issue Report')
+    lines.append('')
+    lines.append('Generated: {}'.format(msgList[-1][0].strftime('%Y-%m-%d %H:%M:%S +0000')))
+    lines.append('')
+    lines.append('## LoopVersion')
+    lines.append('* Version: 1.9.4')
+    lines.append('')
+    lines.append('## DeviceDataManager')
+    lines.append('* launchDate: 2019-08-09 11:02:14 +0000')
+    # some headings in real reports do not start on their own line
+    lines.append('* lastError: nil## OmnipodPumpManager')
+    lines.append('* isOnboarded: true')
+    lines.append('* basalSchedule: BasalSchedule(entries: [LoopKit.BasalScheduleEntry(rate: 1.0, startTime: 0.0)])')
+    lines.append('')
+    lines.append('### PodState')
+    lines.append('* address: ' + POD_ADDRESS)
+    lines.append('* activatedAt: ' + msgList[0][0].strftime('%Y-%m-%d %H:%M:%S +0000'))
+    lines.append('* piVersion: ' + piVersion)
+    lines.append('* pmVersion: ' + pmVersion)
+    lines.append('* lot: ' + lot)
+    lines.append('* tid: ' + tid)
+    lines.append('* setupProgress: completed')
+    lines.append('')
+    lines.append('### MessageLog')
+    for timeStamp, direction, msg in msgList:
+        if msg:
+            packet = POD_ADDRESS + '{:02x}{:02x}'.format(0x1c, len(msg)//2) + msg
+        else:
+            packet = POD_ADDRESS + '1c00'
+        lines.append('* {} {} {}'.format(timeStamp.strftime('%Y-%m-%d %H:%M:%S +0000'),
+                     direction, packet))
+    lines.append('')
+    lines.append('## WatchDataManager')
+    lines.append('* isWatchAppInstalled: false')
+    lines.append('')
+    return '\n'.join(lines)
+
+def writeReport(filename, **kwargs):
+    """ generate one pod worth of messages and write the Loop Report to filename """
+    reportKeys = ('lot', 'tid', 'piVersion', 'pmVersion')
+    reportArgs = {k: kwargs.pop(k) for k in reportKeys if k in kwargs}
+    msgList = generateMessages(**kwargs)
+    with open(filename, 'w', encoding='UTF8') as stream_out:
+        stream_out.write(formatReport(msgList, **reportArgs))
+    return len(msgList)
+
+def writeFleet(topPath, numPeople=5, reportsPerPerson=4, podHours=72, seed=0):
+    """ write a folder-per-person tree of Loop Reports like LoopReportFiles """
+    rng = random.Random(seed)
+    fileList = []
+    for person in range(numPeople):
+        personPath = os.path.join(topPath, 'person{:03d}'.format(person))
+        os.makedirs(personPath, exist_ok=True)
+        for report in range(reportsPerPerson):
+            finish = rng.choice(['', '', '', '_0x14', '_WIP'])
+            thisFile = 'Loop_Report_{:03d}{}.md'.format(report, finish)
+            fault = 0x14 if finish == '_0x14' else None
+            writeReport(os.path.join(personPath, thisFile), podHours=podHours,
+                        seed=rng.getrandbits(32), fault=fault,
+                        lot=str(40000 + person), tid=str(500000 + 10*person + report))
+            fileList.append('person{:03d}/{}'.format(person, thisFile))
+    return fileList
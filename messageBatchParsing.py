@@ -0,0 +1,165 @@
+# file: messageBatchParsing - columnar version of messagePatternParsing
+#   decodes the whole raw_value column at once instead of one message at a time
+#   using the field lists of the parse_*.py files (messageFieldSpecs.decodeBatch)
+import functools
+import numpy as np
+from messageFieldSpecs import msgFieldSpecs, decodeBatch, decodeBuffer, \
+    _hexMatrix, _bufferMatrix, _objectColumn
+import messagePatternParsing    # registers the field list of every parser
+
+# note - like processMsg, the tables are keyed by message_type:
+#        '1a16', '1d', ... for parsed messages, '0x7', '0x3' etc for the rest
+
+def _decode_ignore(msgList):
+    # same as messagePatternParsing.ignoreMsg
+    byteMat = _hexMatrix(msgList, 1)
+    mtype = byteMat[:, 0].copy()
+    table = {}
+    table['mtype'] = mtype
+    table['message_type'] = _objectColumn([hex(x) for x in mtype.tolist()])
+    return table
+
+def _batchKey(message_type):
+    # key from getBatchTypes for a message_type: '0x7' -> '07', '1d' -> '1d'
+    if message_type.startswith('0x'):
+        return '{:02x}'.format(int(message_type, 16))
+    return message_type
+
+# decoder key -> message_type of its field list
+batchTypeNames = {_batchKey(name): name for name in msgFieldSpecs}
+
+chooseBatchType = {key: functools.partial(decodeBatch, name)
+                   for key, name in batchTypeNames.items()}
+
+def getBatchTypes(rawValues):
+    """
+    Return the decoder key for each raw_value: '1d', '1a16', ... as used by
+    processMsg, 'xx' (two hex characters) for messages processMsg ignores
+    and '' for empty messages
+    """
+    keys = []
+    for msg in rawValues:
+        mtype = msg[:2].lower()
+        if mtype == '1a':
+            xtype = msg[32:34].lower()
+            mtype = '1a16' if xtype == '16' else '1a17' if xtype == '17' else '1a13'
+        keys.append(mtype)
+    return keys
+
+def processMsgBatch(rawValues):
+    """
+    Purpose: decode every message in a raw_value column at once
+
+    Input:
+        rawValues   sequence of hex strings (e.g., df['raw_value'])
+
+    Output:
+        tableDict   message_type -> column table for that type, where a column
+                    table is a dict of equal length numpy arrays with the same
+                    keys as the msgDict returned by processMsg, plus
+                        'msg_idx'  position of each row in rawValues
+                    messages are grouped under the message_type processMsg
+                    returns, hex(mtype) for those without a parser, e.g.,
+                    '0x5', and empty messages are skipped; the types whose
+                    parser has shortAsIgnore (e.g., '0x3') also have
+                        'parsed'   False for a message too short for the
+                                   parser (processMsg gives the ignoreMsg
+                                   msgDict, see getMsgDict)
+    """
+    rawValues = list(rawValues)
+    keys = getBatchTypes(rawValues)
+
+    # group positions by decoder key, keeping the original order in each group
+    groups = {}
+    for idx, key in enumerate(keys):
+        if key:
+            groups.setdefault(key, []).append(idx)
+
+    tableDict = {}
+    for key, idxList in groups.items():
+        msgList = [rawValues[idx] for idx in idxList]
+        table = chooseBatchType.get(key, _decode_ignore)(msgList)
+        table['raw_value'] = _objectColumn(msgList)
+        table['msg_idx'] = np.array(idxList, dtype=np.int64)
+        message_type = batchTypeNames.get(key) or hex(int(key, 16))
+        tableDict[message_type] = table
+    return tableDict
+
+def _decodeBuffer_ignore(payload, offsets, lengths):
+    # _decode_ignore for messages already decoded to bytes
+    mtype = _bufferMatrix(payload, offsets, lengths, 1)[:, 0].copy()
+    return {'mtype': mtype, 'message_type': _objectColumn([hex(x) for x in mtype.tolist()])}
+
+def getBufferKeys(payload, offsets, lengths):
+    """
+    getBatchTypes for messages already decoded to bytes, as integer codes:
+    mtype * 256 + the 1a sub-type (0x13, 0x16 or 0x17, byte 16), -1 for
+    empty messages (batchKeyName turns a code into the decoder key)
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    firstBytes = _bufferMatrix(payload, offsets, lengths, 17)
+    mtype = firstBytes[:, 0].astype(np.int64)
+    xtype = np.where(lengths > 16, firstBytes[:, 16], 0)
+    xtype = np.where((xtype == 0x16) | (xtype == 0x17), xtype, 0x13)
+    keys = mtype * 256 + np.where(mtype == 0x1a, xtype, 0)
+    return np.where(lengths > 0, keys, -1)
+
+def batchKeyName(code):
+    # decoder key of a getBufferKeys code, e.g., 0x1d00 -> '1d', 0x1a16 -> '1a16'
+    if code >> 8 == 0x1a:
+        return '{:04x}'.format(code)
+    return '{:02x}'.format(code >> 8)
+
+def processMsgBuffer(payload, offsets, lengths):
+    """
+    Purpose: processMsgBatch for messages already decoded to bytes
+
+    Input:
+        payload     uint8 array with the bytes of every message (e.g., the
+                    memory mapped payload of a binaryLog file)
+        offsets     start of each message in payload
+        lengths     number of bytes of each message (0 => empty message)
+
+    Output:
+        tableDict   same as processMsgBatch of the hex strings, except the
+                    columns have no raw_value (no hex strings are made)
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    keys = getBufferKeys(payload, offsets, lengths)
+
+    # groups in order of first message, rows in message order (as processMsgBatch)
+    codes, firstIdx = np.unique(keys, return_index=True)
+    order = np.argsort(keys, kind='stable')
+    groupStarts = np.searchsorted(keys[order], codes)
+    groupStops = np.searchsorted(keys[order], codes, side='right')
+    tableDict = {}
+    for ii in np.argsort(firstIdx).tolist():
+        code = int(codes[ii])
+        if code < 0:
+            continue
+        idx = order[groupStarts[ii]:groupStops[ii]]
+        key = batchKeyName(code)
+        name = batchTypeNames.get(key)
+        if name:
+            table = decodeBuffer(name, payload, offsets[idx], lengths[idx])
+        else:
+            table = _decodeBuffer_ignore(payload, offsets[idx], lengths[idx])
+        table['msg_idx'] = idx.astype(np.int64)
+        tableDict[name or hex(int(key, 16))] = table
+    return tableDict
+
+def getMsgDict(table, row):
+    """ return row of a column table in the processMsg msgDict form """
+    msgDict = {}
+    # a message too short for its (shortAsIgnore) parser has the ignoreMsg keys
+    isParsed = 'parsed' not in table or table['parsed'][row]
+    for key, column in table.items():
+        if key in ('msg_idx', 'parsed'):
+            continue
+        if not isParsed and key not in ('mtype', 'message_type', 'raw_value'):
+            continue
+        value = column[row]
+        msgDict[key] = value.item() if isinstance(value, np.generic) else value
+    return msgDict
@@ -0,0 +1,498 @@
+# file: messageFieldSpecs - declarative field layouts for the pod messages
+#   each parse_*.py lists the fields of its message, in msgDict order, and
+#   registers them here with registerMsgType; the list is compiled once into
+#       a decoder for one message already decoded to bytes (used by processMsg,
+#       through processMsgAt, and by the records), with a hex string version,
+#       a record class, decoding fields on access (used by processMsgRecords) and
+#       a column decoder for many messages (used by processMsgBatch)
+import struct
+from collections import namedtuple
+
+import numpy as np
+import utils
+
+# Field: value = (int.from_bytes(byteMsg[offset:offset+width], 'big') >> shift) & mask
+#   then scale(value) if scale is given
+#   width UNTIL_MLEN => bytes offset up to mlen (byte 1), e.g., the 1a13 napp table
+#   afterMlen True   => offset is counted from mlen, e.g., the 1a13 second half
+#   optional True    => the field may be missing at the end of a message, it is
+#                       then read as zero (e.g., the 02 word_Y); a message missing
+#                       any other field is too short and raises ValueError, or is
+#                       decoded as ignoreMsg for a type registered with
+#                       shortAsIgnore (types processMsg ignored before their parser)
+Field = namedtuple('Field', ('name', 'offset', 'width', 'shift', 'mask', 'scale', 'afterMlen',
+                             'optional'),
+                   defaults=(1, 0, None, None, False, False))
+Const = namedtuple('Const', ('name', 'value'))     # same value for every message
+Raw = namedtuple('Raw', ('name',), defaults=('raw_value',))  # the hex string itself
+UNTIL_MLEN = 0
+
+# Scale: scalar converts one value, column (optional) converts a numpy array
+#   without column the scalar is applied to every row of an object column
+Scale = namedtuple('Scale', ('scalar', 'column'), defaults=(None,))
+
+def getUnitsFromPulsesColumn(pulses):
+    # utils.getUnitsFromPulses on a column of unsigned pulses
+    return utils.getUnitsFromPulses(np.asarray(pulses, dtype=np.int64))
+
+def _reservoir(pulses):
+    # '>50 u' if pulses == 0x3ff, else units
+    if pulses == 0x3FF:
+        return '>50 u'
+    return utils.getUnitsFromPulses(pulses)
+
+def _reservoirColumn(pulses):
+    units = getUnitsFromPulsesColumn(pulses)
+    column = np.empty(len(units), dtype=object)
+    column[:] = ['>50 u' if p == 0x3FF else u for p, u in zip(pulses.tolist(), units.tolist())]
+    return column
+
+def isValue(thisValue):
+    # Scale for value == thisValue (bool), works on scalars and arrays
+    isIt = lambda x: x == thisValue
+    return Scale(isIt, isIt)
+
+FLAG = Scale(bool, lambda x: x != 0)
+UNITS = Scale(utils.getUnitsFromPulses, getUnitsFromPulsesColumn)
+RESERVOIR = Scale(_reservoir, _reservoirColumn)
+
+# message_type -> MsgSpec, filled in by the parse_*.py modules
+MsgSpec = namedtuple('MsgSpec', ('message_type', 'fields', 'finish', 'finishBatch', 'minLength',
+                                 'requiredLength', 'afterMlenLength', 'shortAsIgnore'))
+msgFieldSpecs = {}
+# message_type -> decoder(buffer, start, length, msg=None) (see compileDecoder)
+msgBufferDecoders = {}
+# message_type -> record class (see compileRecord)
+msgRecordClasses = {}
+
+def _fixedFields(fields):
+    return [x for x in fields
+            if isinstance(x, Field) and not x.afterMlen and x.width != UNTIL_MLEN]
+
+def _minLength(fields):
+    # bytes read by the fixed fields, shorter messages are padded with zeros
+    return max([x.offset + x.width for x in _fixedFields(fields)] + [2])
+
+def _requiredLength(fields):
+    # bytes a message must have: up to the end of the last field that is not optional
+    return max([x.offset + x.width for x in _fixedFields(fields) if not x.optional] + [1])
+
+def _afterMlenLength(fields):
+    # bytes after mlen read by the afterMlen fields, the message must have
+    #   mlen + afterMlenLength bytes (0 => no afterMlen fields)
+    return max([x.offset + x.width for x in fields if isinstance(x, Field) and x.afterMlen] + [0])
+
+def messageTooShort(message_type, length, needed):
+    # the error for a message missing some of its (not optional) fields
+    return ValueError('{} message has {:d} bytes, needs {:d}'.format(message_type, length, needed))
+
+def neededLength(layout, buffer, start, length):
+    # bytes the message at start must have for layout (a MsgSpec or record class)
+    needed = layout.requiredLength
+    if layout.afterMlenLength and length >= 2:
+        needed = max(needed, buffer[start+1] + layout.afterMlenLength)
+    return needed
+
+def checkRecordLength(recordClass, buffer, start, length):
+    # raise messageTooShort if the message at start is too short for recordClass
+    needed = neededLength(recordClass, buffer, start, length)
+    if length < needed:
+        raise messageTooShort(recordClass.recordType, length, needed)
+
+def _scalar(scale):
+    return scale.scalar if isinstance(scale, Scale) else scale
+
+def compileDecoder(fields, finish=None, fromBuffer=False, message_type=None, short=None):
+    """
+    Compile fields into decoder(msg) -> msgDict
+
+    The source of decoder is built once from the fields (one expression per
+    field, like collections.namedtuple builds its classes) so decoding a
+    message is a single struct unpack plus a dict display. The fixed position
+    fields are read with one struct.Struct when they do not overlap and are
+    1, 2, 4 or 8 bytes wide, otherwise with int.from_bytes.
+    finish(msgDict) (optional) returns the final msgDict
+    A message missing a field that is not optional raises ValueError
+    (messageTooShort, message_type names the message in the error), or
+    is decoded by short(buffer, start, length, msg) if given (ignoreBuffer
+    for the shortAsIgnore types).
+
+    The source is compiled for messages already decoded to bytes:
+    fromBuffer True => decoder(buffer, start, length, msg=None) for the
+    message buffer[start:start+length] (e.g., the shared buffer of
+    decodeMessages), read through a memoryview slice; only messages without
+    their optional fields are copied (padded) and msg (the hex string) is
+    made from the bytes only if it is not given. decoder(msg) decodes the
+    hex string and calls it.
+    """
+    minLength = _minLength(fields)
+    requiredLength = _requiredLength(fields)
+    afterMlenLength = _afterMlenLength(fields)
+    words = sorted(set((x.offset, x.width) for x in _fixedFields(fields)))
+    codes = {1: 'B', 2: 'H', 4: 'I', 8: 'Q'}
+    fmt = '>'
+    position = 0
+    for offset, width in words:
+        if offset < position or width not in codes:
+            fmt = None
+            break
+        fmt += 'x' * (offset - position) + codes[width]
+        position = offset + width
+
+    namespace = {'from_bytes': int.from_bytes, 'finish': finish,
+                 'memoryview': memoryview, 'message_type': message_type,
+                 'tooShort': messageTooShort, 'short': short}
+    lines = ['def decoder(buffer, start, length, msg=None):',
+             '    byteMsg = memoryview(buffer)[start:start+length]']
+    onShort = '        raise tooShort(message_type, length, {:s})'
+    if short:
+        onShort = '        return short(buffer, start, length, msg)'
+    if afterMlenLength:
+        # same count as neededLength
+        lines += ['    needed = max({0:d}, byteMsg[1] + {1:d}) if length >= 2 else {0:d}'.format(
+                      requiredLength, afterMlenLength),
+                  '    if length < needed:',
+                  onShort.format('needed')]
+    else:
+        lines += ['    if length < {:d}:'.format(requiredLength),
+                  onShort.format(str(requiredLength))]
+    if minLength > requiredLength:
+        lines += ['    if length < {:d}:'.format(minLength),
+                  '        byteMsg = bytes(byteMsg).ljust({:d}, bytes(1))'.format(minLength)]
+    if any(isinstance(x, Raw) for x in fields):
+        lines += ['    if msg is None:',
+                  '        msg = byteMsg[:length].hex()']
+    wordNames = ['w{:d}'.format(ii) for ii in range(len(words))]
+    if fmt:
+        namespace['unpack'] = struct.Struct(fmt).unpack_from
+        lines.append('    {:s}, = unpack(byteMsg)'.format(', '.join(wordNames)))
+    else:
+        for name, (offset, width) in zip(wordNames, words):
+            lines.append("    {:s} = from_bytes(byteMsg[{:d}:{:d}], 'big')".format(
+                name, offset, offset + width))
+    wordIndex = {word: ii for ii, word in enumerate(words)}
+
+    items = []
+    for ii, field in enumerate(fields):
+        if isinstance(field, Const):
+            namespace['c{:d}'.format(ii)] = field.value
+            items.append('c{:d}'.format(ii))
+            continue
+        if isinstance(field, Raw):
+            items.append('msg')
+            continue
+        if field.afterMlen:
+            start = 'byteMsg[1]+{:d}'.format(field.offset)
+            value = "from_bytes(byteMsg[{0:s}:{0:s}+{1:d}], 'big')".format(start, field.width)
+        elif field.width == UNTIL_MLEN:
+            value = "from_bytes(byteMsg[{:d}:byteMsg[1]], 'big')".format(field.offset)
+        else:
+            value = wordNames[wordIndex[(field.offset, field.width)]]
+        if field.shift:
+            value = '({:s} >> {:d})'.format(value, field.shift)
+        if field.mask is not None:
+            value = '({:s} & {:#x})'.format(value, field.mask)
+        if field.scale is not None:
+            namespace['s{:d}'.format(ii)] = _scalar(field.scale)
+            value = 's{:d}({:s})'.format(ii, value)
+        items.append(value)
+    lines.append('    msgDict = {')
+    for field, value in zip(fields, items):
+        lines.append('        {!r}: {:s},'.format(field.name, value))
+    lines.append('        }')
+    lines.append('    return finish(msgDict)' if finish else '    return msgDict')
+    exec('\n'.join(lines), namespace)
+    bufferDecoder = namespace['decoder']
+    return bufferDecoder if fromBuffer else _hexDecoder(bufferDecoder)
+
+def _hexDecoder(bufferDecoder):
+    # decoder(msg) of a hex string, from the decoder of the bytes
+    def decoder(msg):
+        byteMsg = bytes.fromhex(msg)
+        return bufferDecoder(byteMsg, 0, len(byteMsg), msg)
+    return decoder
+
+def _recordExpression(field):
+    # source for the value of field in a record, b = buffer, s = start of message
+    if field.afterMlen:
+        start = 's+b[s+1]+{:d}'.format(field.offset)
+        value = "from_bytes(b[{0:s}:min({0:s}+{1:d}, s+stop)], 'big')".format(start, field.width)
+    elif field.width == UNTIL_MLEN:
+        value = "from_bytes(b[s+{:d}:s+min(b[s+1], stop)], 'big')".format(field.offset)
+    elif field.width == 1:
+        value = 'b[s+{:d}]'.format(field.offset)
+    else:
+        value = "from_bytes(b[s+{:d}:s+{:d}], 'big')".format(field.offset,
+                                                           field.offset + field.width)
+    if field.shift:
+        value = '({:s} >> {:d})'.format(value, field.shift)
+    if field.mask is not None:
+        value = '({:s} & {:#x})'.format(value, field.mask)
+    return value
+
+def compileRecord(message_type, fields, finish=None, decoder=None, shortAsIgnore=False):
+    """
+    Compile fields into a record class, the compact form of the msgDict
+
+        record = recordClass(buffer, start, raw_value, length=None)
+
+    The record keeps a reference to the bytes of the message (buffer from
+    start, padded to minLength, usually shared by many messages) and decodes
+    a field when it is read, e.g., record.pod_progress. Scaled fields are
+    decoded once and kept in a slot, Const fields are class attributes.
+    to_dict() returns the msgDict of the decoder (same keys, same order).
+    raw_value None => the hex string is made from the bytes (length of
+    them) the first time record.raw_value is read. The record does not
+    check the length of the message, see checkRecordLength (shortAsIgnore
+    True => a short message is given the ignoreMsg record instead).
+
+    With a finish hook the whole msgDict (from decoder, the fromBuffer
+    version of compileDecoder) is built the first time a field is read,
+    since finish may change or remove any field.
+    """
+    minLength = _minLength(fields)
+    className = 'MsgRecord_' + ''.join(x if x.isalnum() else '_' for x in str(message_type))
+    fieldNames = tuple(x.name for x in fields)
+    namespace = {'from_bytes': int.from_bytes, 'decoder': decoder, 'fieldNames': fieldNames}
+    slots = ['_buffer', '_start', '_length', '_raw']
+    body = []
+    for ii, field in enumerate(fields):
+        if isinstance(field, Const):
+            namespace['c{:d}'.format(ii)] = field.value
+            body.append('    {:s} = c{:d}'.format(field.name, ii))
+            continue
+        if isinstance(field, Raw):
+            if field.name != 'raw_value':
+                body += ['    @property',
+                         '    def {:s}(self):'.format(field.name),
+                         '        return self.raw_value']
+            continue
+        body += ['    @property',
+                 '    def {:s}(self):'.format(field.name)]
+        if finish:
+            body += ['        try:',
+                     '            return self.to_dict(False)[{!r}]'.format(field.name),
+                     '        except KeyError:',
+                     '            raise AttributeError({!r})'.format(field.name)]
+            continue
+        read = ['        b = self._buffer',
+                '        s = self._start']
+        if field.afterMlen or field.width == UNTIL_MLEN:
+            read.append('        stop = max(self._length, {:d})'.format(minLength))
+        value = _recordExpression(field)
+        if field.scale is None:
+            body += read + ['        return ' + value]
+            continue
+        namespace['s{:d}'.format(ii)] = _scalar(field.scale)
+        slots.append('_' + field.name)
+        body += ['        try:',
+                 '            return self._{:s}'.format(field.name),
+                 '        except AttributeError:',
+                 '            pass']
+        body += read + ['        value = self._{:s} = s{:d}({:s})'.format(field.name, ii, value),
+                        '        return value']
+    if finish:
+        slots.append('_msgDict')
+        body += ['    def to_dict(self, copy=True):',
+                 '        try:',
+                 '            msgDict = self._msgDict',
+                 '        except AttributeError:',
+                 '            msgDict = self._msgDict = decoder(self._buffer, self._start,',
+                 '                                              self._length, self._raw)',
+                 '        return dict(msgDict) if copy else msgDict']
+    else:
+        body += ['    def to_dict(self):',
+                 '        return {name: getattr(self, name) for name in fieldNames}']
+    lines = ['class {:s}:'.format(className),
+             '    __slots__ = {!r}'.format(tuple(slots)),
+             '    fieldNames = fieldNames',
+             '    minLength = {:d}'.format(minLength),
+             '    requiredLength = {:d}'.format(_requiredLength(fields)),
+             '    afterMlenLength = {:d}'.format(_afterMlenLength(fields)),
+             '    shortAsIgnore = {!r}'.format(shortAsIgnore),
+             '    recordType = {!r}'.format(message_type),
+             '    def __init__(self, buffer, start, raw_value, length=None):',
+             '        self._buffer = buffer',
+             '        self._start = start',
+             '        self._raw = raw_value',
+             '        self._length = len(raw_value) >> 1 if length is None else length',
+             '    @property',
+             '    def raw_value(self):',
+             '        raw = self._raw',
+             '        if raw is None:',
+             '            s = self._start',
+             '            raw = self._raw = bytes(self._buffer[s:s+self._length]).hex()',
+             '        return raw',
+             '    def __repr__(self):',
+             "        return '{:s}({{!r}})'.format(self.raw_value)".format(className)]
+    exec('\n'.join(lines + body), namespace)
+    return namespace[className]
+
+# fields of processMsg for a message without a parser (messagePatternParsing.ignoreMsg)
+#   message_type is hex(mtype), e.g., '0x5'
+ignoreFields = (Field('mtype', 0), Field('message_type', 0, scale=hex), Raw())
+ignoreBuffer = compileDecoder(ignoreFields, fromBuffer=True)
+
+def registerMsgType(message_type, fields, finish=None, finishBatch=None, shortAsIgnore=False):
+    """
+    Add the field list of a message_type to msgFieldSpecs and return its decoder
+
+        fields         tuple of Field, Const and Raw in msgDict order
+        finish         optional finish(msgDict) -> msgDict for one message
+        finishBatch    optional finishBatch(table, byteMat) -> table for a column table
+        shortAsIgnore  True => a message too short for fields is decoded as
+                       ignoreMsg (mtype, message_type hex(mtype) and raw_value)
+                       instead of raising ValueError; for the types processMsg
+                       ignored before they had a parser, so a truncated
+                       message of that type does not stop the analysis
+    """
+    fields = tuple(fields)
+    msgFieldSpecs[message_type] = MsgSpec(message_type, fields, finish, finishBatch,
+                                          _minLength(fields), _requiredLength(fields),
+                                          _afterMlenLength(fields), shortAsIgnore)
+    bufferDecoder = compileDecoder(fields, finish, True, message_type,
+                                   ignoreBuffer if shortAsIgnore else None)
+    msgBufferDecoders[message_type] = bufferDecoder
+    msgRecordClasses[message_type] = compileRecord(message_type, fields, finish, bufferDecoder,
+                                                   shortAsIgnore)
+    return _hexDecoder(bufferDecoder)
+
+def _hexMatrix(msgList, numBytes):
+    # hex strings -> (len(msgList), numBytes) uint8 matrix, zero padded on right
+    width = 2*numBytes
+    joined = ''.join([msg[:width].ljust(width, '0') for msg in msgList])
+    byteMsg = np.frombuffer(bytes.fromhex(joined), dtype=np.uint8)
+    return byteMsg.reshape(len(msgList), numBytes)
+
+def _bufferMatrix(payload, offsets, lengths, numBytes):
+    # messages payload[offsets[ii]:offsets[ii]+lengths[ii]] -> (len(offsets), numBytes)
+    #   uint8 matrix, zero padded on right (same as _hexMatrix of their hex strings)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    columns = np.arange(numBytes)
+    isInside = columns < np.asarray(lengths, dtype=np.int64)[:, None]
+    byteMat = np.zeros((len(offsets), numBytes), dtype=np.uint8)
+    byteMat[isInside] = payload[(offsets[:, None] + columns)[isInside]]
+    return byteMat
+
+def _combine(byteMat, start, stop):
+    # column version of int.from_bytes(byteMsg[start:stop], 'big')
+    fullInt = np.zeros(byteMat.shape[0], dtype=np.uint64)
+    for col in range(start, stop):
+        fullInt = (fullInt << np.uint64(8)) | byteMat[:, col]
+    return fullInt
+
+def _objectColumn(values):
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+def _narrowType(numBits):
+    # smallest unsigned dtype holding numBits
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if numBits <= 8*np.dtype(dtype).itemsize:
+            return dtype
+    return np.uint64
+
+def _needsMlen(spec):
+    return any(isinstance(x, Field) and (x.afterMlen or x.width == UNTIL_MLEN)
+               for x in spec.fields)
+
+def decodeBatch(message_type, msgList):
+    """
+    Decode msgList (hex strings, all of message_type) into a column table:
+    dict of numpy arrays with the keys of the msgDict from the decoder
+    """
+    spec = msgFieldSpecs[message_type]
+    lengths = np.array([len(msg) // 2 for msg in msgList], dtype=np.int64)
+    numBytes = spec.minLength
+    if _needsMlen(spec) and len(lengths):
+        numBytes = max(numBytes, int(np.max(lengths)), spec.afterMlenLength)
+    return _decodeMatrix(spec, _hexMatrix(msgList, numBytes), msgList, lengths)
+
+def decodeBuffer(message_type, payload, offsets, lengths):
+    """
+    decodeBatch for messages already decoded to bytes: message ii is
+    payload[offsets[ii]:offsets[ii]+lengths[ii]] (payload a uint8 array, e.g.,
+    a memory map); no hex strings are made, so the Raw columns (raw_value)
+    are left out of the column table
+    """
+    spec = msgFieldSpecs[message_type]
+    numBytes = spec.minLength
+    if _needsMlen(spec) and len(lengths):
+        numBytes = max(numBytes, int(np.max(lengths)), spec.afterMlenLength)
+    return _decodeMatrix(spec, _bufferMatrix(payload, offsets, lengths, numBytes), None, lengths)
+
+def _checkLengths(spec, byteMat, lengths):
+    # bool array, True for the messages missing a field that is not optional
+    #   messageTooShort for the first of them unless spec.shortAsIgnore
+    lengths = np.asarray(lengths, dtype=np.int64)
+    needed = np.full(len(byteMat), spec.requiredLength, dtype=np.int64)
+    if spec.afterMlenLength:
+        afterMlen = byteMat[:, 1].astype(np.int64) + spec.afterMlenLength
+        needed = np.where(lengths >= 2, np.maximum(needed, afterMlen), needed)
+    isShort = lengths < needed
+    if not spec.shortAsIgnore and np.any(isShort):
+        row = np.flatnonzero(isShort)[0]
+        raise messageTooShort(spec.message_type, int(lengths[row]), int(needed[row]))
+    return isShort
+
+def _decodeMatrix(spec, byteMat, msgList, lengths):
+    # column table of the messages in byteMat (one row per message)
+    #   msgList None => no Raw columns
+    #   lengths      bytes of each message, checked against the fields
+    #   shortAsIgnore types also get the column 'parsed', False for the short
+    #   messages: their msgDict is the ignoreMsg one and their other columns
+    #   are decoded from zeros (see messageBatchParsing.getMsgDict)
+    isShort = _checkLengths(spec, byteMat, lengths)
+    if np.any(isShort):
+        byteMat = byteMat.copy()
+        byteMat[isShort, 1:] = 0
+    numRows = len(byteMat)
+    mlen = byteMat[:, 1].astype(np.int64)
+    rows = np.arange(numRows)
+
+    wordCache = {}
+    table = {}
+    for field in spec.fields:
+        if isinstance(field, Const):
+            table[field.name] = _objectColumn([field.value] * numRows)
+            continue
+        if isinstance(field, Raw):
+            if msgList is not None:
+                table[field.name] = _objectColumn(msgList)
+            continue
+        if field.width == UNTIL_MLEN:
+            value = np.array([int.from_bytes(bytes(byteMat[ii, field.offset:mlen[ii]]), 'big')
+                              for ii in range(numRows)], dtype=object)
+            numBits = None
+        elif field.afterMlen:
+            value = np.zeros(numRows, dtype=np.uint64)
+            for col in range(field.width):
+                value = (value << np.uint64(8)) | byteMat[rows, mlen + field.offset + col]
+            numBits = 8*field.width
+        else:
+            word = (field.offset, field.width)
+            if word not in wordCache:
+                wordCache[word] = _combine(byteMat, field.offset, field.offset + field.width)
+            value = wordCache[word]
+            numBits = 8*field.width
+        if field.shift:
+            value = value >> np.uint64(field.shift)
+            numBits -= field.shift
+        if field.mask is not None:
+            value = value & np.uint64(field.mask)
+            numBits = field.mask.bit_length()
+        if numBits is not None:
+            value = value.astype(_narrowType(numBits))
+        scale = field.scale
+        if scale is None:
+            table[field.name] = value
+        elif isinstance(scale, Scale) and scale.column is not None:
+            table[field.name] = scale.column(value)
+        else:
+            table[field.name] = _objectColumn([_scalar(scale)(x) for x in value.tolist()])
+    if spec.shortAsIgnore:
+        table['parsed'] = ~isShort
+    if spec.finishBatch:
+        table = spec.finishBatch(table, byteMat)
+    return table
@@ -0,0 +1,262 @@
+# file: messageLake - message level Parquet store of every report (needs pyarrow)
+#   lakeDir/podState           one row per message: the podState columns
+#   lakeDir/messages/<type>    one row per message of that type: the decoded
+#                              columns of processMsgBatch (e.g., messages/1d)
+#   lakeDir/reports/<key>.json the reportHash and files of every report
+#                              (key from the report filename)
+#   every dataset is partitioned person=/lot=/date= (hive folders, date of the
+#   message, UTC) and each report writes files named by its reportHash, so
+#   exporting a report again replaces its files, and exporting a changed
+#   report first deletes the files of its earlier version (see lakeDir/reports)
+import os
+import json
+import hashlib
+import functools
+
+import numpy as np
+
+# pyarrow and pyarrow.dataset, imported by _requireArrow on first use (they
+#   take about half a second to import and most runs never touch the lake)
+pa = ds = None
+
+from analyzeMessageLogsRev3 import *
+from reportCache import hashReport
+from messageFieldSpecs import msgFieldSpecs, decodeBatch
+
+lakePartitionNames = ('person', 'lot', 'date')
+
+# compact types for the podState columns (all times are whole seconds)
+lakeColumnTypes = {
+    'msg_idx': 'int32', 'time_delta': 'int32', 'timeCumSec': 'int32',
+    'radioOnCumSec': 'int32', 'pod_progress': 'int8', 'insulinPulses': 'int32',
+    'reqTBTenthPulses': 'int32', 'reqBolusPulses': 'int32'}
+
+# decoded columns left out of messages/<type>, already in podState
+lakeSkipNames = ('message_type', 'raw_value')
+
+def _requireArrow():
+    global pa, ds
+    if pa is None:
+        try:
+            import pyarrow
+            import pyarrow.dataset
+        except ImportError:
+            raise ImportError('messageLake needs pyarrow: pip install pyarrow') from None
+        pa, ds = pyarrow, pyarrow.dataset
+
+def _lakePartitioning():
+    return ds.partitioning(pa.schema([('person', pa.string()), ('lot', pa.string()),
+                                      ('date', pa.date32())]), flavor='hive')
+
+def _lakePath(lakeDir, dataset):
+    if dataset == 'podState':
+        return os.path.join(lakeDir, 'podState')
+    return os.path.join(lakeDir, 'messages', dataset)
+
+@functools.lru_cache(maxsize=None)
+def _decodedTypes(message_type):
+    # numpy dtype of every decoded column of message_type (from its field list)
+    if message_type not in msgFieldSpecs:
+        return {}
+    return {x: y.dtype for x, y in decodeBatch(message_type, []).items()}
+
+def _arrowColumn(values, dtype=None):
+    # numpy column to arrow, object columns (text, lists) as strings
+    #   a float column with nan for an integer dtype (e.g., 02 registers reset
+    #   by a 0x34 fault) keeps that dtype with nulls, so every file of a
+    #   dataset has the same schema
+    values = np.asarray(values)
+    if dtype is not None and dtype.kind in 'biu' and values.dtype.kind == 'f':
+        isNan = np.isnan(values)
+        return pa.array(np.where(isNan, 0, values).astype(dtype), mask=isNan)
+    if values.dtype == object:
+        return pa.array([None if x is None else str(x) for x in values.tolist()],
+                        type=pa.string())
+    return pa.array(values)
+
+def getLakeTables(thisPath, thisFile, cache=None):
+    """
+    Purpose: the lake tables of one report
+
+    Input:
+        thisPath, thisFile    as for analyzeMessageLogsRev3
+        cache                 ReportCache (optional)
+
+    Output:
+        reportHash    sha256 of the report file
+        tableDict     'podState' or message_type (processMsgBatch key) -> pyarrow Table,
+                      each with reportHash, msg_idx and timeStamp plus the
+                      person, lot and date partition columns
+    """
+    _requireArrow()
+    radio_on_time = 30
+    filename = thisPath + '/' + thisFile
+    if cache:
+        commands, podDict = cache.read_file(filename)
+    else:
+        commands, podDict = read_file(filename)
+
+    # same quick and dirty fix as analyzeLoopReport
+    commands[-1]['raw_value'] = commands[-1]['raw_value'].replace('\nstatus:','')
+
+    times = [x['time'] for x in commands]
+    timeNs = parseLogTimes(times)
+    if timeNs is None:
+        timeNs = pd.to_datetime(times).asi8
+    time_delta = getTimeDelta(timeNs)
+    rawValues = np.array([x['raw_value'] for x in commands], dtype=object)
+    msgTables = processMsgBatch(rawValues)
+    stateTable = getPodStateColumns(
+        rawValues, time_delta, getTimeAsleep(time_delta, radio_on_time), tableDict=msgTables)[0]
+
+    reportHash = hashReport(filename)
+    thisPerson = parse_info_from_filename(thisFile)[0]
+    timeStamp = pa.array(np.asarray(timeNs, dtype=np.int64), type=pa.timestamp('ns', tz='UTC'))
+    date = pa.array(np.asarray(timeNs, dtype=np.int64) // 86400000000000, type=pa.int32()) \
+        .cast(pa.date32())
+
+    def frame(msgIdx, columns):
+        # identity and partition columns, then columns
+        table = {'reportHash': pa.array([reportHash] * len(msgIdx)).dictionary_encode(),
+                 'msg_idx': pa.array(msgIdx.astype(np.int32)),
+                 'timeStamp': timeStamp.take(pa.array(msgIdx))}
+        table.update(columns)
+        table['person'] = pa.array([thisPerson] * len(msgIdx), type=pa.string())
+        table['lot'] = pa.array([podDict['lot']] * len(msgIdx), type=pa.string())
+        table['date'] = date.take(pa.array(msgIdx))
+        return pa.table(table)
+
+    numRows = len(rawValues)
+    columns = {'type': pa.array([x['type'] for x in commands]).dictionary_encode()}
+    for name in podStateColumnNames:
+        if name in ('df_idx', 'timeStamp'):
+            continue
+        values = rawValues if name == 'raw_value' else stateTable[name]
+        if name in lakeColumnTypes:
+            values = np.asarray(values).astype(lakeColumnTypes[name])
+        column = _arrowColumn(values)
+        if name == 'message_type':
+            column = column.dictionary_encode()
+        columns[name] = column
+    tableDict = {'podState': frame(np.arange(numRows), columns)}
+
+    for thisType, table in msgTables.items():
+        dtypes = _decodedTypes(thisType)
+        columns = {x: _arrowColumn(y, dtypes.get(x)) for x, y in table.items()
+                   if x not in lakeSkipNames and x != 'msg_idx'}
+        tableDict[thisType] = frame(table['msg_idx'], columns)
+    return reportHash, tableDict
+
+def _reportIndexPath(lakeDir, thisFile):
+    # one small file per report, so the batch workers never write the same file
+    key = hashlib.sha1(thisFile.encode('UTF8')).hexdigest()
+    return os.path.join(lakeDir, 'reports', key + '.json')
+
+def _readReportIndex(indexPath):
+    try:
+        with open(indexPath, 'rt') as stream_in:
+            return json.load(stream_in)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def _hashInUse(lakeDir, reportHash, indexPath):
+    # True if a report other than the one at indexPath has reportHash (same contents)
+    indexDir = os.path.dirname(indexPath)
+    for name in os.listdir(indexDir):
+        thisPath = os.path.join(indexDir, name)
+        if thisPath != indexPath and name.endswith('.json'):
+            entry = _readReportIndex(thisPath)
+            if entry and entry['reportHash'] == reportHash:
+                return True
+    return False
+
+def writeLakeReport(lakeDir, thisPath, thisFile, cache=None):
+    """
+    Write (or replace) the lake files of one report, returns its reportHash
+
+    The files of an earlier version of thisFile (another reportHash, found in
+    lakeDir/reports) are deleted first, unless a report with the same
+    contents still uses them
+    """
+    reportHash, tableDict = getLakeTables(thisPath, thisFile, cache)
+    indexPath = _reportIndexPath(lakeDir, thisFile)
+    oldEntry = _readReportIndex(indexPath)
+    if oldEntry and oldEntry['reportHash'] != reportHash and \
+            not _hashInUse(lakeDir, oldEntry['reportHash'], indexPath):
+        for name in oldEntry['files']:
+            try:
+                os.remove(os.path.join(lakeDir, name))
+            except FileNotFoundError:
+                pass
+
+    files = []
+    for dataset, table in tableDict.items():
+        ds.write_dataset(table, _lakePath(lakeDir, dataset), format='parquet',
+                         partitioning=_lakePartitioning(),
+                         basename_template=reportHash + '-{i}.parquet',
+                         existing_data_behavior='overwrite_or_ignore',
+                         file_visitor=lambda written: files.append(
+                             os.path.relpath(written.path, lakeDir)))
+
+    os.makedirs(os.path.dirname(indexPath), exist_ok=True)
+    tempName = indexPath + '.{:d}.tmp'.format(os.getpid())
+    with open(tempName, 'wt') as stream_out:
+        json.dump({'thisFile': thisFile, 'reportHash': reportHash, 'files': files}, stream_out)
+    os.replace(tempName, indexPath)
+    return reportHash
+
+def getLakeDatasets(lakeDir):
+    # names of the datasets in lakeDir: 'podState' and the message types
+    messagesDir = os.path.join(lakeDir, 'messages')
+    names = ['podState'] if os.path.isdir(_lakePath(lakeDir, 'podState')) else []
+    if os.path.isdir(messagesDir):
+        names += sorted(os.listdir(messagesDir))
+    return names
+
+def openLake(lakeDir, dataset='podState'):
+    """
+    Lazy pyarrow Dataset of one lake dataset, nothing is read until it is
+    scanned, e.g., openLake(lakeDir, '1d').to_table(columns=..., filter=...)
+    """
+    _requireArrow()
+    return ds.dataset(_lakePath(lakeDir, dataset), format='parquet',
+                      partitioning=_lakePartitioning())
+
+def lakeFilter(**values):
+    """
+    pyarrow filter expression from column=value pairs, a list or tuple value
+    matches any of its values, e.g., lakeFilter(person='Joe', message_type='06')
+    dates are datetime.date values
+    """
+    _requireArrow()
+    expression = None
+    for name, value in values.items():
+        if isinstance(value, (list, tuple)):
+            thisExpression = ds.field(name).isin(list(value))
+        else:
+            thisExpression = ds.field(name) == value
+        expression = thisExpression if expression is None else expression & thisExpression
+    return expression
+
+def loadLake(lakeDir, dataset='podState', columns=None, filter=None):
+    """
+    Purpose: read part of a lake dataset of the whole fleet into a DataFrame
+
+    Input:
+        lakeDir    folder written by writeLakeReport
+        dataset    'podState' or a message type, e.g., '1d', '06', '1a16'
+        columns    list of columns to read (None => every column)
+        filter     pyarrow expression (e.g., from lakeFilter), or dict of
+                   column=value pairs
+
+    Output:
+        DataFrame with the matching rows
+
+    Only the named columns are read, and the filter skips every partition
+    folder (person, lot, date) and Parquet row group it rules out, e.g.,
+        loadLake(lakeDir, columns=['timeStamp', 'message_type'],
+                 filter=lakeFilter(lot='L12345', message_type='06'))
+    """
+    if isinstance(filter, dict):
+        filter = lakeFilter(**filter)
+    return openLake(lakeDir, dataset).to_table(columns=columns, filter=filter).to_pandas()
@@ -6,11 +6,10 @@ import time
 #from matplotlib.dates import DateFormatter
 #from pandas.plotting import register_matplotlib_converters
 import re
-import pandas as pd
+import io
 import os
-import markdown
-from bs4 import BeautifulSoup, NavigableString, Tag
-import re
+# numpy, pandas, markdown and bs4 are imported by the functions that use them,
+#   so scripts that only list reports (parse_info_from_filename) start fast
 
 # Some markdown headings don't start on their own line. This regular expression
 # finds them so we can insert a newline.
@@ -28,6 +27,9 @@ def _parse_filehandle(filehandle):
     Returns:
        A dict of markdown heading -> list of text from that heading
     """
+    import markdown
+    from bs4 import BeautifulSoup, NavigableString, Tag
+
     content = filehandle.read()
     for fixme in re.findall(FIXME_RE, content):
         content = content.replace(fixme, '\n' + fixme, 1)
@@ -49,6 +51,179 @@ def _parse_filehandle(filehandle):
                 data[header.text].extend([text for text in nextNode.stripped_strings])
     return data
 
+# Line-oriented equivalents of the markdown structures _parse_filehandle relies on
+HEADING_RE = re.compile(r'^(#{1,6})(.*?)#*$')
+LIST_ITEM_RE = re.compile(r'^ {0,3}(?:[*+-]|\d+\.)\s+(.*)$')
+# inside a list, an indented marker is a nested item
+NESTED_ITEM_RE = re.compile(r'^\s+(?:[*+-]|\d+\.)\s+(.*)$')
+# under the first line of a block, makes that line a heading (= h1, - h2)
+SETEXT_RE = re.compile(r'^[=-]+ *$')
+# horizontal rule, splits the block it is in
+RULE_RE = re.compile(r'^ {0,3}(?:(?:-+ {0,2}){3,}|(?:_+ {0,2}){3,}|(?:\*+ {0,2}){3,}) *$')
+
+
+def _split_fixme(line):
+    # same rule as FIXME_RE in _parse_filehandle: a heading inside a line
+    #   starts a new line (a bare '##' is left alone, there the replace in
+    #   _parse_filehandle lands on an earlier heading)
+    if '##' not in line:
+        return (line,)
+    pieces = []
+    position = 0
+    for fixme in FIXME_RE.finditer(line):
+        if fixme.group(1).rstrip().lstrip('#'):
+            pieces.append(line[position:fixme.start(1)])
+            position = fixme.start(1)
+    pieces.append(line[position:])
+    return pieces
+
+def _iter_report_sections(filehandle):
+    """Stream (heading, text) pairs for the headings we want to extract.
+
+    Scans the file one line at a time (no markdown -> html -> soup round
+    trip), so memory does not grow with the size of the report. The text
+    strings are the same ones _parse_filehandle collects: one per list item
+    (nested items are items of their own, lazy continuation lines are joined
+    with newline), one per paragraph or code block and one per nested heading
+    (h1, h4-h6, including setext headings). An h2 or h3 heading ends a
+    section, rule lines give no text (unless underlined, then they are a
+    setext heading). A block indented 8 past its list item is a code block
+    of the item, the next less indented line (or item marker) ends it.
+
+    One known difference: a '## heading' split off a line inside a list item
+    is text of the item here, the markdown path also starts a section there
+    (see test_heading_inside_item). Loop Reports do not nest headings.
+
+    Args:
+       filehandle: a python file object
+    Yields:
+       (markdown heading, text) for every text below the extracted headings
+    """
+    heading = None      # heading being extracted, None if outside those sections
+    block = []          # lines of the current list item, paragraph or code block
+    kind = None         # the current markdown block: 'list', 'para', 'code', 'rule' or None
+    indent = 0          # indentation of the current block, removed from its lines
+    numLines = 0        # lines of the current markdown block
+    itemLines = 0       # lines of the current list item
+    firstLine = ''      # first line of the current markdown block
+    inList = False      # indented blocks belong to the last list item
+    nested = False      # the current block is inside a list item (indented after a blank line)
+    itemIndent = 0      # indentation of the last list item marker
+    itemLine = None     # the current list item, if it starts a nested list
+
+    def finish():
+        # text of the current list item, paragraph or code block, if any
+        text = '\n'.join(block).strip()
+        return [(heading, text)] if heading is not None and text else []
+
+    for line in filehandle:
+        for piece in _split_fixme(line.rstrip('\r\n').expandtabs(4)):
+            text = piece.strip()
+            if not text:
+                if kind == 'code':
+                    block.append('')
+                else:
+                    yield from finish()
+                    block, kind, nested = [], None, False
+                continue
+            if kind == 'code' and not piece.startswith(' ' * indent):
+                # a less indented line ends the code block (also a list item
+                #   marker below a code block inside a list item)
+                yield from finish()
+                block, kind = [], None
+            isHeading = piece[0] == '#' and HEADING_RE.match(piece)
+            if isHeading or (kind in ('list', 'para', 'rule') and numLines == 1 and
+                             SETEXT_RE.match(piece)):
+                if isHeading:
+                    yield from finish()
+                    level, text = len(isHeading.group(1)), isHeading.group(2).strip()
+                else:
+                    # the first line of the block is the heading, not text
+                    level, text = (1 if piece[0] == '=' else 2), firstLine.strip()
+                block = []
+                if nested:
+                    # a heading inside a list item is only text
+                    if heading is not None and text:
+                        yield heading, text
+                    kind = None
+                    continue
+                kind, inList = None, False
+                if level in (2, 3):
+                    heading = text if text in MARKDOWN_HEADINGS_TO_EXTRACT else None
+                elif heading is not None and text:
+                    yield heading, text
+                continue
+            if kind != 'code' and piece[0] in ' -_*' and RULE_RE.match(piece):
+                yield from finish()
+                block, inList = [], inList and nested
+                if kind in (None, 'rule'):
+                    # a rule starting a block is a heading if the next line underlines it
+                    kind, firstLine, numLines = 'rule', piece, 1
+                else:
+                    kind = None
+                continue
+            if kind == 'rule':
+                kind = None
+            if kind is None:
+                # first line of a markdown block
+                isItem = LIST_ITEM_RE.match(piece) or \
+                    (inList and NESTED_ITEM_RE.match(piece))
+                indent = (len(piece) - len(piece.lstrip(' '))) // 4 * 4
+                nested = nested or (inList and piece.startswith('    '))
+                if isItem:
+                    block, kind, inList, itemLines = [isItem.group(1)], 'list', True, 1
+                    itemLine = text if indent else None
+                    itemIndent = indent
+                elif nested and piece.startswith(' ' * (itemIndent + 8)):
+                    # a code block of the list item, indented past the item text
+                    block, kind, indent = [piece[itemIndent + 8:]], 'code', itemIndent + 8
+                elif nested:
+                    # a paragraph of the list item, item markers below it are text
+                    block, kind = [text], 'para'
+                elif indent:
+                    block, kind, indent = [piece[4:]], 'code', 4
+                else:
+                    block, kind, inList = [text], 'para', False
+                firstLine, numLines = piece, 1
+                continue
+            numLines += 1
+            isItem = kind == 'list' and \
+                (LIST_ITEM_RE.match(piece) or NESTED_ITEM_RE.match(piece))
+            lead = len(piece) - len(piece.lstrip(' '))
+            if isItem:
+                yield from finish()
+                block, itemLines = [isItem.group(1)], 1
+                itemLine = text if lead // 4 * 4 > indent else None
+                indent = itemIndent = lead // 4 * 4
+            elif kind == 'list' and itemLines == 1 and SETEXT_RE.match(piece[min(indent, lead):]):
+                # underlines the item: its text is a heading inside the item,
+                #   the whole line if the item starts a nested list
+                if itemLine is not None:
+                    block = [itemLine]
+                yield from finish()
+                block, itemLines, itemLine = [], 0, None
+            else:
+                # lazy continuation line, indented relative to its block
+                block.append(piece[min(indent, lead):].rstrip())
+                itemLines += 1
+    yield from finish()
+
+def _stream_filehandle(filehandle):
+    """Streaming replacement for _parse_filehandle as used by read_file.
+
+    Returns:
+       commands  list of command dicts from the MessageLog section
+       pod_dict  dict from the PodState section
+    """
+    commands = []
+    pod_state = []
+    for heading, text in _iter_report_sections(filehandle):
+        if heading == 'MessageLog':
+            commands.append(_command_dict(text))
+        elif heading == 'PodState':
+            pod_state.append(text)
+    return commands, _extract_pod_state({'PodState': pod_state})
+
 def _command_dict(data):
     timestamp, direction, value = data.rsplit(' ', 2)
     return dict(time=timestamp, type=direction, raw_value=value[12:])
@@ -57,13 +232,36 @@ def _extract_pod_state(data):
     return dict([[x.strip() for x in v.split(':', 1)]
             for v in data['PodState']])
 
-def read_file(filename):
-    file = open(filename, "r", encoding='UTF8')
-    parsed_content = _parse_filehandle(file)
-    commands = [_command_dict(m) for m in parsed_content['MessageLog']]
-    pod_dict = _extract_pod_state(parsed_content)
+def read_file(filename, useMarkdown=False):
+    """Read the MessageLog and PodState sections of a Loop Report.
+
+    Args:
+       filename:    Loop Report .md file
+       useMarkdown: if True, use the original markdown/BeautifulSoup parser
+                    instead of the streaming line reader (to cross check)
+    Returns:
+       commands, pod_dict
+    """
+    with open(filename, "r", encoding='UTF8') as file:
+        if useMarkdown:
+            parsed_content = _parse_filehandle(file)
+            commands = [_command_dict(m) for m in parsed_content['MessageLog']]
+            pod_dict = _extract_pod_state(parsed_content)
+        else:
+            commands, pod_dict = _stream_filehandle(file)
     return commands, pod_dict
 
+def read_bytes(data):
+    """Same as read_file for the contents of a Loop Report already read into memory.
+
+    Args:
+       data:  contents of the Loop Report .md file (bytes)
+    Returns:
+       commands, pod_dict
+    """
+    with io.TextIOWrapper(io.BytesIO(data), encoding='UTF8') as file:
+        return _stream_filehandle(file)
+
 def select_extra_command(raw_value):
     if raw_value[:2]=='1a':
         if raw_value[32:34] not in ['16','17']:
@@ -71,12 +269,83 @@ def select_extra_command(raw_value):
         else:
             return raw_value[32:34]
 
+# MessageLog times are 'YYYY-mm-dd HH:MM:SS +0000', read straight from the bytes
+LOG_TIME_FORMAT = b'dddd-dd-dd dd:dd:dd +0000'
+
+def parseLogTimes(times):
+    """
+    Return the MessageLog times as int64 nanoseconds since the epoch (UTC),
+    or None if any of them is not in the fixed LOG_TIME_FORMAT
+    """
+    import numpy as np
+
+    numChar = len(LOG_TIME_FORMAT)
+    try:
+        text = np.asarray(times, dtype=object).astype('S{:d}'.format(numChar + 1))
+    except UnicodeEncodeError:
+        return None
+    byteMat = text.view(np.uint8).reshape(len(text), numChar + 1)
+    template = np.frombuffer(LOG_TIME_FORMAT, dtype=np.uint8)
+    isDigit = template == ord('d')
+    digits = byteMat[:, :numChar] - np.uint8(ord('0'))
+    if np.any(byteMat[:, numChar]) or np.any(digits[:, isDigit] > 9) or \
+       np.any(byteMat[:, :numChar][:, ~isDigit] != template[~isDigit]):
+        return None
+    digits = digits.astype(np.int64)
+    number = lambda start, stop: digits[:, start:stop] @ 10**np.arange(stop - start - 1, -1, -1)
+    year, month, day = number(0, 4), number(5, 7), number(8, 10)
+    hour, minute, second = number(11, 13), number(14, 16), number(17, 19)
+    months = (year - 1970)*12 + month - 1
+    firstDay = months.astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+    monthDays = (months + 1).astype('datetime64[M]').astype('datetime64[D]').astype(np.int64) - firstDay
+    if np.any((month < 1) | (month > 12) | (day < 1) | (day > monthDays) |
+              (hour > 23) | (minute > 59) | (second > 59)):
+        return None
+    seconds = (((firstDay + day - 1)*24 + hour)*60 + minute)*60 + second
+    return seconds * 1000000000
+
+def getCommandColumn(raw_value):
+    # vectorized select_extra_command: mtype plus the 1a sub-type (13, 16 or 17)
+    import numpy as np
+
+    raw_value = np.asarray(raw_value, dtype=object)
+    command = raw_value.astype('U2').astype('U4')
+    is1a = command == '1a'
+    if np.any(is1a):
+        chars = raw_value[is1a].astype('U34').view(np.uint32).reshape(-1, 34)[:, 32:34]
+        xtype = np.ascontiguousarray(chars).view('U2').ravel()
+        xtype = np.where((xtype == '16') | (xtype == '17'), xtype, '13')
+        command[is1a] = np.char.add('1a', xtype)
+    return command.astype(object)
+
+def getTimeDelta(timeNs):
+    # seconds part of each time difference (same as .dt.seconds), 0 for the first row
+    import numpy as np
+
+    time_delta = np.zeros(len(timeNs))
+    time_delta[1:] = (np.diff(timeNs) // 1000000000) % 86400
+    return time_delta
+
+def getTimeAsleep(time_delta, radio_on_time):
+    # radio_on_time seconds the radio stays awake, nan if it never went to sleep
+    import numpy as np
+
+    return np.where(time_delta > radio_on_time, time_delta - radio_on_time, np.nan)
+
 def generate_table(commands, radio_on_time):
+    import pandas as pd
+
     df = pd.DataFrame(commands)
-    df['time'] = pd.to_datetime(df['time'])
-    df['command'] = df['raw_value'].str[:2].astype(str)+df['raw_value'].apply(select_extra_command).fillna('').astype(str)
-    df['time_delta'] = (df['time']-df['time'].shift()).dt.seconds.fillna(0).astype(float)
-    df['time_asleep'] = df['time_delta'].loc[df['time_delta'] > radio_on_time] - radio_on_time  # radio_on_time seconds the radio stays awake
+    df['command'] = getCommandColumn(df['raw_value'])
+    timeNs = parseLogTimes(df['time'])
+    if timeNs is None:
+        # some other time format, let pandas work it out
+        df['time'] = pd.to_datetime(df['time'])
+        timeNs = pd.DatetimeIndex(df['time']).asi8
+    else:
+        df['time'] = pd.DatetimeIndex(timeNs.view('datetime64[ns]')).tz_localize('UTC')
+    df['time_delta'] = getTimeDelta(timeNs)
+    df['time_asleep'] = getTimeAsleep(df['time_delta'].to_numpy(), radio_on_time)
     return df
 
 # parse the information in the filename
@@ -1,32 +1,44 @@
 # file: messagePatternParsing
+#   the parsers are compiled from the field lists in parse_*.py (see messageFieldSpecs)
 import numpy as np
 from byteUtils import *
 from utils import *
+from messageFieldSpecs import compileRecord, msgRecordClasses, msgBufferDecoders, \
+    checkRecordLength, neededLength, ignoreFields, ignoreBuffer
 
 import parse_02
+import parse_03
 import parse_06
+import parse_07
 import parse_0e
+import parse_11
+import parse_19
 import parse_1a13
 import parse_1a16
 import parse_1a17
+import parse_1c
 import parse_1d
+import parse_1e
 import parse_1f
 
+# processMsg decodes the hex string once and dispatches on its bytes (processMsgAt),
+#   the parse_* functions (parse_1d, parse_1a, ...) decode one type from hex
 # note - parsers not finished return a hex string for 'message_type', e.g., '0x01'
 #        whereas parsers that have been finished use '1a16' or '1d'
+#        (parse_03, 07, 11, 19, 1c and 1e keep the hex string, e.g., '0x7')
 def ignoreMsg(msg):
     msgDict = {}
-    byteMsg = bytearray.fromhex(msg)
-    msgDict['mtype'] = byteMsg[0]
-    msgDict['message_type'] = hex(byteMsg[0])
+    mtype = int(msg[:2], 16)
+    msgDict['mtype'] = mtype
+    msgDict['message_type'] = hex(mtype)
     msgDict['raw_value']    = msg
     return msgDict
 
 def parse_1a(msg):
     # extract information the indicator for type of 1a command
-    byteMsg = bytearray.fromhex(msg)
-    byteList = list(byteMsg)
-    xtype = byteList[16]
+    #   a 1a too short to have the sub-type (byte 16) goes to parse_1a13 (like
+    #   every sub-type other than 16 and 17), which raises ValueError for it
+    xtype = int(msg[32:34] or '0', 16)
     if xtype == 0x16:
         msgDict = parse_1a16.parse_1a16(msg)
     elif xtype == 0x17:
@@ -36,15 +48,117 @@ def parse_1a(msg):
 
     return msgDict
 
-chooseMsgType = {
-    0x02: parse_02.parse_02,
-    0x06: parse_06.parse_06,
-    0x0e: parse_0e.parse_0e,
-    0x1a: parse_1a,
-    0x1d: parse_1d.parse_1d,
-    0x1f: parse_1f.parse_1f,
-}
+# record version of ignoreMsg (ignoreBuffer is the bytes version), message_type is hex(mtype)
+IgnoreRecord = compileRecord('ignore', ignoreFields, decoder=ignoreBuffer)
+
+# mtype -> message_type of its parser (1a is split by the sub-type, see _typeAt)
+chooseBufferType = {int(name, 16) if name.startswith('0x') else int(name[:2], 16): name
+                    for name in msgBufferDecoders if not name.startswith('1a')}
+
+def _typeAt(buffer, start, length):
+    # message_type of the parser for the message at start, None => ignoreMsg
+    #   a 1a without byte 16 is '1a13', as in parse_1a
+    mtype = buffer[start]
+    if mtype == 0x1a:
+        xtype = buffer[start+16] if length > 16 else 0
+        return '1a16' if xtype == 0x16 else '1a17' if xtype == 0x17 else '1a13'
+    return chooseBufferType.get(mtype)
+
+def processMsgAt(buffer, start, length, raw_value=None):
+    """
+    processMsg of a message already decoded to bytes, buffer[start:start+length]
+    (e.g., from decodeMessages or BinaryLog.getMessageBuffer); the parser reads
+    a memoryview slice of buffer, raw_value is made from the bytes if not given
+    """
+    if length < 1:
+        raise ValueError('empty message')
+    message_type = _typeAt(buffer, start, length)
+    if message_type is None:
+        return ignoreBuffer(buffer, start, length, raw_value)
+    return msgBufferDecoders[message_type](buffer, start, length, raw_value)
 
 def processMsg(msg):
-    byteMsg = bytearray.fromhex(msg)
-    return chooseMsgType.get(byteMsg[0],ignoreMsg)(msg)
+    byteMsg = bytes.fromhex(msg)
+    return processMsgAt(byteMsg, 0, len(byteMsg), msg)
+
+# mtype -> parser of a hex string, kept for callers of the old dispatch table
+#   (chooseMsgType.get(mtype, ignoreMsg)(msg)); every entry is processMsg, which
+#   dispatches on the bytes (_typeAt)
+chooseMsgType = {mtype: processMsg for mtype in sorted(set(chooseBufferType) | {0x1a})}
+
+def _recordAt(buffer, start, length, raw_value):
+    # record of the message at start, only a message without its optional
+    #   fields is copied (padded with zeros)
+    message_type = _typeAt(buffer, start, length)
+    recordClass = IgnoreRecord if message_type is None else msgRecordClasses[message_type]
+    if recordClass.shortAsIgnore and length < neededLength(recordClass, buffer, start, length):
+        recordClass = IgnoreRecord
+    checkRecordLength(recordClass, buffer, start, length)
+    if length < recordClass.minLength:
+        byteMsg = bytes(buffer[start:start+length]).ljust(recordClass.minLength, bytes(1))
+        return recordClass(byteMsg, 0, raw_value, length)
+    return recordClass(buffer, start, raw_value, length)
+
+def processMsgRecord(msg):
+    """
+    Same as processMsg, but returns a record instead of a msgDict: the fields
+    are attributes decoded when read (record.pod_progress) and
+    record.to_dict() returns the msgDict of processMsg
+    """
+    byteMsg = bytes.fromhex(msg)
+    if not byteMsg:
+        raise ValueError('empty message')
+    return _recordAt(byteMsg, 0, len(byteMsg), msg)
+
+def decodeMessages(rawValues):
+    """
+    Hex-decode a column of messages once, into one shared buffer
+
+    Output:
+        buffer     bytes of all the messages, one after the other
+        offsets    numpy int64, message ii is buffer[offsets[ii]:offsets[ii]+lengths[ii]]
+        lengths    numpy int64, 0 for empty messages
+    """
+    rawValues = [msg or '' for msg in rawValues]
+    lengths = np.array([len(msg) for msg in rawValues], dtype=np.int64)
+    if np.any(lengths & 1):
+        raise ValueError('odd-length hex message in row {:d}'.format(
+            int(np.flatnonzero(lengths & 1)[0])))
+    lengths >>= 1
+    offsets = np.zeros(len(lengths), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=offsets[1:])
+    return bytes.fromhex(''.join(rawValues)), offsets, lengths
+
+def processBufferRecords(buffer, offsets, lengths, rawValues=None):
+    """
+    processMsgRecord for every message of a shared buffer (None for empty
+    messages): the records reference buffer, only messages without their
+    optional fields are copied (padded with zeros); a message missing other
+    fields raises ValueError (see checkRecordLength), unless its type is
+    registered with shortAsIgnore (it gets the ignoreMsg record)
+
+    rawValues (optional) raw_value of each message, None (or a None entry)
+    => record.raw_value is made from the bytes when it is read
+    """
+    if not isinstance(buffer, bytes):
+        # e.g., a numpy uint8 payload, indexing a memoryview gives int
+        buffer = memoryview(buffer)
+    records = []
+    for ii, (start, length) in enumerate(zip(np.asarray(offsets).tolist(),
+                                             np.asarray(lengths).tolist())):
+        if not length:
+            records.append(None)
+            continue
+        raw_value = None if rawValues is None else rawValues[ii]
+        records.append(_recordAt(buffer, start, length, raw_value))
+    return records
+
+def processMsgRecords(rawValues):
+    """
+    processMsgRecord for every message in rawValues (None for empty messages)
+
+    The column is hex-decoded once (decodeMessages) and all the records share
+    that buffer (see processBufferRecords)
+    """
+    rawValues = list(rawValues)
+    return processBufferRecords(*decodeMessages(rawValues), rawValues)
@@ -1,10 +1,63 @@
 # file: parse_02 - does the parsing for the 0x02 message returned from the pod
 #      NOTE - only parsing the Fault returned version Type 2
-
-from byteUtils import *
-import utils
+from messageFieldSpecs import *
 import numpy as np
 
+# fields of the 02 fault response in msgDict order (see parse_02 docstring)
+fields_02 = (
+    Const('message_type', '02'),
+    Raw(),
+    Field('mtype', 0),
+    Field('fault_type', 2),
+    Field('pod_progress_value', 3),
+    Field('extended_bolus_active', 4, mask=0x8, scale=FLAG),
+    Field('immediate_bolus_active', 4, mask=0x4, scale=FLAG),
+    Field('temp_basal_active', 4, mask=0x2, scale=FLAG),
+    Field('basal_active', 4, mask=0x1, scale=FLAG),
+    Field('pulses_not_delivered', 5, 2),
+    Field('insulin_not_delivered', 5, 2, scale=UNITS),
+    Field('seq_byte_M', 7),
+    Field('total_pulses_delivered', 8, 2),
+    Field('insulinDelivered', 8, 2, scale=UNITS),
+    Field('logged_fault', 10, scale=lambda x: '0x%X' % x),
+    Field('fault_time_minutes_since_pod_activation', 11, 2),
+    Field('reservoir_remaining', 13, 2, mask=0x3FF, scale=RESERVOIR),
+    Field('pod_active_minutes', 15, 2),
+    Field('alerts_bit_mask', 17),
+    Field('table_fault', 18, scale=isValue(2)),
+    Field('byte_V', 19),
+    Field('byte_W', 20),
+    Field('pod_progress_at_fault', 21),
+    Field('word_Y', 22, 2, optional=True),
+    )
+
+# if logged_fault is 0x34, many registers are reset
+resetBy34 = ('pulses_not_delivered', 'total_pulses_delivered',
+             'fault_time_minutes_since_pod_activation', 'pod_active_minutes')
+
+def _finish_02(msgDict):
+    if msgDict['fault_type'] != 2:
+        return {'message_type': '02', 'raw_value': msgDict['raw_value'],
+                'mtype': msgDict['mtype'], 'fault_type': 'Not fault type 02, not parsed'}
+    if msgDict['logged_fault'] == '0x34':
+        for key in resetBy34:
+            msgDict[key] = np.nan
+    return msgDict
+
+def _finishBatch_02(table, byteMat):
+    # every column is kept, fault_type tells which rows were parsed
+    fault_type = np.empty(len(byteMat), dtype=object)
+    fault_type[:] = [2 if x == 2 else 'Not fault type 02, not parsed'
+                     for x in table['fault_type'].tolist()]
+    table['fault_type'] = fault_type
+    is34 = byteMat[:, 10] == 0x34
+    if is34.any():
+        for key in resetBy34:
+            table[key] = np.where(is34, np.nan, table[key])
+    return table
+
+_decode_02 = registerMsgType('02', fields_02, _finish_02, _finishBatch_02)
+
 def parse_02(msg):
     # extract information from the 02 response and return as a dictionary
     """
@@ -46,75 +99,4 @@ def parse_02(msg):
     YYYY (2 bytes): [$16:$17] unknown
     """
 
-    byteMsg = bytearray.fromhex(msg)
-    byteList = list(byteMsg)
-    byte_0 = byteList[0]
-    byte_1 = byteList[1]
-    byte_2 = byteList[2]
-    byte_3 = byteList[3]
-    byte_4 = byteList[4]
-    word_L = combineByte(byteList[5:7])
-    byte_M = byteList[7]
-    word_N = combineByte(byteList[8:10])
-    byte_P = byteList[10]
-    word_Q = combineByte(byteList[11:13])
-    word_R = combineByte(byteList[13:15])
-    word_S = combineByte(byteList[15:17])
-    byte_T = byteList[17]
-    byte_U = byteList[18]
-    byte_V = byteList[19]
-    byte_W = byteList[20]
-    byte_X = byteList[21]
-    word_Y = combineByte(byteList[22:24])
-    cksm   = combineByte(byteList[24:26])
-
-    msgDict = { }
-    msgDict['message_type'] = '02'
-    msgDict['raw_value']    = msg
-    msgDict['mtype'] = byte_0
-    msgDict['fault_type'] = byte_2
-    if msgDict['fault_type'] != 2:
-        msgDict['fault_type'] = 'Not fault type 02, not parsed'
-        return msgDict
-
-    msgDict['pod_progress_value']   = byte_3
-
-    msgDict['extended_bolus_active']   = (byte_4 & 0x8) != 0
-    msgDict['immediate_bolus_active']  = (byte_4 & 0x4) != 0
-    msgDict['temp_basal_active']       = (byte_4 & 0x2) != 0
-    msgDict['basal_active']            = (byte_4 & 0x1) != 0
-
-    msgDict['pulses_not_delivered'] = word_L
-    msgDict['insulin_not_delivered'] = utils.getUnitsFromPulses(word_L)
-
-    msgDict['seq_byte_M']  = byte_M
-
-    msgDict['total_pulses_delivered'] = word_N
-    msgDict['insulinDelivered'] = utils.getUnitsFromPulses(word_N)
-
-    msgDict['logged_fault'] = f'0x%X'%(byte_P)
-
-    msgDict['fault_time_minutes_since_pod_activation']  = word_Q
-    pulses = word_R & 0x3FF
-    if pulses == 0x3FF:
-        msgDict['reservoir_remaining'] = '>50 u'
-    else:
-        msgDict['reservoir_remaining'] = utils.getUnitsFromPulses(pulses)
-
-    msgDict['pod_active_minutes'] = word_S
-    msgDict['alerts_bit_mask'] = byte_T
-    msgDict['table_fault'] = (byte_U == 2)
-    msgDict['byte_V'] = byte_V
-    msgDict['byte_W'] = byte_W
-    msgDict['pod_progress_at_fault'] = byte_X
-    msgDict['word_Y'] = word_Y
-
-    # but if logged_fault is 0x34, many registers are reset
-    if msgDict['logged_fault'] == '0x34':
-        msgDict['pulses_not_delivered'] = np.nan
-        msgDict['total_pulses_delivered'] = np.nan
-        msgDict['fault_time_minutes_since_pod_activation'] = np.nan
-        msgDict['pod_active_minutes'] = np.nan
-        msgDict['pulses_not_delivered'] = np.nan
-
-    return msgDict
+    return _decode_02(msg)
@@ -0,0 +1,43 @@
+# file: parse_03 - does the parsing for the setup pod command
+from messageFieldSpecs import *
+
+# fields of the 03 setup pod command in msgDict order (see parse_03 docstring)
+#   message_type stays '0x3' (as returned before this parser existed),
+#   a message too short for these fields gets the ignoreMsg msgDict (shortAsIgnore)
+fields_03 = (
+    Field('mtype', 0),
+    Const('message_type', '0x3'),
+    Raw(),
+    Field('mlen', 1),
+    Field('pod_address', 2, 4, scale=hex),
+    Field('packet_timeout', 7),
+    Field('month', 8),
+    Field('day', 9),
+    Field('year', 10),
+    Field('hour', 11),
+    Field('minute', 12),
+    Field('lot', 13, 4),
+    Field('tid', 17, 4),
+    )
+
+_decode_03 = registerMsgType('0x3', fields_03, shortAsIgnore=True)
+
+def parse_03(msg):
+    # extract information from the 03 setup pod command
+    """
+    Command $03 is sent once (or repeated until it succeeds) while the pod
+    is initialized, right after the 07 AssignID command:
+        OFF 1  2        6  7  8  9  10 11 12 13       17
+        03 13 IIIIIIII 14 PP MM DD YY HH MM LLLLLLLL TTTTTTTT
+
+        03 (1 byte): mtype
+        13 (1 byte): mlen, always $13
+        IIIIIIII (4 bytes): pod address assigned by the 07 command
+        14 (1 byte): always $14
+        PP (1 byte): packet timeout limit
+        MM DD YY HH MM (5 bytes): date and time the pod is set up
+        LLLLLLLL (4 bytes): lot number of the pod
+        TTTTTTTT (4 bytes): tid (serial number) of the pod
+    """
+
+    return _decode_03(msg)
@@ -1,6 +1,35 @@
 # file: parse_06 - is a request of a nonce resync returned from the pod
+from messageFieldSpecs import *
+import numpy as np
+
+def _faultCode(errorCode):
+    if errorCode == 0x14:
+        return 'nonceResync'
+    return hex(errorCode)
+
+# fields of the 06 response in msgDict order (see parse_06 docstring)
+#   nonce_reseed_word is only kept for a nonce resync (EE == $14)
+fields_06 = (
+    Const('message_type', '06'),
+    Raw(),
+    Field('mtype', 0),
+    Field('mlen', 1),
+    Field('is_nonce_resync', 2, scale=isValue(0x14)),
+    Field('nonce_reseed_word', 3, 2),
+    Field('fault_code', 2, scale=_faultCode),
+    )
+
+def _finish_06(msgDict):
+    if not msgDict['is_nonce_resync']:
+        msgDict['nonce_reseed_word'] = 0
+    return msgDict
+
+def _finishBatch_06(table, byteMat):
+    table['nonce_reseed_word'] = np.where(table['is_nonce_resync'],
+                                          table['nonce_reseed_word'], 0).astype(np.uint16)
+    return table
 
-import byteUtils
+_decode_06 = registerMsgType('06', fields_06, _finish_06, _finishBatch_06)
 
 def parse_06(msg):
     # pod response - indicates a nonce resync is required
@@ -30,24 +59,4 @@ def parse_06(msg):
       (Lot, TID, MessageSeq, FakeNonce)
     """
 
-    byteMsg = bytearray.fromhex(msg)
-    byteList = list(byteMsg)
-    mtype = byteList[0]
-    mlen = byteList[1]
-    errorCode = byteList[2]
-    wordCode = byteUtils.combineByte(byteList[3:5])
-
-    msgDict = { }
-    msgDict['message_type'] = '06'
-    msgDict['raw_value']    = msg
-    msgDict['mtype'] = mtype
-    msgDict['mlen'] = mlen
-    msgDict['is_nonce_resync'] = errorCode==0x14
-    if msgDict['is_nonce_resync']:
-        msgDict['nonce_reseed_word'] = wordCode
-        msgDict['fault_code'] = 'nonceResync'
-    else:
-        msgDict['nonce_reseed_word'] = 0
-        msgDict['fault_code'] = hex(errorCode)
-
-    return msgDict
+    return _decode_06(msg)
@@ -0,0 +1,30 @@
+# file: parse_07 - does the parsing for the assign ID command
+from messageFieldSpecs import *
+
+# fields of the 07 assign ID command in msgDict order (see parse_07 docstring)
+#   message_type stays '0x7' (as returned before this parser existed),
+#   a message too short for these fields gets the ignoreMsg msgDict (shortAsIgnore)
+fields_07 = (
+    Field('mtype', 0),
+    Const('message_type', '0x7'),
+    Raw(),
+    Field('mlen', 1),
+    Field('pod_address', 2, 4, scale=hex),
+    )
+
+_decode_07 = registerMsgType('0x7', fields_07, shortAsIgnore=True)
+
+def parse_07(msg):
+    # extract information from the 07 assign ID command
+    """
+    Command $07 is the first command sent to a new pod, it assigns the
+    address the pod answers to from then on:
+        OFF 1  2
+        07 04 IIIIIIII
+
+        07 (1 byte): mtype
+        04 (1 byte): mlen, always $04
+        IIIIIIII (4 bytes): pod address
+    """
+
+    return _decode_07(msg)
@@ -1,4 +1,26 @@
 # file: parse_0e - is a request of a nonce resync returned from the pod
+from messageFieldSpecs import *
+
+def _requestMeaning(requestCode):
+    if requestCode == 0:
+        return 'StandardStatus'
+    elif requestCode == 1:
+        return 'ExpiredAlert'
+    elif requestCode == 1:
+        return 'Fault'
+    else:
+        return 'ReferToWiki'
+
+# fields of the 0e status request in msgDict order (see parse_0e docstring)
+fields_0e = (
+    Const('message_type', '0e'),
+    Raw(),
+    Field('mtype', 0),
+    Field('requestCode', 2),
+    Field('requestMeaning', 2, scale=_requestMeaning),
+    )
+
+_decode_0e = registerMsgType('0e', fields_0e)
 
 def parse_0e(msg):
     # request status from the pod
@@ -20,24 +42,4 @@ def parse_0e(msg):
         $51 02 Response, Type 51 - like Type $50, but dumps entries before the last 50
     """
 
-    byteMsg = bytearray.fromhex(msg)
-    byteList = list(byteMsg)
-    mtype = byteList[0]
-    _ = byteList[1]  # always one
-    requestCode = byteList[2]
-
-    msgDict = { }
-    msgDict['message_type'] = '0e'
-    msgDict['raw_value']    = msg
-    msgDict['mtype'] = mtype
-    msgDict['requestCode'] = requestCode
-    if requestCode == 0:
-        msgDict['requestMeaning'] = 'StandardStatus'
-    elif requestCode == 1:
-        msgDict['requestMeaning'] = 'ExpiredAlert'
-    elif requestCode == 1:
-        msgDict['requestMeaning'] = 'Fault'
-    else:
-        msgDict['requestMeaning'] = 'ReferToWiki'
-
-    return msgDict
+    return _decode_0e(msg)
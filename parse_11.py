@@ -0,0 +1,32 @@
+# file: parse_11 - does the parsing for the acknowledge alerts command
+from messageFieldSpecs import *
+
+# fields of the 11 acknowledge alerts command in msgDict order (see parse_11 docstring)
+#   message_type stays '0x11' (as returned before this parser existed),
+#   a message too short for these fields gets the ignoreMsg msgDict (shortAsIgnore)
+fields_11 = (
+    Field('mtype', 0),
+    Const('message_type', '0x11'),
+    Raw(),
+    Field('mlen', 1),
+    Field('nonce', 2, 4),
+    Field('alerts_bit_mask', 6),
+    )
+
+_decode_11 = registerMsgType('0x11', fields_11, shortAsIgnore=True)
+
+def parse_11(msg):
+    # extract information from the 11 acknowledge alerts command
+    """
+    Command $11 acknowledges (silences) pod alerts:
+        OFF 1  2        6
+        11 05 NNNNNNNN MM
+
+        11 (1 byte): mtype
+        05 (1 byte): mlen, always $05
+        NNNNNNNN (4 bytes): nonce
+        MM (1 byte): bit mask of the alerts to acknowledge (1 << alert #),
+            same bit mask as the alerts_bit_mask of the 1d response
+    """
+
+    return _decode_11(msg)
@@ -0,0 +1,35 @@
+# file: parse_19 - does the parsing for the configure alerts command
+from messageFieldSpecs import *
+
+# fields of the 19 configure alerts command in msgDict order (see parse_19 docstring)
+#   message_type stays '0x19' (as returned before this parser existed),
+#   a message too short for these fields gets the ignoreMsg msgDict (shortAsIgnore)
+#   only the first alert of the list is decoded
+fields_19 = (
+    Field('mtype', 0),
+    Const('message_type', '0x19'),
+    Raw(),
+    Field('mlen', 1),
+    Field('nonce', 2, 4),
+    Field('num_alerts', 1, scale=lambda x: (x - 4) // 6),
+    Field('alert_config', 6, 6, scale=hex),
+    )
+
+_decode_19 = registerMsgType('0x19', fields_19, shortAsIgnore=True)
+
+def parse_19(msg):
+    # extract information from the 19 configure alerts command
+    """
+    Command $19 sets up one or more pod alerts:
+        OFF 1  2        6    8    10
+        19 LL NNNNNNNN IVXX YYYY 0J0K [IVXX YYYY 0J0K...]
+
+        19 (1 byte): mtype
+        LL (1 byte): mlen, 4 + 6 bytes per alert
+        NNNNNNNN (4 bytes): nonce
+        IVXX YYYY 0J0K (6 bytes): one alert configuration - alert number,
+            activation, duration, trigger (minutes or reservoir level)
+            and beep type
+    """
+
+    return _decode_19(msg)
@@ -1,6 +1,27 @@
 # file: parse_1a13 - does the parsing for basal commond to set scheduled rates
-from byteUtils import *
-from decimal import Decimal
+from messageFieldSpecs import *
+
+# fields of the 1a13 basal schedule in msgDict order (see parse_1a13 docstring)
+#   the napp table runs to byte mlen, the 13 half starts at mlen+2
+fields_1a13 = (
+    Const('message_type', '1a13'),
+    Raw(),
+    Field('mtype', 0),
+    Field('mlen', 1),
+    Field('nonce', 2, 4),
+    Field('TableNum', 6),
+    Field('chsum', 7, 2),
+    Field('currentHH', 9),
+    Field('secsX8Left', 10, 2),
+    Field('hhpulses', 12, 2),
+    Field('nappArray', 14, UNTIL_MLEN, scale=hex),
+    Field('xtype', 2, afterMlen=True),
+    Field('xlen', 3, afterMlen=True),
+    Field('reminders', 4, afterMlen=True),
+    Field('scheduleEntryIndex', 5, afterMlen=True),
+    )
+
+_decode_1a13 = registerMsgType('1a13', fields_1a13)
 
 def parse_1a13(msg):
     # extract information from the 1a13 basal command
@@ -48,43 +69,5 @@ def parse_1a13(msg):
     (=200,000 decimal, i.e., 2 seconds between pulses) and a maximum value
     of 0x6b49d200 (=1,800,000,000 decimal, i.e., 5 hours between pulses).
     """
-    #              0  1  2        6  7    9  10   12   14   15 ... to mlen
-    #First half:   1a LL NNNNNNNN 00 CCCC HH SSSS PPPP napp napp  13...
-    byteMsg = bytearray.fromhex(msg)
-    byteList = list(byteMsg)
-    mtype = byteList[0]
-    mlen = byteList[1]
-    nonce = combineByte(byteList[2:6])
-    TableNum = byteList[6]
-    chsum   = combineByte(byteList[7:9])
-    currentHH = byteList[9]
-    secsX8Left = combineByte(byteList[10:12])
-    hhpulses = combineByte(byteList[12:14])
-    nappArray = combineByte(byteList[14:mlen])
-
-    #
-    #Second half:  13 LL RR MM NNNN XXXXXXXX YYYY ZZZZZZZZ [YYYY ZZZZZZZZ ...]
-    xtype = byteList[mlen+2]
-    xlen = byteList[mlen+3]
-    reminders = byteList[mlen+4]
-    scheduleEntryIndex = byteList[mlen+5]
-
-    msgDict = { }
-    msgDict['message_type'] = '1a13'
-    msgDict['raw_value']    = msg
-    msgDict['mtype'] = mtype
-    msgDict['mlen'] = mlen
-    msgDict['nonce'] = nonce
-    msgDict['TableNum'] = TableNum
-    msgDict['chsum'] = chsum
-    msgDict['currentHH'] = currentHH
-    msgDict['secsX8Left'] = secsX8Left
-    msgDict['hhpulses'] = hhpulses
-    msgDict['nappArray'] = hex(nappArray)
-
-    msgDict['xtype'] = xtype
-    msgDict['xlen'] = xlen
-    msgDict['reminders'] = reminders
-    msgDict['scheduleEntryIndex'] = scheduleEntryIndex
 
-    return msgDict
+    return _decode_1a13(msg)
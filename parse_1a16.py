@@ -1,6 +1,58 @@
 # file: parse_1a16 - does the parsing a temporary basal commond
-from byteUtils import *
-from decimal import Decimal
+from messageFieldSpecs import *
+import numpy as np
+import utils
+
+# u per pulse * half hours per hour * number of 1/10th pulses = rate u/hr
+TB_RATE = Scale(utils.getRateFromTenthPulses,
+                lambda x: utils.getRateFromTenthPulses(x.astype(np.int64)))
+
+#              0  1  2        6  7    9  10   12   14
+#First half:   1a LL NNNNNNNN 01 CCCC HH SSSS PPPP napp [napp...]  16...
+#              16 17 18 19 20   22       26   28
+#Second half:  16 LL RR MM NNNN XXXXXXXX YYYY ZZZZZZZZ [YYYY ZZZZZZZZ...]
+fields_1a16 = (
+    Const('message_type', '1a16'),
+    Raw(),
+    Field('mtype', 0),
+    Field('mlen', 1),
+    Field('nonce', 2, 4),
+    Field('TableNum', 6),
+    Field('chsum', 7, 2),
+    Field('hhsegments', 10),
+    Field('secsX8Left', 11, 2),
+    Field('hhpulses', 13, 2),
+    Field('xtype', 16),
+    Field('xlen', 17),
+    Field('reminders', 18),
+    Field('always0', 19),
+    Field('firstEntryX10pulses', 20, 2),
+    Field('firstDelayMicroSec', 22, 4),
+    Field('totalEntryX10pulses', 26, 2),
+    Field('delayMicroSec', 28, 4),
+    Field('pulses_in_TB_halfHr', 20, 2, scale=Scale(lambda x: 0.1 * x,
+                                                    lambda x: 0.1 * x.astype(np.int64))),
+    Field('temp_basal_rate_u_per_hr', 20, 2, scale=TB_RATE),
+    )
+
+def _finish_1a16(msgDict):
+    if msgDict['firstEntryX10pulses'] != msgDict['totalEntryX10pulses']:
+        print('Warning - temp basal not properly configured, # pulses')
+
+    if msgDict['firstDelayMicroSec'] != msgDict['delayMicroSec']:
+        print('Warning - temp basal not properly configured, # microsec')
+    return msgDict
+
+def _finishBatch_1a16(table, byteMat):
+    for isBad in (table['firstEntryX10pulses'] != table['totalEntryX10pulses']).tolist():
+        if isBad:
+            print('Warning - temp basal not properly configured, # pulses')
+    for isBad in (table['firstDelayMicroSec'] != table['delayMicroSec']).tolist():
+        if isBad:
+            print('Warning - temp basal not properly configured, # microsec')
+    return table
+
+_decode_1a16 = registerMsgType('1a16', fields_1a16, _finish_1a16, _finishBatch_1a16)
 
 def parse_1a16(msg):
     # extract information from the 1a16 temporary basal command
@@ -51,62 +103,5 @@ def parse_1a16(msg):
     (=200,000 decimal, i.e., 2 seconds between pulses) and a maximum value
     of 0x6b49d200 (=1,800,000,000 decimal, i.e., 5 hours between pulses).
     """
-    #              0  1  2        6  7    9  10   12   14
-    #First half:   1a LL NNNNNNNN 01 CCCC HH SSSS PPPP napp [napp...]  16...
-
-    byteMsg = bytearray.fromhex(msg)
-    byteList = list(byteMsg)
-    mtype = byteList[0]
-    mlen = byteList[1]
-    nonce = combineByte(byteList[2:6])
-    TableNum = byteList[6]
-    chsum   = combineByte(byteList[7:9])
-    hhsegments = byteList[10]
-    secsX8Left = combineByte(byteList[11:13])
-    hhpulses = combineByte(byteList[13:15])
 
-    #              16 17 18 19 20   22       26   28
-    #Second half:  16 LL RR MM NNNN XXXXXXXX YYYY ZZZZZZZZ [YYYY ZZZZZZZZ...]
-    xtype = byteList[16]
-    xlen = byteList[17]
-    reminders = byteList[18]
-    MM = byteList[19]   # Always 0
-    firstEntryX10pulses = combineByte(byteList[20:22])
-    firstDelayMicroSec = combineByte(byteList[22:26])
-    totalEntryX10pulses = combineByte(byteList[26:28])
-    delayMicroSec = combineByte(byteList[28:32])
-
-    if firstEntryX10pulses != totalEntryX10pulses:
-        print('Warning - temp basal not properly configured, # pulses')
-
-    if firstDelayMicroSec != delayMicroSec:
-        print('Warning - temp basal not properly configured, # microsec')
-
-    msgDict = { }
-    msgDict['message_type'] = '1a16'
-    msgDict['raw_value']    = msg
-    msgDict['mtype'] = mtype
-    msgDict['mlen'] = mlen
-    msgDict['nonce'] = nonce
-    msgDict['TableNum'] = TableNum
-    msgDict['chsum'] = chsum
-    msgDict['hhsegments'] = hhsegments
-    msgDict['secsX8Left'] = secsX8Left
-    msgDict['hhpulses'] = hhpulses
-
-    msgDict['xtype'] = xtype
-    msgDict['xlen'] = xlen
-    msgDict['reminders'] = reminders
-    msgDict['always0'] = MM
-    msgDict['firstEntryX10pulses'] = firstEntryX10pulses
-    msgDict['firstDelayMicroSec'] = firstDelayMicroSec
-    msgDict['totalEntryX10pulses'] = totalEntryX10pulses
-    msgDict['delayMicroSec'] = delayMicroSec
-
-    msgDict['pulses_in_TB_halfHr']   = 0.1 * firstEntryX10pulses
-    # u per pulse * half hours per hour * number of pulses = rate u/hr
-    basalRate = Decimal(0.05 * 2 * 0.1 * firstEntryX10pulses)
-    x = round(basalRate,2)
-    msgDict['temp_basal_rate_u_per_hr']  =  float(x)
-
-    return msgDict
+    return _decode_1a16(msg)
@@ -1,7 +1,43 @@
 # file: parse_1a17 - does the parsing for bolus commond
-from byteUtils import *
-import utils
-from decimal import Decimal
+from messageFieldSpecs import *
+
+# fields of the 1a17 bolus in msgDict order (see parse_1a17 docstring)
+#   First half:   1a LL NNNNNNNN 02 CCCC HH SSSS PPPP 0ppp
+#   Second half:  17 LL RR NNNN XXXXXXXX YYYY ZZZZZZZZ (starts at byte 16)
+fields_1a17 = (
+    Const('message_type', '1a17'),
+    Raw(),
+    Field('mtype', 0),
+    Field('mlen', 1),
+    Field('nonce', 2, 4),
+    Field('TableNum', 6),
+    Field('chsum', 7, 2),
+    Field('hhsegments', 9),
+    Field('secsX8Left', 10, 2),
+    Field('hhpulses', 12, 2),
+    Field('pulse0', 14, 2),
+    Field('xtype', 16),
+    Field('xlen', 17),
+    Field('reminders', 18),
+    Field('promptTenthPulses', 19, 2),
+    Field('promptDelay', 21, 4),
+    Field('extendedTenthPulses', 25, 2),
+    Field('extendedDelay', 27, 4),
+    Field('prompt_bolus_u', 12, 2, scale=UNITS),
+    )
+
+def _finish_1a17(msgDict):
+    if msgDict['extendedTenthPulses'] != 0:
+        print('Warning - bolus not properly configured, extended pulses not 0')
+    return msgDict
+
+def _finishBatch_1a17(table, byteMat):
+    for isBad in (table['extendedTenthPulses'] != 0).tolist():
+        if isBad:
+            print('Warning - bolus not properly configured, extended pulses not 0')
+    return table
+
+_decode_1a17 = registerMsgType('1a17', fields_1a17, _finish_1a17, _finishBatch_1a17)
 
 def parse_1a17(msg):
     # extract information from the 1a13 basal command << to be updated - this is a copy of 1a16
@@ -55,59 +91,5 @@ def parse_1a17(msg):
         (=200,000 decimal, i.e., 2 seconds between pulses) and a maximum value
         of 0x6b49d200 (=1,800,000,000 decimal, i.e., 5 hours between pulses).
     """
-    #              0  1  2        6  7    9  10   12   14
-    #First half:   1a LL NNNNNNNN 02 CCCC HH SSSS PPPP 0ppp [napp...]  17...
-    msgDict = { }
-    msgDict['message_type'] = '1a17'
-    msgDict['raw_value']    = msg
-
-    byteMsg = bytearray.fromhex(msg)
-    byteList = list(byteMsg)
-    mtype = byteList[0]
-    mlen = byteList[1]
-    nonce = combineByte(byteList[2:6])
-    TableNum = byteList[6]
-    chsum   = combineByte(byteList[7:9])
-    hhsegments = byteList[9]
-    secsX8Left = combineByte(byteList[10:12])
-    hhpulses = combineByte(byteList[12:14])
-    pulse0   = combineByte(byteList[14:16])
-    # only immediate bolus used by Loop - so done with first half
 
-    #              16 17 18 19   21       25   27
-    #Second half:  17 LL RR NNNN XXXXXXXX YYYY ZZZZZZZZ
-    xtype = byteList[16]
-    xlen = byteList[17]
-    reminders = byteList[18]
-    promptTenthPulses = combineByte(byteList[19:21])
-    promptDelay = combineByte(byteList[21:25])
-    extendedTenthPulses = combineByte(byteList[25:27])
-    extendedDelay = combineByte(byteList[27:31])
-
-    if extendedTenthPulses != 0:
-        print('Warning - bolus not properly configured, extended pulses not 0')
-
-    msgDict = { }
-    msgDict['message_type'] = '1a17'
-    msgDict['raw_value']    = msg
-    msgDict['mtype'] = mtype
-    msgDict['mlen'] = mlen
-    msgDict['nonce'] = nonce
-    msgDict['TableNum'] = TableNum
-    msgDict['chsum'] = chsum
-    msgDict['hhsegments'] = hhsegments
-    msgDict['secsX8Left'] = secsX8Left
-    msgDict['hhpulses'] = hhpulses
-    msgDict['pulse0'] = pulse0
-
-    msgDict['xtype'] = xtype
-    msgDict['xlen'] = xlen
-    msgDict['reminders'] = reminders
-    msgDict['promptTenthPulses'] = promptTenthPulses
-    msgDict['promptDelay'] = promptDelay
-    msgDict['extendedTenthPulses'] = extendedTenthPulses
-    msgDict['extendedDelay'] = extendedDelay
-
-    msgDict['prompt_bolus_u']  =  utils.getUnitsFromPulses(hhpulses)
-
-    return msgDict
+    return _decode_1a17(msg)
@@ -0,0 +1,29 @@
+# file: parse_1c - does the parsing for the deactivate pod command
+from messageFieldSpecs import *
+
+# fields of the 1c deactivate pod command in msgDict order (see parse_1c docstring)
+#   message_type stays '0x1c' (as returned before this parser existed),
+#   a message too short for these fields gets the ignoreMsg msgDict (shortAsIgnore)
+fields_1c = (
+    Field('mtype', 0),
+    Const('message_type', '0x1c'),
+    Raw(),
+    Field('mlen', 1),
+    Field('nonce', 2, 4),
+    )
+
+_decode_1c = registerMsgType('0x1c', fields_1c, shortAsIgnore=True)
+
+def parse_1c(msg):
+    # extract information from the 1c deactivate pod command
+    """
+    Command $1C deactivates the pod:
+        OFF 1  2
+        1c 04 NNNNNNNN
+
+        1c (1 byte): mtype
+        04 (1 byte): mlen, always $04
+        NNNNNNNN (4 bytes): nonce
+    """
+
+    return _decode_1c(msg)
@@ -1,7 +1,35 @@
 # file: parse_1d - does the parsing for the 1d message returned from the pod
-from byteUtils import *
+from messageFieldSpecs import *
 import utils
 
+# fields of the 1d status response in msgDict order (see parse_1d docstring)
+#   byte 1 is the delivery flags nibble and pod_progress
+#   dword 2:6 is 0PPPSNNN, dword 6:10 is AATTTTRR
+fields_1d = (
+    Const('message_type', '1d'),
+    Field('mtype', 0),
+    Raw(),
+    Field('extended_bolus_active', 1, shift=7, mask=0x1, scale=FLAG),
+    Field('immediate_bolus_active', 1, shift=6, mask=0x1, scale=FLAG),
+    Field('temp_basal_active', 1, shift=5, mask=0x1, scale=FLAG),
+    Field('basal_active', 1, shift=4, mask=0x1, scale=FLAG),
+    Field('pod_progress', 1, mask=0xF),
+    Field('pod_progress_meaning', 1, mask=0xF, scale=utils.getPodProgessMeaning),
+    # pulses and units of insulin delivered
+    Field('total_pulses_delivered', 2, 4, shift=15, mask=0x1FFF),
+    Field('insulinDelivered_delivered', 2, 4, shift=15, mask=0x1FFF, scale=UNITS),
+    Field('sequence', 2, 4, shift=11, mask=0xF),
+    # pulses and units of insulin NOT delivered
+    Field('pulses_not_delivered', 2, 4, mask=0x007F),
+    Field('insulin_not_delivered', 2, 4, mask=0x007F, scale=UNITS),
+    Field('fault_bit', 6, 4, shift=31),
+    Field('alerts_bit_mask', 6, 4, shift=23, mask=0xFF),
+    Field('pod_active_minutes', 6, 4, shift=10, mask=0x1FFF),
+    Field('reservoir_remaining', 6, 4, mask=0x3FF, scale=RESERVOIR),
+    )
+
+_decode_1d = registerMsgType('1d', fields_1d)
+
 def parse_1d(msg):
     # extract information from the 1d response and return as a dictionary
     """
@@ -37,57 +65,4 @@ def parse_1d(msg):
         rrrrrrrrrr 10 bits, Reservoir 0.05U pulses remaining (if <= 50U) or $3ff (if > 50U left)
     """
 
-    byteMsg = bytearray.fromhex(msg)
-    byteList = list(byteMsg)
-    byte_0 = byteList[0]
-    byte_1 = byteList[1]
-    dword_3 = combineByte(byteList[2:6])
-    dword_4 = combineByte(byteList[6:10])
-    cksm   = combineByte(byteList[10:12])
-
-    #print(msg)
-    #print('0x{:x}'.format(combineByte(byte0)))
-    #print('0x{:x}'.format(combineByte(byte1)))
-    #print('0x{:x}'.format(combineByte(dword0)))
-    #print('0x{:x}'.format(combineByte(dword1)))
-    #print(combineByte(dword0) >> 15 & 0x1FFF)
-
-    msgDict = { }
-    msgDict['message_type'] = '1d'
-    msgDict['mtype'] = byte_0
-    msgDict['raw_value']    = msg
-
-    msgDict['extended_bolus_active']   = (byte_1 >> 4 & 0x8) != 0
-    msgDict['immediate_bolus_active']  = (byte_1 >> 4 & 0x4) != 0
-    msgDict['temp_basal_active']       = (byte_1 >> 4 & 0x2) != 0
-    msgDict['basal_active']            = (byte_1 >> 4 & 0x1) != 0
-
-    msgDict['pod_progress']  = byte_1 & 0xF
-    msgDict['pod_progress_meaning']  = utils.getPodProgessMeaning(byte_1 & 0xF)
-
-    # get pulses and units of insulin delivered
-    pulses = (dword_3 >> 15) & 0x1FFF
-    insulin = utils.getUnitsFromPulses(pulses)
-    msgDict['total_pulses_delivered'] = pulses
-    msgDict['insulinDelivered_delivered']  = insulin
-
-    msgDict['sequence']  = (dword_3 >> 11) & 0xF
-
-    # get pulses and units of insulin NOT delivered
-    pulses = dword_3 & 0x007F
-    insulin = utils.getUnitsFromPulses(pulses)
-    msgDict['pulses_not_delivered'] = pulses
-    msgDict['insulin_not_delivered'] = insulin
-
-    msgDict['fault_bit'] = (dword_4 >> 31)
-    msgDict['alerts_bit_mask'] = (dword_4 >> 23) & 0xFF
-    msgDict['pod_active_minutes'] = (dword_4 >> 10) & 0x1FFF
-
-    if (dword_4 & 0x3FF) == 0x3FF:
-        msgDict['reservoir_remaining'] = '>50 u'
-    else:
-        pulses = dword_4 & 0x3FF
-        insulin = utils.getUnitsFromPulses(pulses)
-        msgDict['reservoir_remaining'] = insulin
-
-    return msgDict
+    return _decode_1d(msg)
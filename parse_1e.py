@@ -0,0 +1,28 @@
+# file: parse_1e - does the parsing for the diagnose pod command
+from messageFieldSpecs import *
+
+# fields of the 1e command in msgDict order (see parse_1e docstring)
+#   message_type stays '0x1e' (as returned before this parser existed),
+#   a message too short for these fields gets the ignoreMsg msgDict (shortAsIgnore)
+fields_1e = (
+    Field('mtype', 0),
+    Const('message_type', '0x1e'),
+    Raw(),
+    Field('mlen', 1),
+    )
+
+_decode_1e = registerMsgType('0x1e', fields_1e, shortAsIgnore=True)
+
+def parse_1e(msg):
+    # extract information from the 1e diagnose pod command
+    """
+    Command $1E (DiagnosePod in getActionDict):
+        1e LL ...
+
+        1e (1 byte): mtype
+        LL (1 byte): mlen
+    The rest of the layout is not documented yet, so only mtype and mlen
+    are decoded.
+    """
+
+    return _decode_1e(msg)
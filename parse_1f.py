@@ -1,6 +1,21 @@
 # file: parse_1f - does the parsing for cancel commond
-from byteUtils import *
-from decimal import Decimal
+from messageFieldSpecs import *
+
+# fields of the 1f cancel command in msgDict order (see parse_1f docstring)
+fields_1f = (
+    Const('message_type', '1f'),
+    Raw(),
+    Field('mtype', 0),
+    Field('mlen', 1),
+    Field('nonce', 2, 4),
+    Field('cancelByte', 6),
+    Field('alertValue', 6, shift=4, mask=0xF),
+    Field('cancelBolus', 6, shift=2, mask=0x1, scale=FLAG),
+    Field('cancelTB', 6, shift=1, mask=0x1, scale=FLAG),
+    Field('suspend', 6, mask=0x1, scale=FLAG),
+    )
+
+_decode_1f = registerMsgType('1f', fields_1f)
 
 def parse_1f(msg):
     # extract information from the 1f cancel command
@@ -26,31 +41,4 @@ def parse_1f(msg):
     The Pod responds to the $1F command with a $1D status message.
     """
 
-    msgDict = { }
-    msgDict['message_type'] = '1f'
-    msgDict['raw_value']    = msg
-
-    byteMsg = bytearray.fromhex(msg)
-    byteList = list(byteMsg)
-    mtype = byteList[0]
-    mlen = byteList[1]
-    nonce = combineByte(byteList[2:6])
-    cancelByte = byteList[6]
-    alertValue = (cancelByte >> 4) & 0xF
-    cancelBolus = (cancelByte & 0x04) != 0
-    cancelTB    = (cancelByte & 0x02) != 0
-    suspend     = (cancelByte & 0x01) != 0
-
-    msgDict = { }
-    msgDict['message_type'] = '1f'
-    msgDict['raw_value']    = msg
-    msgDict['mtype'] = mtype
-    msgDict['mlen'] = mlen
-    msgDict['nonce'] = nonce
-    msgDict['cancelByte'] = cancelByte
-    msgDict['alertValue'] = alertValue
-    msgDict['cancelBolus'] = cancelBolus
-    msgDict['cancelTB'] = cancelTB
-    msgDict['suspend'] = suspend
-
-    return msgDict
+    return _decode_1f(msg)
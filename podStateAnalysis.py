@@ -2,11 +2,210 @@ import utils
 from podUtils import *
 from messagePatternParsing import *
 
+from messageBatchParsing import *
+
 ## This file has higher level pod-specific functions
 
-# iterate through all messages and apply parsers to update the pod state
+# column names of podStateFrame
+#   insulin is kept as integer pulses (0.05 u), TB rates as 1/10th pulses per
+#   half hour (1a16 firstEntryX10pulses), see utils for the conversion to units
+podStateColumnNames = ('df_idx', 'timeStamp', 'time_delta', 'timeCumSec', \
+            'message_type', 'pod_progress', 'radioOnCumSec',\
+            'insulinPulses', 'reqTBTenthPulses', \
+            'reqBolusPulses', 'Bolus','TB','SchBasal', 'raw_value' )
+
+# dtype of the pulse columns
+pulseType = np.int32
+
+# running state columns of podStateFrame, the last row is the state after the
+#   last message (getPodState can continue from it, see followLoopReport)
+podStateRunningNames = ('timeCumSec', 'pod_progress', 'radioOnCumSec', 'insulinPulses',
+            'reqTBTenthPulses', 'reqBolusPulses', 'Bolus', 'TB', 'SchBasal')
+
+# compact podStateFrame (getPodState(..., compact=True), compactPodState):
+#   message_type categorical, no raw_value column (df.loc[df_idx, 'raw_value']),
+#   the times in whole seconds (as messageLake) and the integer columns as
+#   narrow as their message fields: pod_progress 4 bits, insulinPulses 13 bits
+#   (1d), reqTBTenthPulses (1a16) and reqBolusPulses (1a17) 16 bits
+podStateCompactTypes = {
+    'df_idx': np.uint32, 'time_delta': np.int32, 'timeCumSec': np.uint32,
+    'message_type': 'category', 'pod_progress': np.int8, 'radioOnCumSec': np.uint32,
+    'insulinPulses': np.int16, 'reqTBTenthPulses': np.uint16, 'reqBolusPulses': np.uint16,
+    'Bolus': bool, 'TB': bool, 'SchBasal': bool}
+
+def compactPodState(podStateFrame):
+    """
+    Purpose: the podStateFrame in the compact schema (podStateCompactTypes),
+             for keeping many of them in memory
+
+    Input:
+        podStateFrame   from getPodState (or getPodStateLoop)
+
+    Output:
+        podStateFrame without raw_value (the df_idx row of df has it) and with
+        categorical message_type and narrow integer columns; same index and
+        values (message_type == '1d', podState.loc[idx, 'reqTBTenthPulses'], ...)
+    """
+    return podStateFrame.drop(columns='raw_value').astype(podStateCompactTypes)
+
+def getInitialPodState():
+    # running state before the first message
+    radio_on_time = 30 # radio is on for 30 seconds every time pod wakes up
+    return {'timeCumSec': 0, 'pod_progress': 0, 'radioOnCumSec': radio_on_time,
+            'insulinPulses': 0, 'reqTBTenthPulses': 0, 'reqBolusPulses': 0,
+            'Bolus': False, 'TB': False, 'SchBasal': False}
+
+def _forwardFill(numRows, msgIdx, values, initialValue):
+    # value from the most recent msgIdx at or before each row
+    #   rows before the first msgIdx get initialValue
+    lastIdx = np.full(numRows, -1, dtype=np.int64)
+    lastIdx[msgIdx] = np.arange(len(msgIdx))
+    lastIdx = np.maximum.accumulate(lastIdx)
+    values = np.concatenate((np.array([initialValue]), np.asarray(values)))
+    return values[lastIdx + 1]
+
+# decode all messages at once and forward fill the pod state
 # some messages are not parsed (they show up as 0x##)
-def getPodState(frame):
+def getPodState(frame, initialState=None, tableDict=None, compact=False):
+    """
+    Purpose: Evaluate state changes while the pod_progress is in range
+
+    Input:
+        frame: DataFrame with all messages
+        initialState: running state before the first row of frame
+                      (dict with podStateRunningNames), None => getInitialPodState()
+                      pass the last row of an earlier podStateFrame to continue it
+        tableDict: processMsgBatch of the raw_value column if already decoded
+                   (e.g., processMsgBuffer of a binaryLog)
+        compact: True => podStateFrame in the compact schema (see compactPodState)
+
+    Output:
+       podStateFrame       dataframe with pod state extracted from messages
+       emptyMessageList    indices of any messages with blank commands
+       faultProcessedMsg   dictionary for the fault message
+
+    Method:
+        Same result as getPodStateLoop, but vectorized (see getPodStateColumns)
+    """
+    rawValues = frame['raw_value'].to_numpy(dtype=object)
+    stateTable, isEmpty, faultProcessedMsg = getPodStateColumns(
+        rawValues, frame['time_delta'].to_numpy(), frame['time_asleep'].to_numpy(),
+        initialState, tableDict)
+    emptyMessageList = frame.index[isEmpty].to_list()
+
+    podStateFrame = pd.DataFrame({
+        'df_idx': frame.index.to_numpy(),
+        'timeStamp': frame['time'].to_numpy(),
+        'time_delta': stateTable['time_delta'],
+        'timeCumSec': stateTable['timeCumSec'],
+        'message_type': stateTable['message_type'],
+        'pod_progress': stateTable['pod_progress'],
+        'radioOnCumSec': stateTable['radioOnCumSec'],
+        'insulinPulses': stateTable['insulinPulses'],
+        'reqTBTenthPulses': stateTable['reqTBTenthPulses'],
+        'reqBolusPulses': stateTable['reqBolusPulses'],
+        'Bolus': stateTable['Bolus'],
+        'TB': stateTable['TB'],
+        'SchBasal': stateTable['SchBasal'],
+        'raw_value': rawValues}, columns=podStateColumnNames, index=frame.index)
+    if compact:
+        podStateFrame = compactPodState(podStateFrame)
+    return podStateFrame, emptyMessageList, faultProcessedMsg
+
+def getPodStateColumns(rawValues, time_delta, time_asleep, initialState=None, tableDict=None):
+    """
+    Purpose: the pod state columns of getPodState without building a DataFrame
+
+    Input:
+        rawValues      array of hex strings, one per message
+        time_delta     seconds since the previous message (from generate_table)
+        time_asleep    seconds the radio was off before the message (nan if none)
+        initialState   as for getPodState
+        tableDict      processMsgBatch(rawValues) if the caller already has it
+
+    Output:
+        stateTable          column table (dict of numpy arrays, by position) with
+                            the podStateRunningNames plus message_type and time_delta
+        isEmpty             bool array, True for a blank message
+        faultProcessedMsg   dictionary for the (last) fault message
+
+    Method:
+            processMsgBatch decodes the raw_value column by message_type
+            timeCumSec and radioOnCumSec are cumulative sums
+            reqTBTenthPulses (1a16), reqBolusPulses (1a17) and the 1d
+            states are forward filled from the last message of that type
+    """
+    numRows = len(rawValues)
+    if initialState is None:
+        initialState = getInitialPodState()
+
+    isEmpty = rawValues == ''
+    if tableDict is None:
+        tableDict = processMsgBatch(rawValues)
+
+    message_type = np.empty(numRows, dtype=object)
+    message_type[isEmpty] = 'unknown'
+    for thisType, table in tableDict.items():
+        if thisType == '1f':
+            # rename the message_type per Joe's request
+            message_type[table['msg_idx']] = ['1f0{:d}'.format(x)
+                                              for x in table['cancelByte'].tolist()]
+        else:
+            message_type[table['msg_idx']] = thisType
+
+    faultProcessedMsg = {}
+    if '02' in tableDict:
+        faultProcessedMsg = processMsg(rawValues[tableDict['02']['msg_idx'][-1]])
+
+    # accumulate in the same order as the loop: start value, then each row
+    timeCumSec = np.cumsum(np.concatenate(([initialState['timeCumSec']], time_delta)))[1:]
+    radioOn = np.where(np.isnan(time_asleep), time_delta, time_delta - time_asleep)
+    radioOnCumSec = np.cumsum(np.concatenate(([initialState['radioOnCumSec']], radioOn)))[1:]
+
+    # fill in pod state from the last message of the type that sets it
+    emptyTable = {'msg_idx': np.array([], dtype=np.int64)}
+    table = tableDict.get('1a16', emptyTable)
+    reqTB = _forwardFill(numRows, table['msg_idx'],
+                         table.get('firstEntryX10pulses', np.array([], dtype=pulseType)),
+                         initialState['reqTBTenthPulses'])
+    table = tableDict.get('1a17', emptyTable)
+    reqBolus = _forwardFill(numRows, table['msg_idx'],
+                            table.get('hhpulses', np.array([], dtype=pulseType)),
+                            initialState['reqBolusPulses'])
+    table = tableDict.get('1d', emptyTable)
+    statusIdx = table['msg_idx']
+    pod_progress = _forwardFill(numRows, statusIdx,
+                                table.get('pod_progress', np.array([], dtype=np.int64)),
+                                initialState['pod_progress'])
+    insulinPulses = _forwardFill(numRows, statusIdx,
+                                 table.get('total_pulses_delivered', np.array([], dtype=pulseType)),
+                                 initialState['insulinPulses'])
+    Bolus = _forwardFill(numRows, statusIdx,
+                         table.get('immediate_bolus_active', np.array([], dtype=bool)),
+                         initialState['Bolus'])
+    TB = _forwardFill(numRows, statusIdx,
+                      table.get('temp_basal_active', np.array([], dtype=bool)), initialState['TB'])
+    schBa = _forwardFill(numRows, statusIdx,
+                         table.get('basal_active', np.array([], dtype=bool)),
+                         initialState['SchBasal'])
+
+    stateTable = {
+        'time_delta': time_delta,
+        'timeCumSec': timeCumSec,
+        'message_type': message_type,
+        'pod_progress': pod_progress.astype(np.int64),
+        'radioOnCumSec': radioOnCumSec,
+        'insulinPulses': insulinPulses.astype(pulseType),
+        'reqTBTenthPulses': reqTB.astype(pulseType),
+        'reqBolusPulses': reqBolus.astype(pulseType),
+        'Bolus': Bolus.astype(bool),
+        'TB': TB.astype(bool),
+        'SchBasal': schBa.astype(bool)}
+    return stateTable, isEmpty, faultProcessedMsg
+
+# iterate through all messages and apply parsers to update the pod state
+#   original version of getPodState (one message at a time), kept to cross check
+def getPodStateLoop(frame):
     """
     Purpose: Evaluate state changes while the pod_progress is in range
 
@@ -23,9 +222,9 @@ def getPodState(frame):
     timeCumSec = 0
     pod_progress = 0
     faultProcessedMsg = {}
-    insulinDelivered = utils.getUnitsFromPulses(0)
-    reqTB = utils.getUnitsFromPulses(0)
-    reqBolus = utils.getUnitsFromPulses(0)
+    insulinPulses = 0
+    reqTB = 0
+    reqBolus = 0
     #extBo = False # since extended bolus is always false, don't put into dataframe
     Bolus = False
     TB    = False
@@ -36,30 +235,28 @@ def getPodState(frame):
 
     list_of_states = []
 
-    colNames = ('df_idx', 'timeStamp', 'time_delta', 'timeCumSec', \
-                'message_type', 'pod_progress', 'radioOnCumSec',\
-                'insulinDelivered', 'reqTB', \
-                'reqBolus', 'Bolus','TB','SchBasal', 'raw_value' )
+    colNames = podStateColumnNames
+
+    # one record per message (None if empty), fields are decoded when read
+    records = processMsgRecords(frame['raw_value'])
 
     # iterate through the DataFrame, should already be sorted into send-recv pairs
-    for index, row in frame.iterrows():
+    for (index, row), pmsg in zip(frame.iterrows(), records):
         # reset each time
         timeStamp = row['time']
         time_delta = row['time_delta']
         timeCumSec += time_delta
         msg = row['raw_value']
-        if msg == '':
+        if pmsg is None:
             #print('Empty command for {} at dataframe index of {:d}'.format(row['type'], index))
-            pmsg = {}
-            pmsg['message_type'] = 'unknown'
+            message_type = 'unknown'
             emptyMessageList.append(index)
             #continue
         else:
-            pmsg = processMsg(msg)
+            message_type = pmsg.message_type
 
-        message_type = pmsg['message_type']
         if message_type == '02':
-            faultProcessedMsg = pmsg
+            faultProcessedMsg = pmsg.to_dict()
 
         timeAsleep = row['time_asleep']
         if np.isnan(timeAsleep):
@@ -69,29 +266,32 @@ def getPodState(frame):
 
         # fill in pod state based on message_type
         if message_type == '1a16':
-            reqTB = pmsg['temp_basal_rate_u_per_hr']
+            reqTB = pmsg.firstEntryX10pulses
 
         elif message_type == '1a17':
-            reqBolus = pmsg['prompt_bolus_u']
+            reqBolus = pmsg.hhpulses
 
         elif message_type == '1d':
-            pod_progress = pmsg['pod_progress']
-            insulinDelivered = pmsg['insulinDelivered_delivered']
-            Bolus = pmsg['immediate_bolus_active']
-            TB    = pmsg['temp_basal_active']
-            schBa = pmsg['basal_active']
+            pod_progress = pmsg.pod_progress
+            insulinPulses = pmsg.total_pulses_delivered
+            Bolus = pmsg.immediate_bolus_active
+            TB    = pmsg.temp_basal_active
+            schBa = pmsg.basal_active
 
         elif message_type == '1f':
             #Bolus = Bolus and not pmsg['cancelBolus']
             #TB    = TB and not pmsg['cancelTB']
             #schBa = schBa and not pmsg['suspend']
             # rename the message_type per Joe's request
-            message_type = '1f0{:d}'.format(pmsg['cancelByte'])
+            message_type = '1f0{:d}'.format(pmsg.cancelByte)
 
         list_of_states.append((index, timeStamp, time_delta, timeCumSec, \
                               message_type, pod_progress, radioOnCumSec, \
-                              insulinDelivered, reqTB, \
+                              insulinPulses, reqTB, \
                               reqBolus, Bolus, TB, schBa, msg))
 
     podStateFrame = pd.DataFrame(list_of_states, columns=colNames)
+    podStateFrame = podStateFrame.astype({'insulinPulses': pulseType,
+                                          'reqTBTenthPulses': pulseType,
+                                          'reqBolusPulses': pulseType})
     return podStateFrame, emptyMessageList, faultProcessedMsg
@@ -0,0 +1,210 @@
+# file: reportCache - on-disk cache of read_file output
+#   entries are keyed by a hash of the report content plus PARSER_VERSION and
+#   the source of messageLogs_functions, so editing the parser invalidates them
+#   each entry is one .npz file holding the commands in columnar form:
+#       time        int64 epoch seconds (when every time is 'YYYY-mm-dd HH:MM:SS +0000')
+#       type        uint8 codes into typeNames
+#       raw_value   hex decoded into one payload byte array plus offsets
+#   values that do not round trip (e.g., the '\nstatus:' tail) are kept as text
+import os
+import json
+import hashlib
+import datetime
+
+import numpy as np
+
+import messageLogs_functions
+
+# bump this when the cached format or read_file output changes
+PARSER_VERSION = 1
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S +0000'
+
+# cache folder -> [bytes in it when this process last counted them, bytes this
+#   process stored since], shared by the ReportCache objects of a process (a
+#   ReportCache sent to a worker process is a copy, the worker keeps the count)
+_folderBytes = {}
+
+# recount the folder after storing this fraction of maxBytes, to see the
+#   entries other processes stored
+RECOUNT_FRACTION = 0.1
+
+def _sourceVersion():
+    # hash of the parser source, any edit to messageLogs_functions.py invalidates the cache
+    with open(messageLogs_functions.__file__, 'rb') as stream_in:
+        return hashlib.sha1(stream_in.read()).hexdigest()[:12]
+
+def _encodeTimes(times):
+    # int64 epoch seconds plus {row: text} for times not in TIME_FORMAT
+    epoch = np.zeros(len(times), dtype=np.int64)
+    extra = {}
+    for ii, thisTime in enumerate(times):
+        try:
+            value = datetime.datetime.strptime(thisTime, TIME_FORMAT)
+        except ValueError:
+            extra[ii] = thisTime
+            continue
+        if value.strftime(TIME_FORMAT) != thisTime:
+            extra[ii] = thisTime
+            continue
+        epoch[ii] = (value - datetime.datetime(1970, 1, 1)) // datetime.timedelta(seconds=1)
+    return epoch, extra
+
+def _decodeTimes(epoch, extra):
+    times = np.datetime_as_string(epoch.astype('datetime64[s]'), unit='s').tolist()
+    times = [x.replace('T', ' ') + ' +0000' for x in times]
+    for ii, thisTime in extra.items():
+        times[int(ii)] = thisTime
+    return times
+
+def _encodeRawValues(rawValues):
+    # one payload byte array plus offsets, {row: text} for values that are not hex
+    chunks = []
+    offsets = np.zeros(len(rawValues) + 1, dtype=np.int64)
+    extra = {}
+    position = 0
+    for ii, rawValue in enumerate(rawValues):
+        try:
+            chunk = bytes.fromhex(rawValue)
+        except ValueError:
+            chunk = b''
+        if chunk.hex() != rawValue:
+            extra[ii] = rawValue
+            chunk = b''
+        chunks.append(chunk)
+        position += len(chunk)
+        offsets[ii+1] = position
+    payload = np.frombuffer(b''.join(chunks), dtype=np.uint8)
+    return payload, offsets, extra
+
+def _decodeRawValues(payload, offsets, extra):
+    payload = payload.tobytes()
+    offsets = offsets.tolist()
+    rawValues = [payload[offsets[ii]:offsets[ii+1]].hex() for ii in range(len(offsets) - 1)]
+    for ii, rawValue in extra.items():
+        rawValues[int(ii)] = rawValue
+    return rawValues
+
+def hashReport(filename, prefix=b''):
+    # sha256 (hex) of prefix plus the contents of filename
+    thisHash = hashlib.sha256(prefix)
+    with open(filename, 'rb') as stream_in:
+        for block in iter(lambda: stream_in.read(1 << 20), b''):
+            thisHash.update(block)
+    return thisHash.hexdigest()
+
+class ReportCache:
+    """
+    Persistent cache of read_file(filename) -> (commands, podDict)
+
+        cache = ReportCache('~/LoopReportCache', maxBytes=500e6)
+        commands, podDict = cache.read_file(filename)
+
+    maxBytes bounds the total size of the cache folder, the least recently
+    used entries are removed first. The folder is only listed when the bytes
+    counted in it go over maxBytes (or RECOUNT_FRACTION of maxBytes has been
+    stored since the last count), not on every store. clear() removes every
+    entry.
+    """
+    def __init__(self, cacheDir, maxBytes=500e6):
+        self.cacheDir = os.path.expanduser(cacheDir)
+        self.maxBytes = maxBytes
+        self.version = '{:d}-{:s}'.format(PARSER_VERSION, _sourceVersion())
+        os.makedirs(self.cacheDir, exist_ok=True)
+
+    def getKey(self, filename):
+        # content hash of the report plus the parser version
+        return hashReport(filename, self.version.encode())
+
+    def _entryName(self, key):
+        return os.path.join(self.cacheDir, key + '.npz')
+
+    def read_file(self, filename):
+        """ same as messageLogs_functions.read_file, but cached """
+        return self._read(self.getKey(filename), messageLogs_functions.read_file, filename)
+
+    def read_bytes(self, data):
+        """ same as messageLogs_functions.read_bytes (report contents), but cached """
+        key = hashlib.sha256(self.version.encode() + data).hexdigest()
+        return self._read(key, messageLogs_functions.read_bytes, data)
+
+    def _read(self, key, parse, source):
+        # load the entry for key, or parse(source) and store it
+        entryName = self._entryName(key)
+        if os.path.isfile(entryName):
+            try:
+                commands, podDict = self.load(entryName)
+                os.utime(entryName)   # mark as recently used
+                return commands, podDict
+            except (OSError, ValueError, KeyError):
+                # unreadable entry, parse the report again
+                pass
+        commands, podDict = parse(source)
+        self.store(entryName, commands, podDict)
+        return commands, podDict
+
+    def store(self, entryName, commands, podDict):
+        times, timeExtra = _encodeTimes([x['time'] for x in commands])
+        typeNames = sorted(set(x['type'] for x in commands))
+        typeDict = {name: ii for ii, name in enumerate(typeNames)}
+        types = np.array([typeDict[x['type']] for x in commands], dtype=np.uint8)
+        payload, offsets, rawExtra = _encodeRawValues([x['raw_value'] for x in commands])
+        header = {'version': self.version, 'podDict': podDict, 'typeNames': typeNames,
+                  'timeExtra': timeExtra, 'rawExtra': rawExtra}
+        # write to a temporary name first so readers never see a partial entry
+        tempName = entryName + '.{:d}.tmp'.format(os.getpid())
+        with open(tempName, 'wb') as stream_out:
+            np.savez(stream_out, header=np.array(json.dumps(header)), time=times,
+                     type=types, payload=payload, offsets=offsets)
+        os.replace(tempName, entryName)
+        self._countBytes(os.path.getsize(entryName))
+
+    def _countBytes(self, size):
+        # add a stored entry to the count of the folder, evict if over maxBytes
+        counted = _folderBytes.get(self.cacheDir)
+        if counted is None:
+            self.evict()
+            return
+        counted[0] += size
+        counted[1] += size
+        if counted[0] > self.maxBytes or counted[1] > RECOUNT_FRACTION * self.maxBytes:
+            self.evict()
+
+    def load(self, entryName):
+        with np.load(entryName) as data:
+            header = json.loads(str(data['header']))
+            times = _decodeTimes(data['time'], header['timeExtra'])
+            typeNames = header['typeNames']
+            types = [typeNames[x] for x in data['type'].tolist()]
+            rawValues = _decodeRawValues(data['payload'], data['offsets'], header['rawExtra'])
+        commands = [dict(time=t, type=d, raw_value=r) for t, d, r in zip(times, types, rawValues)]
+        return commands, header['podDict']
+
+    def evict(self):
+        # remove least recently used entries until the folder fits in maxBytes
+        entries = []
+        for entry in os.scandir(self.cacheDir):
+            if entry.name.endswith('.npz'):
+                try:
+                    thisStat = entry.stat()
+                except OSError:
+                    # removed by another process
+                    continue
+                entries.append((thisStat.st_mtime, thisStat.st_size, entry.path))
+        totalBytes = sum(x[1] for x in entries)
+        for mtime, size, path in sorted(entries):
+            if totalBytes <= self.maxBytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            totalBytes -= size
+        _folderBytes[self.cacheDir] = [totalBytes, 0]
+
+    def clear(self):
+        # remove every entry, e.g., after a change to the parsers
+        for entry in os.scandir(self.cacheDir):
+            if entry.name.endswith('.npz') or entry.name.endswith('.tmp'):
+                os.remove(entry.path)
+        _folderBytes[self.cacheDir] = [0, 0]
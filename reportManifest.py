@@ -0,0 +1,114 @@
+# file: reportManifest - content hash manifest for incremental master csv rebuilds
+#   one entry per report file (relative to the LoopReportFiles folder):
+#       size, mtimeNs   os.stat of the file when its row was made
+#       reportHash      sha256 of the report (reportCache.hashReport)
+#       codeVersion     getCodeVersion() of the code that made the row
+#       csvRow          the csv row (formatCsvRow of the SummaryRecord)
+#   a report is run again only if its contents or the analysis code changed,
+#   a report whose size or mtime changed is hashed to find out
+import os
+import glob
+import json
+import hashlib
+
+from analyzeMessageLogsRev3 import CSV_HEADER, formatCsvRow
+from reportCache import hashReport
+
+# bump this when the csv row changes without an edit to analysisModules
+MANIFEST_VERSION = 1
+
+# modules whose source determines the csv row (plus every parse_*.py)
+analysisModules = ('analyzeMessageLogsRev3', 'summaryAnalysis', 'messageLogs_functions',
+                   'podStateAnalysis', 'checkAction', 'messagePatternParsing',
+                   'messageBatchParsing', 'messageFieldSpecs', 'podUtils', 'utils',
+                   'byteUtils')
+
+def getCodeVersion():
+    # hash of MANIFEST_VERSION and the source of the analysis modules
+    thisDir = os.path.dirname(os.path.abspath(__file__))
+    filenames = [os.path.join(thisDir, x + '.py') for x in analysisModules]
+    filenames += sorted(glob.glob(os.path.join(thisDir, 'parse_*.py')))
+    thisHash = hashlib.sha1(str(MANIFEST_VERSION).encode())
+    for filename in filenames:
+        with open(filename, 'rb') as stream_in:
+            thisHash.update(stream_in.read())
+    return thisHash.hexdigest()[:12]
+
+class ReportManifest:
+    """
+    Manifest of the csv row of every report, for runAll433_Rev3
+
+        manifest = ReportManifest('manifest.json')
+        runList = manifest.getStale(filePath, fileList)
+        ... analyze runList, manifest.update(thisFile, reportResult) for each ...
+        manifest.writeCsv(outFile, fileList)
+        manifest.save()
+
+    Unchanged reports are found with one os.stat each, so a rebuild with
+    nothing to do only reads the manifest and writes the csv.
+    """
+    def __init__(self, manifestFile):
+        self.manifestFile = manifestFile
+        self.codeVersion = getCodeVersion()
+        self.entries = {}
+        self.thisPath = None
+        if os.path.isfile(manifestFile):
+            try:
+                with open(manifestFile, 'rt') as stream_in:
+                    self.entries = json.load(stream_in)['entries']
+            except (OSError, ValueError, KeyError):
+                self.entries = {}
+
+    def getStale(self, thisPath, fileList):
+        """
+        Return the reports in fileList (same order) that must be analyzed:
+        new, edited or made by a different codeVersion. Entries of reports
+        no longer in fileList and of the reports returned are dropped, so a
+        report whose new analysis fails has no row (not its old one).
+        """
+        self.thisPath = thisPath
+        self.entries = {x: self.entries[x] for x in fileList if x in self.entries}
+        runList = []
+        for thisFile in fileList:
+            entry = self.entries.get(thisFile)
+            if not entry or entry['codeVersion'] != self.codeVersion:
+                self.entries.pop(thisFile, None)
+                runList.append(thisFile)
+                continue
+            fileStat = os.stat(thisPath + '/' + thisFile)
+            if fileStat.st_size == entry['size'] and fileStat.st_mtime_ns == entry['mtimeNs']:
+                continue
+            # touched or edited, same contents => same row
+            if hashReport(thisPath + '/' + thisFile) == entry['reportHash']:
+                entry['size'] = fileStat.st_size
+                entry['mtimeNs'] = fileStat.st_mtime_ns
+                continue
+            del self.entries[thisFile]
+            runList.append(thisFile)
+        return runList
+
+    def update(self, thisFile, reportResult):
+        # record the row of a report just analyzed (summarizeLoopReport(..., withDetails=True))
+        fileStat = os.stat(self.thisPath + '/' + thisFile)
+        self.entries[thisFile] = {
+            'size': fileStat.st_size, 'mtimeNs': fileStat.st_mtime_ns,
+            'reportHash': reportResult.reportHash, 'codeVersion': self.codeVersion,
+            'csvRow': formatCsvRow(reportResult.summaryRecord)}
+
+    def writeCsv(self, outFile, fileList):
+        # write the header and the row of every report in fileList (in order) to outFile,
+        #   only rows made by this codeVersion
+        with open(outFile, mode='wt') as stream_out:
+            stream_out.write(CSV_HEADER)
+            stream_out.write('\n')
+            for thisFile in fileList:
+                entry = self.entries.get(thisFile)
+                if entry and entry['codeVersion'] == self.codeVersion:
+                    stream_out.write(entry['csvRow'])
+                    stream_out.write('\n')
+
+    def save(self):
+        tempName = self.manifestFile + '.{:d}.tmp'.format(os.getpid())
+        with open(tempName, 'wt') as stream_out:
+            json.dump({'version': MANIFEST_VERSION, 'entries': self.entries}, stream_out)
+        os.replace(tempName, self.manifestFile)
@@ -0,0 +1,153 @@
+# file: resultsDatabase - SQLite store for the results of every report
+#   tables (one row per report keyed by filename, reportHash is the sha256 of
+#   the report, kept to tell a changed report from the stored one):
+#       reports   the values of the csv row (SummaryRecord) plus reportHash, tid
+#                 and seq, the order the report was first stored in
+#       actions   every action instance (actionFrame columns) of the report
+#       faults    the parse_02 msgDict of the fault message, if any
+#   storing a report again (same filename) replaces its rows in the same place,
+#   two reports with the same contents under different names are two rows
+#   exportCsv writes the reports in the master csv layout (CSV_HEADER, formatCsvRow)
+import sqlite3
+
+import numpy as np
+
+from analyzeMessageLogsRev3 import CSV_HEADER, SummaryRecord, formatCsvRow
+from checkAction import actionColumnNames
+from podUtils import getActionDict
+from parse_02 import fields_02
+
+# bump this when the tables change, an older database is rebuilt
+SCHEMA_VERSION = 2
+
+# text columns of reports (indexed or matched by value), the other
+#   columns have no declared type so ints stay ints and floats stay floats
+#   (the csv prints 0 and 0.0 differently)
+textColumnNames = ('thisPerson', 'thisFinish', 'thisFinish2', 'lastDate', 'lot',
+                   'piVersion', 'pmVersion', 'rawFault', 'filename')
+
+faultColumnNames = tuple(x.name for x in fields_02)
+
+def _columnDef(name):
+    return '"{:s}" TEXT'.format(name) if name in textColumnNames else '"{:s}"'.format(name)
+
+def _plain(value):
+    # numpy scalars as python values, dates as text, for sqlite
+    if isinstance(value, np.generic):
+        return value.item()
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+class ResultsDatabase:
+    """
+    SQLite results store for the batch runners
+
+        resultsDb = ResultsDatabase('results.db')
+        resultsDb.storeReports(reportResults)   # from summarizeLoopReport(..., withDetails=True)
+        resultsDb.exportCsv('output_master_rev3.csv')
+
+    storeReports writes a list of reports in one transaction. Query the
+    tables with resultsDb.connection (e.g., reports by lot and tid, faults
+    by logged_fault) or getSummaryRecords.
+    """
+    def __init__(self, dbFile):
+        self.dbFile = dbFile
+        self.connection = sqlite3.connect(dbFile)
+        self.createTables()
+
+    def createTables(self):
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version not in (0, SCHEMA_VERSION):
+            with self.connection:
+                for table in ('reports', 'actions', 'faults'):
+                    self.connection.execute('DROP TABLE IF EXISTS ' + table)
+        reportColumns = ', '.join(_columnDef(x) for x in SummaryRecord._fields)
+        faultColumns = ', '.join('"{:s}"'.format(x) for x in faultColumnNames)
+        with self.connection:
+            self.connection.executescript('''
+                CREATE TABLE IF NOT EXISTS reports (
+                    reportHash TEXT NOT NULL, seq INTEGER NOT NULL, tid TEXT,
+                    {:s});
+                CREATE UNIQUE INDEX IF NOT EXISTS reports_filename ON reports (filename);
+                CREATE INDEX IF NOT EXISTS reports_hash ON reports (reportHash);
+                CREATE INDEX IF NOT EXISTS reports_person ON reports (thisPerson);
+                CREATE INDEX IF NOT EXISTS reports_lot_tid ON reports (lot, tid);
+                CREATE INDEX IF NOT EXISTS reports_finish ON reports (thisFinish);
+                CREATE INDEX IF NOT EXISTS reports_date ON reports (lastDate);
+                CREATE INDEX IF NOT EXISTS reports_seq ON reports (seq);
+                CREATE TABLE IF NOT EXISTS actions (
+                    filename TEXT NOT NULL, reportHash TEXT, actionName TEXT, actionId INTEGER,
+                    startIdx INTEGER, cumStartSec REAL, responseTime REAL,
+                    SchBasalState INTEGER, completed INTEGER);
+                CREATE INDEX IF NOT EXISTS actions_report ON actions (filename);
+                CREATE INDEX IF NOT EXISTS actions_name ON actions (actionName, completed);
+                CREATE TABLE IF NOT EXISTS faults (
+                    filename TEXT PRIMARY KEY, reportHash TEXT, {:s});
+                CREATE INDEX IF NOT EXISTS faults_code ON faults (logged_fault);
+                PRAGMA user_version = {:d};
+                '''.format(reportColumns, faultColumns, SCHEMA_VERSION))
+
+    def storeReports(self, reportResults):
+        """
+        Insert (or replace, same filename) every ReportResult in one transaction
+
+        A report stored before under the same filename (e.g., the report
+        changed, a new reportHash) is replaced in the same place (seq)
+        """
+        names = ('reportHash', 'tid') + SummaryRecord._fields
+        columns = ', '.join('"{:s}"'.format(x) for x in names)
+        updates = ', '.join('"{0:s}" = excluded."{0:s}"'.format(x) for x in names)
+        reportSql = 'INSERT INTO reports (seq, {:s}) VALUES ' \
+            '((SELECT COALESCE(MAX(seq), 0) + 1 FROM reports), {:s}) ' \
+            'ON CONFLICT (filename) DO UPDATE SET {:s}'.format(
+                columns, ', '.join('?' * len(names)), updates)
+        actionSql = 'INSERT INTO actions (filename, reportHash, {:s}) VALUES (?, ?, {:s})'.format(
+            ', '.join(actionColumnNames), ', '.join('?' * len(actionColumnNames)))
+        faultSql = 'INSERT OR REPLACE INTO faults (filename, reportHash, {:s}) ' \
+            'VALUES (?, ?, {:s})'.format(
+            ', '.join('"{:s}"'.format(x) for x in faultColumnNames),
+            ', '.join('?' * len(faultColumnNames)))
+        actionNames = list(getActionDict().keys())
+
+        with self.connection:
+            for result in reportResults:
+                reportKey = [result.summaryRecord.filename, result.reportHash]
+                row = [result.reportHash, result.podDict['tid']] + list(result.summaryRecord)
+                self.connection.execute(reportSql, [_plain(x) for x in row])
+
+                self.connection.execute('DELETE FROM actions WHERE filename = ?', reportKey[:1])
+                actionTable = result.actionTable
+                actionId = np.asarray(actionTable['actionId']).tolist()
+                columns = [[actionNames[x] for x in actionId], actionId] + \
+                    [np.asarray(actionTable[x]).tolist() for x in actionColumnNames[2:]]
+                self.connection.executemany(actionSql,
+                                            (reportKey + list(x) for x in zip(*columns)))
+
+                self.connection.execute('DELETE FROM faults WHERE filename = ?', reportKey[:1])
+                fault = result.faultProcessedMsg
+                if fault:
+                    self.connection.execute(faultSql, reportKey +
+                                            [_plain(fault.get(x)) for x in faultColumnNames])
+
+    def getSummaryRecords(self, where='', parameters=()):
+        """
+        SummaryRecord of every report (in seq order), optionally only those
+        matching where, e.g., getSummaryRecords('lot = ? AND tid = ?', (lot, tid))
+        """
+        sql = 'SELECT {:s} FROM reports {:s} ORDER BY seq'.format(
+            ', '.join('"{:s}"'.format(x) for x in SummaryRecord._fields),
+            'WHERE ' + where if where else '')
+        return [SummaryRecord(*row) for row in self.connection.execute(sql, parameters)]
+
+    def exportCsv(self, outFile):
+        # write every report to outFile in the master csv layout (replaces outFile)
+        with open(outFile, mode='wt') as stream_out:
+            stream_out.write(CSV_HEADER)
+            stream_out.write('\n')
+            for record in self.getSummaryRecords():
+                stream_out.write(formatCsvRow(record))
+                stream_out.write('\n')
+
+    def close(self):
+        self.connection.close()
@@ -1,20 +1,108 @@
 # runAll LoopReportFiles in the associated folder
+import sys
+import traceback
 from analyzeMessageLogsRev3 import *
 from get_file_list import *
 from getAnalysisIO import *
+from batchAnalysis import *
+from reportCache import *
+from summaryAnalysis import *
+from resultsDatabase import *
+from messageLake import writeLakeReport
+from reportManifest import *
 
-filePath, outFile = getAnalysisIO(1,1)
-fileDateList = get_file_list(filePath)
-
-count=0
-for row in fileDateList:
-    thisFile = row[0]
-    (thisPerson, thisFinish, thisAntenna) = parse_info_from_filename(thisFile)
-    if thisAntenna != '433MHz':
-        print('    Skipping : ', thisFile)
-        continue
-    print('Processing: ', thisFile)
-    analyzeMessageLogsRev3(filePath, thisFile, outFile)
-    count += 1
-
-print('Completed running', count,'files')
+# numWorkers = 0 runs each report in turn and prints the full report
+#              otherwise reports are spread over numWorkers processes
+#              (None uses every core), the csv rows are identical
+numWorkers = None
+
+# stageLogFile = filename => time every stage of every report, print a summary
+#                and append the records to stageLogFile (json lines)
+stageLogFile = None
+
+# cacheDir = folder => keep the parsed reports there (see reportCache), a rerun
+#            only parses new or changed reports; None parses every report
+cacheDir = None
+cacheMaxBytes = 500e6
+
+# resultsDbFile = filename => store every report in that SQLite database (see
+#                 resultsDatabase), rerunning a report replaces its rows, and
+#                 rewrite outFile from the database instead of appending to it
+resultsDbFile = None
+
+# lakeDir = folder => also write the podState and decoded message columns of
+#           every report to a Parquet lake there (see messageLake, needs pyarrow)
+lakeDir = None
+
+# manifestFile = filename => keep the csv row, content hash and code version of
+#                every report there (see reportManifest), only new or changed
+#                reports (or all of them after an edit to the analysis code)
+#                are run and outFile is rewritten from the manifest
+manifestFile = None
+
+# listSnapshotFile = filename => keep the folder listings there (see
+#                    get_file_list), only folders that changed are listed again
+listSnapshotFile = None
+
+# readConcurrency = number => read that many reports ahead while the workers
+#                   analyze (see asyncPipeline), for slow storage such as a
+#                   network share; None => each worker reads its own report
+readConcurrency = None
+
+if __name__ == '__main__':
+    filePath, outFile = getAnalysisIO(1,1)
+    fileDateList = get_report_list(filePath, snapshotFile=listSnapshotFile)
+    fileList = select433Reports(fileDateList)
+    recorder = StageRecorder() if stageLogFile else None
+    cache = ReportCache(cacheDir, cacheMaxBytes) if cacheDir else None
+    resultsDb = ResultsDatabase(resultsDbFile) if resultsDbFile else None
+    manifest = ReportManifest(manifestFile) if manifestFile else None
+    csvFile = 0 if resultsDb or manifest else outFile
+    if manifest:
+        runList = manifest.getStale(filePath, fileList)
+        print('Reusing rows of', len(fileList) - len(runList), 'unchanged reports')
+    else:
+        runList = fileList
+
+    if numWorkers == 0:
+        # same error handling as analyzeBatch: a report that raises is
+        #   reported and skipped, the remaining reports are still processed
+        count=0
+        errorList = []
+        withDetails = bool(resultsDb or manifest)
+        for thisFile in runList:
+            print('Processing: ', thisFile)
+            try:
+                result = analyzeMessageLogsRev3(filePath, thisFile, csvFile,
+                                                recorder or NULL_RECORDER, cache,
+                                                withDetails=withDetails)
+                if resultsDb:
+                    resultsDb.storeReports([result[4]])
+                if manifest:
+                    manifest.update(thisFile, result[4])
+                if lakeDir:
+                    writeLakeReport(lakeDir, filePath, thisFile, cache)
+            except Exception:
+                errorList.append((thisFile, traceback.format_exc()))
+                print('    Error    : ', thisFile, file=sys.stderr)
+                print(errorList[-1][1], file=sys.stderr)
+                continue
+            count += 1
+
+        print('Completed running', count,'files,', len(errorList), 'error(s)')
+    else:
+        analyzeBatch(filePath, runList, csvFile, numWorkers=numWorkers, recorder=recorder,
+                     cache=cache, resultsDb=resultsDb, lakeDir=lakeDir, manifest=manifest,
+                     readConcurrency=readConcurrency)
+
+    if manifest:
+        manifest.writeCsv(outFile, fileList)
+        manifest.save()
+    elif resultsDb:
+        resultsDb.exportCsv(outFile)
+    if resultsDb:
+        resultsDb.close()
+
+    if recorder:
+        recorder.printSummary()
+        recorder.writeJsonLines(stageLogFile)
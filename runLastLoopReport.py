@@ -3,8 +3,19 @@ from analyzeMessageLogsRev3 import *
 from get_file_list import *
 from getAnalysisIO import *
 
+# checkpointDir = folder => WIP reports continue from the checkpoint of the
+#                 previous copy of the same pod (see followLoopReport)
+checkpointDir = None
+
 filePath, outFile = getAnalysisIO(1,1)
 fileDateList = get_file_list(filePath)
 
 ## Rev3 analysis
-df, podState, actionFrame, actionSummary = analyzeMessageLogsRev3(filePath, fileDateList[-1][0], outFile)
+if checkpointDir:
+    from followLoopReport import followLoopReport
+    podState, actionFrame, actionSummary, csvRow = followLoopReport(filePath, fileDateList[-1][0],
+                                                                    outFile, checkpointDir)
+    if csvRow:
+        writeCsvRows(outFile, [csvRow])
+else:
+    df, podState, actionFrame, actionSummary = analyzeMessageLogsRev3(filePath, fileDateList[-1][0], outFile)
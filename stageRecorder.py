@@ -0,0 +1,108 @@
+# file: stageRecorder - optional per-stage timing and memory records
+#   analyzeMessageLogsRev3 wraps every stage in recorder.stage(name); with the
+#   default NULL_RECORDER that is a shared no-op context manager
+import json
+import time
+import contextlib
+import tracemalloc
+
+class StageRecorder:
+    """
+    Collects one record per (report, stage):
+        report   filename of the Loop Report
+        stage    stage name, e.g., 'read_file', 'getPodState'
+        wallSec  elapsed wall clock time (sec)
+        cpuSec   CPU time of this process (sec)
+        peakMB   peak traced memory above the start of the stage (MB),
+                 None unless traceMemory is True
+        rows     number of rows produced by the stage (if the stage sets it)
+    """
+    def __init__(self, traceMemory=False):
+        self.traceMemory = traceMemory
+        self.records = []
+        self.report = ''
+        self._startedTracing = False
+
+    def startReport(self, thisFile):
+        # records that follow belong to this report
+        self.report = thisFile
+
+    @contextlib.contextmanager
+    def stage(self, stageName):
+        # the yielded dict is the record, set record['rows'] inside the block
+        record = {'report': self.report, 'stage': stageName, 'rows': None}
+        if self.traceMemory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._startedTracing = True
+            tracemalloc.reset_peak()
+            baseMemory = tracemalloc.get_traced_memory()[0]
+        wallStart = time.perf_counter()
+        cpuStart = time.process_time()
+        try:
+            yield record
+        finally:
+            record['wallSec'] = time.perf_counter() - wallStart
+            record['cpuSec'] = time.process_time() - cpuStart
+            if self.traceMemory:
+                record['peakMB'] = (tracemalloc.get_traced_memory()[1] - baseMemory) / 1e6
+            else:
+                record['peakMB'] = None
+            self.records.append(record)
+
+    def extend(self, records):
+        # add records collected elsewhere, e.g., by a batch worker process
+        self.records.extend(records)
+
+    def close(self):
+        # stop tracemalloc if this recorder started it
+        if self._startedTracing:
+            tracemalloc.stop()
+            self._startedTracing = False
+
+    def summarize(self):
+        """ return dict stage -> count, totalWallSec, totalCpuSec, maxWallSec, maxPeakMB, rows """
+        summary = {}
+        for record in self.records:
+            subDict = summary.setdefault(record['stage'], {'count': 0, 'totalWallSec': 0.0,
+                'totalCpuSec': 0.0, 'maxWallSec': 0.0, 'maxPeakMB': None, 'rows': 0})
+            subDict['count'] += 1
+            subDict['totalWallSec'] += record['wallSec']
+            subDict['totalCpuSec'] += record['cpuSec']
+            subDict['maxWallSec'] = max(subDict['maxWallSec'], record['wallSec'])
+            if record['peakMB'] is not None:
+                subDict['maxPeakMB'] = max(subDict['maxPeakMB'] or 0.0, record['peakMB'])
+            if record['rows']:
+                subDict['rows'] += record['rows']
+        return summary
+
+    def printSummary(self):
+        summary = self.summarize()
+        totalWall = sum(x['totalWallSec'] for x in summary.values()) or 1.0
+        print('\n  Stage               :  count,  wall (s),   cpu (s), % wall, max peak (MB)')
+        for stageName, subDict in summary.items():
+            peak = subDict['maxPeakMB']
+            print('    {:18s}: {:6d}, {:9.3f}, {:9.3f}, {:5.1f}%, {:s}'.format(
+                stageName, subDict['count'], subDict['totalWallSec'], subDict['totalCpuSec'],
+                100*subDict['totalWallSec']/totalWall,
+                'n/a' if peak is None else '{:.1f}'.format(peak)))
+
+    def writeJsonLines(self, filename, mode='at'):
+        # one json record per line, appended by default
+        with open(filename, mode) as stream_out:
+            for record in self.records:
+                stream_out.write(json.dumps(record))
+                stream_out.write('\n')
+
+class _NullRecorder:
+    # stand in when instrumentation is off: every stage shares one no-op context
+    def __init__(self):
+        self._context = contextlib.nullcontext({})
+
+    def startReport(self, thisFile):
+        pass
+
+    def stage(self, stageName):
+        return self._context
+
+NULL_RECORDER = _NullRecorder()
@@ -0,0 +1,405 @@
+# file: streamAnalysis - online analysis of a MessageLog, one message at a time
+#   StreamAnalyzer.feed(time, type, raw_value) returns the podState row of the
+#   message plus every action instance decided by it; only the last few rows
+#   (see actionMatchRadius) and running totals are kept, so memory does not
+#   grow with the log. The action instances and getActionSummary are the same
+#   as checkAction and processActionFrame on the whole log.
+import time
+from collections import namedtuple, deque
+
+import numpy as np
+import pandas as pd
+
+from podStateAnalysis import podStateColumnNames, getInitialPodState
+from checkAction import actionColumnNames, actionMatchRadius
+from messagePatternParsing import processMsgRecord
+from messageLogs_functions import _iter_report_sections, _command_dict
+from podUtils import getActionDict
+from utils import getRateFromTenthPulses
+
+# one row of podState (see getPodState)
+PodStateRow = namedtuple('PodStateRow', podStateColumnNames)
+
+# one row of the actionFrame (see checkAction)
+ActionEvent = namedtuple('ActionEvent', actionColumnNames)
+
+# token of a row before the first message or after the end of the log
+_OUTSIDE = object()
+
+class StreamAnalyzer:
+    """
+    Online version of getPodState, checkAction and processActionFrame
+
+        analyzer = StreamAnalyzer()
+        for thisTime, thisType, raw_value in messages:
+            for event in analyzer.feed(thisTime, thisType, raw_value):
+                ...    # PodStateRow, then any ActionEvent
+        events = analyzer.finish()     # instances decided by the end of the log
+        actionSummary, totalCompletedMessages = analyzer.getActionSummary()
+
+    An action instance is decided as soon as its messages are in, except
+    when its messages could still be part of an action earlier in
+    actionDict (e.g., '0e', '1d' is a StatusCheck only if the next messages
+    are not '1a17', '1d' of a Bolus), then it waits for those messages.
+
+    A message with the '\nstatus:' tail (the last MessageLog entry of a Loop
+    Report) is held back: finish() analyzes it without the tail, as
+    analyzeLoopReport does for the last message; if another message comes
+    first it is analyzed as it is (and raises, as it would in the report).
+
+    keepRepeated   number of the last repeated TB tuples kept for the
+                   actionSummary (repeatedTB, ...), the counts are of all
+                   (None => keep them all, memory then grows with them)
+    """
+    def __init__(self, keepRepeated=100):
+        actionDict = getActionDict()
+        self.actionNames = list(actionDict.keys())
+        self.primeOffset = [values[0] for values in actionDict.values()]
+        self.matchList = [values[1] for values in actionDict.values()]
+        # action for each prime message_type (every type is prime of one action at most)
+        self.primeAction = {matchList[offset]: thisId for thisId, (offset, matchList)
+                            in enumerate(zip(self.primeOffset, self.matchList))}
+        self.keepRows = 2 * actionMatchRadius() + 4
+
+        state = getInitialPodState()
+        self.numMessages = 0
+        self.isFinished = False
+        self.lastTimeNs = None
+        self.timeCumSec = float(state['timeCumSec'])
+        self.radioOnCumSec = float(state['radioOnCumSec'])
+        self.pod_progress = state['pod_progress']
+        self.insulinPulses = state['insulinPulses']
+        self.reqTB = state['reqTBTenthPulses']
+        self.reqBolus = state['reqBolusPulses']
+        self.Bolus = state['Bolus']
+        self.TB = state['TB']
+        self.schBa = state['SchBasal']
+        self.faultProcessedMsg = {}
+        self.emptyMessageList = []
+
+        # last keepRows rows: (message_type, timeCumSec, SchBasal, reqTBTenthPulses)
+        self.rows = {}
+        self.pending = []       # prime rows not decided yet
+        self.decided = {}       # (actionId, prime row) -> complete, once known
+
+        # running totals for getActionSummary, by actionId
+        self.numEvents = 0
+        self.countCompleted = [0] * len(self.actionNames)
+        self.countIncomplete = [0] * len(self.actionNames)
+        self.sumResponse = [0.0] * len(self.actionNames)
+        self.minResponse = [np.inf] * len(self.actionNames)
+        self.maxResponse = [-np.inf] * len(self.actionNames)
+        self.lastTBStart = None
+        self.numShortTB = 0
+        self.numSchBasalbeforeTB = 0
+        self.numRepeatedTB = 0
+        self.numRepeatedShortTB = 0
+        self.numRepeated19MinTB = 0
+        self.repeatedTB = deque(maxlen=keepRepeated)
+        self.repeatedShortTB = deque(maxlen=keepRepeated)
+        self.repeated19MinTB = deque(maxlen=keepRepeated)
+        # message with the '\nstatus:' tail, (time, type, raw_value)
+        self.heldMessage = None
+
+    def feed(self, thisTime, thisType, raw_value):
+        """
+        Add the next message, returns [PodStateRow, ActionEvent, ...]
+        ([] for a message held back, see StreamAnalyzer)
+        """
+        events = []
+        if self.heldMessage is not None:
+            # not the last message after all
+            events = self._analyze(*self.heldMessage)
+            self.heldMessage = None
+        if '\nstatus:' in raw_value:
+            self.heldMessage = (thisTime, thisType, raw_value)
+            return events
+        return events + self._analyze(thisTime, thisType, raw_value)
+
+    def _analyze(self, thisTime, thisType, msg):
+        # [PodStateRow, ActionEvent, ...] of the next message
+        index = self.numMessages
+        timeNs = pd.Timestamp(thisTime).value
+        # seconds part of the time difference, same as generate_table
+        if self.lastTimeNs is None:
+            time_delta = 0.0
+        else:
+            time_delta = float(((timeNs - self.lastTimeNs) // 1000000000) % 86400)
+        self.lastTimeNs = timeNs
+        self.timeCumSec += time_delta
+        radio_on_time = 30
+        if time_delta > radio_on_time:
+            self.radioOnCumSec += radio_on_time
+        else:
+            self.radioOnCumSec += time_delta
+
+        if msg == '':
+            message_type = 'unknown'
+            self.emptyMessageList.append(index)
+        else:
+            pmsg = processMsgRecord(msg)
+            message_type = pmsg.message_type
+            if message_type == '02':
+                self.faultProcessedMsg = pmsg.to_dict()
+            elif message_type == '1a16':
+                self.reqTB = pmsg.firstEntryX10pulses
+            elif message_type == '1a17':
+                self.reqBolus = pmsg.hhpulses
+            elif message_type == '1d':
+                self.pod_progress = pmsg.pod_progress
+                self.insulinPulses = pmsg.total_pulses_delivered
+                self.Bolus = pmsg.immediate_bolus_active
+                self.TB = pmsg.temp_basal_active
+                self.schBa = pmsg.basal_active
+            elif message_type == '1f':
+                # rename the message_type per Joe's request
+                message_type = '1f0{:d}'.format(pmsg.cancelByte)
+
+        podStateRow = PodStateRow(
+            index, pd.Timestamp(timeNs, tz='UTC'), time_delta, self.timeCumSec, message_type,
+            self.pod_progress, self.radioOnCumSec, self.insulinPulses, self.reqTB,
+            self.reqBolus, self.Bolus, self.TB, self.schBa, msg)
+
+        self.numMessages += 1
+        self.rows[index] = (message_type, self.timeCumSec, bool(self.schBa), int(self.reqTB))
+        if message_type in self.primeAction:
+            self.pending.append(index)
+        events = [podStateRow] + self._decidePending()
+
+        # forget rows no pending instance can look at
+        oldIdx = index - self.keepRows
+        if oldIdx in self.rows:
+            del self.rows[oldIdx]
+            for thisId in range(len(self.actionNames)):
+                self.decided.pop((thisId, oldIdx), None)
+        return events
+
+    def finish(self):
+        """
+        End of the log: the last message is analyzed if it was held back
+        (without its '\nstatus:' tail) and messages after it count as
+        missing, returns its PodStateRow (if held) and the ActionEvents
+        decided by that
+        """
+        events = []
+        if self.heldMessage is not None:
+            thisTime, thisType, raw_value = self.heldMessage
+            self.heldMessage = None
+            events = self._analyze(thisTime, thisType, raw_value.replace('\nstatus:', ''))
+        self.isFinished = True
+        return events + self._decidePending()
+
+    def _token(self, index):
+        # message_type of row index, _OUTSIDE before the start or after the end,
+        #   None if the message has not arrived yet
+        if index < 0:
+            return _OUTSIDE
+        if index >= self.numMessages:
+            return _OUTSIDE if self.isFinished else None
+        return self.rows[index][0]
+
+    def _isComplete(self, thisId, primeIdx):
+        # True if primeIdx is the prime of a complete instance of action thisId
+        #   (same rules as matchActionColumns), None if not known yet
+        key = (thisId, primeIdx)
+        if key in self.decided:
+            return self.decided[key]
+        offset = self.primeOffset[thisId]
+        matchList = self.matchList[thisId]
+        token = self._token(primeIdx)
+        if token is None:
+            return None
+        if token != matchList[offset]:
+            result = False
+        else:
+            isAdjacent = self._isAdjacent(thisId, primeIdx)
+            if isAdjacent is False:
+                result = False
+            else:
+                isClaimed = self._isClaimed(primeIdx, thisId)
+                if isClaimed is None or isAdjacent is None:
+                    result = None if isClaimed is not True else False
+                else:
+                    result = not isClaimed
+        if result is not None:
+            self.decided[key] = result
+        return result
+
+    def _isAdjacent(self, thisId, primeIdx):
+        # True if the messages around primeIdx match the pattern of thisId
+        #   (claimed messages still count), None if not known yet
+        offset = self.primeOffset[thisId]
+        isKnown = True
+        for ii, name in enumerate(self.matchList[thisId]):
+            if ii == offset:
+                continue
+            token = self._token(primeIdx + ii - offset)
+            if token is None:
+                isKnown = False
+            elif token is _OUTSIDE or token != name:
+                return False
+        return True if isKnown else None
+
+    def _isClaimed(self, index, thisId):
+        # True if row index is in a complete instance of an action before thisId
+        isKnown = True
+        for otherId in range(thisId):
+            offset = self.primeOffset[otherId]
+            for ii in range(len(self.matchList[otherId])):
+                isComplete = self._isComplete(otherId, index - ii + offset)
+                if isComplete:
+                    return True
+                if isComplete is None:
+                    isKnown = False
+        return False if isKnown else None
+
+    def _decidePending(self):
+        # ActionEvents for the pending prime rows that can be decided now
+        events = []
+        stillPending = []
+        for primeIdx in self.pending:
+            thisId = self.primeAction[self.rows[primeIdx][0]]
+            isClaimed = self._isClaimed(primeIdx, thisId)
+            if isClaimed is None:
+                stillPending.append(primeIdx)
+                continue
+            if isClaimed:
+                continue
+            isComplete = self._isComplete(thisId, primeIdx)
+            if isComplete is None:
+                stillPending.append(primeIdx)
+                continue
+            events.append(self._addEvent(thisId, primeIdx, isComplete))
+        self.pending = stillPending
+        return events
+
+    def _addEvent(self, thisId, primeIdx, isComplete):
+        # ActionEvent for an instance, added to the running totals
+        self.numEvents += 1
+        if not isComplete:
+            self.countIncomplete[thisId] += 1
+            return ActionEvent(self.actionNames[thisId], thisId, primeIdx, np.nan, np.nan,
+                               self.rows[primeIdx][2], False)
+        startIdx = primeIdx - self.primeOffset[thisId]
+        lastIdx = startIdx + len(self.matchList[thisId]) - 1
+        cumStartSec = self.rows[startIdx][1]
+        responseTime = self.rows[lastIdx][1] - cumStartSec
+        SchBasalState = self.rows[startIdx][2]
+        self.countCompleted[thisId] += 1
+        self.sumResponse[thisId] += responseTime
+        self.minResponse[thisId] = min(self.minResponse[thisId], responseTime)
+        self.maxResponse[thisId] = max(self.maxResponse[thisId], responseTime)
+        if self.actionNames[thisId] == 'TB':
+            # same checks as processActionFrame, TB instances are decided in order
+            if self.lastTBStart is None:
+                timeSinceLastTB = 399.0
+            else:
+                timeSinceLastTB = cumStartSec - self.lastTBStart
+            self.lastTBStart = cumStartSec
+            self.numShortTB += timeSinceLastTB < 30
+            self.numSchBasalbeforeTB += SchBasalState
+            priorReqTB = self.rows[startIdx][3]
+            if not SchBasalState and self.rows[startIdx + 2][3] == priorReqTB:
+                repeated = (np.float64(cumStartSec), np.float64(getRateFromTenthPulses(priorReqTB)),
+                            np.int64(startIdx + 2), np.float64(timeSinceLastTB))
+                self.numRepeatedTB += 1
+                self.repeatedTB.append(repeated)
+                if timeSinceLastTB < 30:
+                    self.numRepeatedShortTB += 1
+                    self.repeatedShortTB.append(repeated)
+                elif timeSinceLastTB < 1140:
+                    self.numRepeated19MinTB += 1
+                    self.repeated19MinTB.append(repeated)
+        return ActionEvent(self.actionNames[thisId], thisId, startIdx, cumStartSec, responseTime,
+                           SchBasalState, True)
+
+    def getActionSummary(self):
+        """
+        processActionFrame for every action instance decided so far
+        (after finish(), the same as processActionFrame on the whole log,
+        except repeatedTB, ... have only the last keepRepeated tuples)
+        """
+        if self.numEvents == 0:
+            return
+        actionSummary = {}
+        totalCompletedMessages = 0
+        for thisId, thisName in enumerate(self.actionNames):
+            numCompleted = self.countCompleted[thisId]
+            if numCompleted == 0:
+                continue
+            msgPerAction = len(self.matchList[thisId])
+            totalCompletedMessages += numCompleted*msgPerAction
+            subDict = {
+              'msgPerAction': msgPerAction,
+              'countCompleted': numCompleted*msgPerAction/msgPerAction,
+              'countIncomplete': self.countIncomplete[thisId],
+              'meanResponseTime': np.float64(self.sumResponse[thisId]) / numCompleted,
+              'minResponseTime': np.float64(self.minResponse[thisId]),
+              'maxResponseTime': np.float64(self.maxResponse[thisId])}
+            if thisName == 'TB':
+                subDict['numShortTB'] = np.int64(self.numShortTB)
+                subDict['numSchBasalbeforeTB'] = np.int64(self.numSchBasalbeforeTB)
+                subDict['numRepeatedTB'] = self.numRepeatedTB
+                subDict['repeatedTB'] = list(self.repeatedTB)
+                subDict['numRepeatedShortTB'] = self.numRepeatedShortTB
+                subDict['repeatedShortTB'] = list(self.repeatedShortTB)
+                subDict['numrepeated19MinTB'] = self.numRepeated19MinTB
+                subDict['repeated19MinTB'] = list(self.repeated19MinTB)
+            actionSummary[thisName] = subDict
+        return actionSummary, totalCompletedMessages
+
+def streamLoopReport(messages, analyzer=None):
+    """
+    Purpose: generator version of the analysis for a stream of messages
+
+    Input:
+        messages    iterable of (time, type, raw_value) tuples, e.g., from
+                    followMessageLog or the commands of read_file
+        analyzer    StreamAnalyzer (None => a new one), its getActionSummary
+                    is the summary of everything yielded
+
+    Output:
+        yields a PodStateRow for every message and an ActionEvent for every
+        action instance as soon as it is decided (the last ones when
+        messages ends)
+    """
+    if analyzer is None:
+        analyzer = StreamAnalyzer()
+    for thisTime, thisType, raw_value in messages:
+        yield from analyzer.feed(thisTime, thisType, raw_value)
+    yield from analyzer.finish()
+
+def _followLines(filename, pollInterval, idleTimeout):
+    # lines of a growing file, waits for more at the end of the file
+    with open(filename, 'r', encoding='UTF8') as stream_in:
+        idleTime = 0.0
+        partLine = ''
+        while True:
+            line = stream_in.readline()
+            if line:
+                partLine += line
+                if partLine.endswith('\n'):
+                    yield partLine
+                    partLine = ''
+                idleTime = 0.0
+                continue
+            if idleTimeout is not None and idleTime >= idleTimeout:
+                if partLine:
+                    yield partLine
+                return
+            time.sleep(pollInterval)
+            idleTime += pollInterval
+
+def followMessageLog(filename, pollInterval=1.0, idleTimeout=None):
+    """
+    Yields (time, type, raw_value) for every MessageLog entry of a Loop
+    Report (or other markdown log) that is still being written, reading only
+    the new lines; a message is yielded once the next line arrives.
+    idleTimeout None => follow forever, otherwise stop after that many
+    seconds without new lines
+    """
+    lines = _followLines(filename, pollInterval, idleTimeout)
+    for heading, text in _iter_report_sections(lines):
+        if heading == 'MessageLog':
+            command = _command_dict(text)
+            yield command['time'], command['type'], command['raw_value']
@@ -0,0 +1,107 @@
+# file: summaryAnalysis - summary-only analysis of a Loop Report
+#   computes just the values of the csv row (SummaryRecord) straight from the
+#   decoded message columns: no df, podState or actionFrame DataFrames are
+#   built and nothing is printed, used by the batch runners
+import hashlib
+
+from analyzeMessageLogsRev3 import *
+from reportCache import hashReport
+
+def getInitCount(pod_progress, message_type):
+    # len(getInitIdx(podState)) from the columns: the rows up to the last
+    #   pod_progress < 8 row plus the rows up to the next '1d'
+    podInitIdx = np.flatnonzero(pod_progress < 8)
+    lastIdx = podInitIdx[-1]
+    nextStatus = np.flatnonzero(message_type[lastIdx:] == '1d')[0]
+    return len(podInitIdx) + int(nextStatus)
+
+def summarizeLoopReport(thisPath, thisFile, recorder=NULL_RECORDER, cache=None,
+                        withDetails=False, data=None):
+    """
+    Purpose: the csv row values of analyzeLoopReport, without the report
+
+    Input:
+        thisPath, thisFile    as for analyzeMessageLogsRev3
+        recorder              StageRecorder (optional)
+        cache                 ReportCache (optional)
+        withDetails           True => return a ReportResult instead
+        data                  contents of the report if already read (bytes),
+                              e.g., by asyncPipeline, None => read thisFile
+
+    Output:
+        SummaryRecord (formatCsvRow(record) is the csv row of analyzeLoopReport)
+        or, withDetails True, ReportResult (SummaryRecord plus action
+        instances and fault details, see resultsDatabase)
+
+    Method:
+        read_file, then getPodStateColumns on the raw_value column,
+        matchActionColumns and processActionFrame on the column tables
+        and getSummaryRecord
+    """
+    # This is time (sec) radio on Pod stays awake once comm is initiated
+    radio_on_time = 30
+
+    filename = thisPath + '/' + thisFile
+    recorder.startReport(thisFile)
+
+    with recorder.stage('read_file') as record:
+        if data is not None:
+            commands, podDict = cache.read_bytes(data) if cache else read_bytes(data)
+        elif cache:
+            commands, podDict = cache.read_file(filename)
+        else:
+            commands, podDict = read_file(filename)
+        record['rows'] = len(commands)
+
+    # add quick and dirty fix for new Issue Reports (Aug 2019)
+    tempRaw = commands[-1]['raw_value']
+    lastRaw = tempRaw.replace('\nstatus:','')
+    commands[-1]['raw_value'] = lastRaw
+
+    with recorder.stage('getPodState') as record:
+        times = [x['time'] for x in commands]
+        timeNs = parseLogTimes(times)
+        if timeNs is None:
+            # some other time format, let pandas work it out
+            timeIndex = pd.to_datetime(times)
+            timeNs = timeIndex.asi8
+            last_command = timeIndex[-1]
+        else:
+            last_command = pd.Timestamp(int(timeNs[-1]), tz='UTC')
+        time_delta = getTimeDelta(timeNs)
+        rawValues = np.array([x['raw_value'] for x in commands], dtype=object)
+        stateTable, isEmpty, faultProcessedMsg = getPodStateColumns(
+            rawValues, time_delta, getTimeAsleep(time_delta, radio_on_time))
+        record['rows'] = len(rawValues)
+
+    message_type = stateTable['message_type']
+    with recorder.stage('checkAction') as record:
+        actionTable = matchActionColumns(message_type, stateTable['timeCumSec'],
+                                         stateTable['SchBasal'])
+        numberOfInitCmds = getInitCount(stateTable['pod_progress'], message_type)
+        record['rows'] = len(actionTable['actionId'])
+
+    with recorder.stage('processActionFrame') as record:
+        actionSummary, totalCompletedMessages = processActionFrame(actionTable, stateTable)
+        record['rows'] = len(actionSummary)
+
+    # number of messages by type, in the order of df.groupby(['type']).size()
+    typeNames, typeCounts = np.unique([x['type'] for x in commands], return_counts=True)
+    reportStats = {
+        'last_command': last_command,
+        'send_receive_commands': typeCounts,
+        'number_of_messages': len(commands),
+        'msgLogHrs': stateTable['timeCumSec'][-1]/3600,
+        'radioOnHrs': stateTable['radioOnCumSec'][-1]/3600,
+        'numberOfAssignID': int(np.count_nonzero(message_type == '0x7')),
+        'numberOfSetUpPod': int(np.count_nonzero(message_type == '0x3')),
+        'numberOfNonceResync': int(np.count_nonzero(message_type == '06')),
+        'insulinPulses': int(stateTable['insulinPulses'][-1]),
+        'faultProcessedMsg': faultProcessedMsg}
+    summaryRecord = getSummaryRecord(thisFile, podDict, reportStats, actionSummary,
+                                     totalCompletedMessages, numberOfInitCmds)
+    if not withDetails:
+        return summaryRecord
+    reportHash = hashReport(filename) if data is None else hashlib.sha256(data).hexdigest()
+    return ReportResult(reportHash, podDict, summaryRecord, actionTable,
+                        faultProcessedMsg)
@@ -0,0 +1,68 @@
+# file: test_asyncPipeline - results are written in item order, errors stay with their item,
+#   the number of items held stays within the bound of runPipeline
+import random
+import threading
+import time
+
+import pytest
+
+from asyncPipeline import runPipeline
+
+def _collect(numItems, readItem, processItem=lambda item, data: (item, data), **kwargs):
+    written = []
+    runPipeline(list(range(numItems)), readItem, processItem,
+                lambda index, item, result: written.append((index, item, result)), **kwargs)
+    return written
+
+def test_results_are_written_in_item_order():
+    rng = random.Random(0)
+    delays = [rng.uniform(0, 0.01) for _ in range(30)]
+    delays[0] = 0.05        # first read is the slowest
+    def readItem(item):
+        time.sleep(delays[item])
+        return item * 10
+    written = _collect(30, readItem, readConcurrency=6, queueSize=4, numProcessors=3)
+    assert written == [(ii, ii, (ii, ii * 10)) for ii in range(30)]
+
+def test_error_stays_with_its_item():
+    def readItem(item):
+        if item == 3:
+            raise OSError('read failed')
+        return item
+    def processItem(item, data):
+        if item == 5:
+            raise ValueError('process failed')
+        return data + 100
+    onError = lambda item, errorString: 'error ' + errorString.strip().splitlines()[-1]
+    written = _collect(10, readItem, processItem, readConcurrency=3, numProcessors=2,
+                       onError=onError)
+    assert [x[0] for x in written] == list(range(10))
+    results = [x[2] for x in written]
+    assert results[3] == 'error OSError: read failed'
+    assert results[5] == 'error ValueError: process failed'
+    assert [x for ii, x in enumerate(results) if ii not in (3, 5)] == \
+        [ii + 100 for ii in range(10) if ii not in (3, 5)]
+
+    # no onError => the pipeline raises
+    with pytest.raises(RuntimeError, match='read failed'):
+        _collect(10, readItem, processItem)
+
+@pytest.mark.parametrize('readConcurrency, queueSize, numProcessors', [(2, 3, 2), (4, 1, 1)])
+def test_items_held_stay_within_the_bound(readConcurrency, queueSize, numProcessors):
+    # fast reads, slow processing: the reads run ahead until the queue is full
+    lock = threading.Lock()
+    held = [0, 0]           # now, most
+    def readItem(item):
+        with lock:
+            held[0] += 1
+            held[1] = max(held)
+        return item
+    def processItem(item, data):
+        time.sleep(0.005)
+        with lock:
+            held[0] -= 1
+        return data
+    written = _collect(40, readItem, processItem, readConcurrency=readConcurrency,
+                       queueSize=queueSize, numProcessors=numProcessors)
+    assert [x[2] for x in written] == list(range(40))
+    assert numProcessors < held[1] <= readConcurrency + queueSize + numProcessors
@@ -0,0 +1,52 @@
+# file: test_batchAnalysis - the batch csv is byte-identical to running the reports one at a time
+import contextlib
+import io
+import os
+
+import pytest
+
+import loopReportGenerator
+from analyzeMessageLogsRev3 import analyzeMessageLogsRev3
+from batchAnalysis import analyzeBatch
+
+@pytest.fixture(scope='module')
+def reportFolder(tmp_path_factory):
+    # a few people, one report that raises (no MessageLog)
+    thisPath = str(tmp_path_factory.mktemp('reports'))
+    fileList = []
+    for ii, kwargs in enumerate([dict(), dict(fault=0x14), dict(emptyRate=0.05), dict(),
+                                 dict(fault=0x34, nonceResyncRate=0.2), dict()]):
+        thisFile = 'Person{:d}/Loop_Report_{:d}.md'.format(ii % 3, ii)
+        os.makedirs(os.path.join(thisPath, os.path.dirname(thisFile)), exist_ok=True)
+        loopReportGenerator.writeReport(os.path.join(thisPath, thisFile), podHours=6 + ii,
+                                        seed=ii, **kwargs)
+        fileList.append(thisFile)
+    with open(os.path.join(thisPath, 'Person0', 'Loop_Report_bad.md'), 'wt') as stream_out:
+        stream_out.write('## Loop Report\n')
+    fileList.insert(2, 'Person0/Loop_Report_bad.md')
+
+    # the serial run of runAll433_Rev3 (numWorkers = 0)
+    serialFile = os.path.join(thisPath, 'serial.csv')
+    with contextlib.redirect_stdout(io.StringIO()):
+        for thisFile in fileList:
+            try:
+                analyzeMessageLogsRev3(thisPath, thisFile, serialFile)
+            except Exception:
+                continue
+    with open(serialFile, 'rb') as stream_in:
+        return thisPath, fileList, stream_in.read()
+
+@pytest.mark.parametrize('numWorkers, readConcurrency', [
+    (1, None), (2, None), (3, None), (1, 2), (2, 2), (3, 1)])
+def test_batch_csv_matches_serial(reportFolder, tmp_path, numWorkers, readConcurrency):
+    thisPath, fileList, serialBytes = reportFolder
+    outFile = str(tmp_path / 'batch.csv')
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        csvRows, errorList = analyzeBatch(thisPath, fileList, outFile, numWorkers=numWorkers,
+                                          progressEvery=0, readConcurrency=readConcurrency)
+    assert [x[0] for x in errorList] == ['Person0/Loop_Report_bad.md']
+    assert csvRows[2] is None and all(x for ii, x in enumerate(csvRows) if ii != 2)
+    with open(outFile, 'rb') as stream_in:
+        assert stream_in.read() == serialBytes
+    # header plus a row for every report but the bad one
+    assert serialBytes.count(b'\n') == len(fileList)
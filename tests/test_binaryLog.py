@@ -0,0 +1,67 @@
+# file: test_binaryLog - a report read back from its .lrb gives what read_file gives
+import os
+
+import pandas as pd
+import pytest
+
+import loopReportGenerator
+from binaryLog import BinaryLog, convertReport, writeBinaryLog
+from messageLogs_functions import read_file, generate_table
+from messagePatternParsing import processMsg
+from podStateAnalysis import getPodState
+
+def _fixed(commands):
+    # the commands as analyzeLoopReport sees them (last message without the status tail)
+    commands = [dict(x) for x in commands]
+    commands[-1]['raw_value'] = commands[-1]['raw_value'].replace('\nstatus:', '')
+    return commands
+
+def _compare(log, commands, podDict):
+    assert log.commands() == commands
+    assert log.podDict == podDict
+    df = generate_table(_fixed(commands), 30)
+    pd.testing.assert_frame_equal(log.getTable(), df, check_exact=True)
+    podState, emptyMessageList, faultProcessedMsg = getPodState(df)
+    logState, logEmptyList, logFault = log.getPodState()
+    pd.testing.assert_frame_equal(logState, podState, check_exact=True)
+    assert logEmptyList == emptyMessageList
+    assert logFault == faultProcessedMsg
+    for record, command in zip(log.getRecords(), _fixed(commands)):
+        if command['raw_value']:
+            assert record.to_dict() == processMsg(command['raw_value'])
+        else:
+            assert record is None
+
+def _checkLog(binFile, commands, podDict):
+    # the views of the memory map are dropped when _compare returns
+    with BinaryLog(binFile) as log:
+        _compare(log, commands, podDict)
+
+@pytest.mark.parametrize('kwargs', [
+    dict(seed=1),
+    dict(seed=2, fault=0x14, emptyRate=0.05),
+])
+def test_convert_report_round_trip(tmp_path, kwargs):
+    mdFile = os.path.join(str(tmp_path), 'Loop Report.md')
+    loopReportGenerator.writeReport(mdFile, podHours=12, **kwargs)
+    binFile = convertReport(mdFile)
+    assert binFile == os.path.join(str(tmp_path), 'Loop Report.lrb')
+    commands, podDict = read_file(mdFile)
+    _checkLog(binFile, commands, podDict)
+
+def test_text_messages_and_other_time_format(tmp_path):
+    mdFile = os.path.join(str(tmp_path), 'Loop Report.md')
+    loopReportGenerator.writeReport(mdFile, podHours=4, seed=3)
+    commands, podDict = read_file(mdFile)
+    # the status tail of a new Issue Report is kept as text
+    commands[-1]['raw_value'] += '\nstatus:'
+    binFile = os.path.join(str(tmp_path), 'tail.lrb')
+    writeBinaryLog(binFile, commands, podDict)
+    _checkLog(binFile, commands, podDict)
+
+    # times not in the MessageLog format are kept as they were
+    for command in commands:
+        command['time'] = pd.Timestamp(command['time']).strftime('%Y-%m-%dT%H:%M:%SZ')
+    binFile = os.path.join(str(tmp_path), 'times.lrb')
+    writeBinaryLog(binFile, commands, podDict)
+    _checkLog(binFile, commands, podDict)
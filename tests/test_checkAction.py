@@ -0,0 +1,75 @@
+# file: test_checkAction - the token scan of matchActionColumns keeps the original matching rules
+import os
+import random
+
+import numpy as np
+import pytest
+
+import loopReportGenerator
+from checkAction import matchActionColumns
+from messageLogs_functions import read_file, generate_table
+from podStateAnalysis import getPodState
+from podUtils import getActionDict
+
+def _referenceActions(message_type, timeCumSec, schBasal):
+    # the rules of the original checkAction, one prime message at a time:
+    #   actions are searched in actionDict order, a prime message not claimed by
+    #   an earlier action is complete if the rows around it (claimed or not)
+    #   follow the pattern, the rows of completed instances are claimed once
+    #   the whole action has been searched
+    numRows = len(message_type)
+    claimed = np.zeros(numRows, dtype=bool)
+    rows = []
+    for actionId, (primeOffset, matchList) in enumerate(getActionDict().values()):
+        good, bad = [], []
+        for primeIdx in range(numRows):
+            if claimed[primeIdx] or message_type[primeIdx] != matchList[primeOffset]:
+                continue
+            firstIdx = primeIdx - primeOffset
+            lastIdx = firstIdx + len(matchList) - 1
+            isGood = firstIdx >= 0 and lastIdx < numRows and \
+                all(message_type[firstIdx + ii] == x for ii, x in enumerate(matchList))
+            (good if isGood else bad).append(primeIdx)
+        for primeIdx in good:
+            firstIdx = primeIdx - primeOffset
+            lastIdx = firstIdx + len(matchList) - 1
+            claimed[firstIdx:lastIdx + 1] = True
+            rows.append((actionId, firstIdx, timeCumSec[firstIdx],
+                         timeCumSec[lastIdx] - timeCumSec[firstIdx], schBasal[firstIdx], True))
+        rows += [(actionId, x, np.nan, np.nan, schBasal[x], False) for x in bad]
+    return rows
+
+def _matchedActions(message_type, timeCumSec, schBasal):
+    actionTable = matchActionColumns(np.asarray(message_type, dtype=object),
+                                     np.asarray(timeCumSec, dtype=float),
+                                     np.asarray(schBasal, dtype=bool))
+    names = ('actionId', 'startIdx', 'cumStartSec', 'responseTime', 'SchBasalState', 'completed')
+    return list(zip(*[actionTable[x].tolist() for x in names]))
+
+def _assertSameActions(message_type, timeCumSec, schBasal):
+    expected = _referenceActions(message_type, timeCumSec, schBasal)
+    actual = _matchedActions(message_type, timeCumSec, schBasal)
+    np.testing.assert_array_equal(np.array(actual, dtype=float), np.array(expected, dtype=float))
+
+@pytest.mark.parametrize('kwargs', [
+    dict(seed=1),
+    dict(seed=2, fault=0x14, nonceResyncRate=0.2),
+    dict(seed=3, tbRate=0.2, bolusRate=0.3, emptyRate=0.05),
+])
+def test_report_actions_match_reference(tmp_path, kwargs):
+    filename = os.path.join(str(tmp_path), 'Loop_Report.md')
+    loopReportGenerator.writeReport(filename, podHours=24, **kwargs)
+    commands, podDict = read_file(filename)
+    podState = getPodState(generate_table(commands, 30))[0]
+    _assertSameActions(podState['message_type'].tolist(), podState['timeCumSec'].tolist(),
+                       podState['SchBasal'].tolist())
+
+def test_shuffled_messages_match_reference():
+    # overlapping and broken patterns, at the ends of the log too
+    rng = random.Random(5)
+    names = sorted({x for values in getActionDict().values() for x in values[1]}) + ['06', '0x7']
+    for numRows in (1, 2, 5, 40, 400):
+        message_type = [rng.choice(names + ['1d'] * 4) for _ in range(numRows)]
+        timeCumSec = np.cumsum([rng.randint(1, 300) for _ in range(numRows)])
+        schBasal = [rng.random() < 0.5 for _ in range(numRows)]
+        _assertSameActions(message_type, timeCumSec, schBasal)
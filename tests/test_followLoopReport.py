@@ -0,0 +1,43 @@
+# file: test_followLoopReport - each copy of a WIP report gives the full analysis results
+import contextlib
+import io
+import os
+
+import loopReportGenerator
+from analyzeMessageLogsRev3 import analyzeLoopReport
+from followLoopReport import followLoopReport
+
+def _run(function, *args):
+    # result and printout of function, without followLoopReport's 'Continuing' line
+    with contextlib.redirect_stdout(io.StringIO()) as printout:
+        result = function(*args)
+    text = printout.getvalue()
+    isContinued = text.startswith('  Continuing')
+    if isContinued:
+        text = text.split('\n', 1)[1]
+    return result, text, isContinued
+
+def test_follow_matches_full_analysis(tmp_path):
+    thisPath = str(tmp_path)
+    checkpointDir = os.path.join(thisPath, 'checkpoints')
+    thisFile = 'Loop_Report_WIP.md'
+    outFile = os.path.join(thisPath, 'out.csv')
+    msgList = loopReportGenerator.generateMessages(podHours=20, seed=4, nonceResyncRate=0.2,
+                                                   emptyRate=0.02)
+    # copies of the report as the pod runs, the last one ends with a fault
+    faultList = loopReportGenerator.generateMessages(podHours=20, seed=4, nonceResyncRate=0.2,
+                                                     emptyRate=0.02, fault=0x14)
+    numContinued = 0
+    for numMessages in (60, 61, 150, 151, 400, len(msgList), len(faultList)):
+        thisList = faultList if numMessages == len(faultList) else msgList
+        with open(os.path.join(thisPath, thisFile), 'w', encoding='UTF8') as stream_out:
+            stream_out.write(loopReportGenerator.formatReport(thisList[:numMessages]))
+        followResult, followText, isContinued = _run(followLoopReport, thisPath, thisFile,
+                                                     outFile, checkpointDir)
+        fullResult, fullText, _ = _run(analyzeLoopReport, thisPath, thisFile, outFile)
+        assert followResult[3] == fullResult[4]
+        assert followText == fullText
+        assert followResult[1]['startIdx'].tolist() == fullResult[2]['startIdx'].tolist()
+        numContinued += isContinued
+    # every copy after the first one continued from the checkpoint
+    assert numContinued == 6
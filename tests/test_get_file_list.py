@@ -0,0 +1,40 @@
+# file: test_get_file_list - only the Loop Reports are listed, symlinked folders are skipped
+import os
+
+import loopReportGenerator
+from binaryLog import convertReport
+from get_file_list import get_report_list, get_file_list
+
+def _writeFleet(thisPath):
+    os.makedirs(os.path.join(thisPath, 'Joe'))
+    mdFile = os.path.join(thisPath, 'Joe', 'Loop Report.md')
+    loopReportGenerator.writeReport(mdFile, podHours=2, seed=0)
+    return mdFile
+
+def test_sibling_binary_log_is_not_listed(tmp_path):
+    thisPath = str(tmp_path)
+    mdFile = _writeFleet(thisPath)
+    binFile = convertReport(mdFile)
+    assert os.path.exists(binFile)
+    with open(os.path.join(thisPath, 'Joe', 'output.csv'), 'wt') as stream_out:
+        stream_out.write('a,b\n')
+    assert [x.filename for x in get_report_list(thisPath)] == ['Joe/Loop Report.md']
+    assert [x[0] for x in get_file_list(thisPath)] == ['Joe/Loop Report.md']
+    # every file when asked for
+    assert len(get_report_list(thisPath, include=('*',))) == 3
+
+def test_symlinked_folder_is_skipped(tmp_path):
+    thisPath = str(tmp_path)
+    _writeFleet(thisPath)
+    os.symlink(os.path.join(thisPath, 'Joe'), os.path.join(thisPath, 'JoeLink'))
+    # a link back to the top would loop forever if followed
+    os.symlink(thisPath, os.path.join(thisPath, 'Joe', 'top'))
+    assert [x.filename for x in get_report_list(thisPath)] == ['Joe/Loop Report.md']
+
+def test_snapshot_gives_the_same_list(tmp_path):
+    thisPath = str(tmp_path / 'reports')
+    _writeFleet(thisPath)
+    snapshotFile = str(tmp_path / 'snapshot.json')
+    first = get_report_list(thisPath, snapshotFile=snapshotFile)
+    assert os.path.exists(snapshotFile)
+    assert get_report_list(thisPath, snapshotFile=snapshotFile) == first
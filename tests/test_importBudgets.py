@@ -0,0 +1,13 @@
+# file: test_importBudgets - the command line entry points import within their budgets
+import pytest
+
+from benchmarkAnalysis import importBudgets, measureImport
+
+@pytest.mark.parametrize('name', sorted(importBudgets))
+def test_import_budget(name):
+    statement, budget, forbiddenModules = importBudgets[name]
+    measured = measureImport(statement, repeat=3)
+    forbidden = [x for x in forbiddenModules if x in measured['modules']]
+    assert not forbidden, '{:s} imports {:s}'.format(name, ', '.join(forbidden))
+    assert measured['seconds'] <= budget, '{:s} takes {:.3f}s, slowest: {!r}'.format(
+        name, measured['seconds'], measured['slowest'])
@@ -0,0 +1,38 @@
+# file: test_messageLake - exporting a changed report replaces its lake files
+import os
+import shutil
+
+import pytest
+
+pytest.importorskip('pyarrow')
+
+import loopReportGenerator
+from messageLake import writeLakeReport, loadLake
+
+def test_changed_report_replaces_its_files(tmp_path):
+    thisPath = str(tmp_path / 'reports')
+    lakeDir = str(tmp_path / 'lake')
+    os.makedirs(thisPath)
+    thisFile = 'Loop_Report_000.md'
+    copyFile = 'Loop_Report_001.md'
+    loopReportGenerator.writeReport(os.path.join(thisPath, thisFile), podHours=6, seed=1)
+    shutil.copy(os.path.join(thisPath, thisFile), os.path.join(thisPath, copyFile))
+    oldHash = writeLakeReport(lakeDir, thisPath, thisFile)
+    assert writeLakeReport(lakeDir, thisPath, copyFile) == oldHash
+
+    # a changed report, exported twice
+    numMessages = loopReportGenerator.writeReport(os.path.join(thisPath, thisFile),
+                                                  podHours=8, seed=2)
+    newHash = writeLakeReport(lakeDir, thisPath, thisFile)
+    assert writeLakeReport(lakeDir, thisPath, thisFile) == newHash
+
+    counts = loadLake(lakeDir, columns=['reportHash'])['reportHash'].astype(str).value_counts()
+    assert counts[newHash] == numMessages
+    # the copy still has the old contents, its rows stay
+    assert counts[oldHash] > 0 and len(counts) == 2
+
+    # once the copy changes too, nothing of the old contents is left
+    shutil.copy(os.path.join(thisPath, thisFile), os.path.join(thisPath, copyFile))
+    writeLakeReport(lakeDir, thisPath, copyFile)
+    counts = loadLake(lakeDir, columns=['reportHash'])['reportHash'].astype(str).value_counts()
+    assert list(counts.index) == [newHash] and counts[newHash] == numMessages
@@ -0,0 +1,107 @@
+# file: test_messageLogs_functions - the streaming reader gives what the markdown parser gives,
+#   generate_table gives what the row by row version gave
+import io
+import os
+
+import pandas as pd
+import pytest
+
+import loopReportGenerator
+from messageLogs_functions import read_file, _parse_filehandle, _iter_report_sections, \
+    generate_table, parseLogTimes, select_extra_command
+
+POD_STATE = '### PodState\n* lot: 1\n'
+
+# structures where a line-by-line reader can go wrong
+SNIPPETS = {
+    'nested': POD_STATE + '    * x: 1\n* tid: 2\n',
+    'nested3': POD_STATE + '    * x: 1\n        * y: 2\n    more\n* tid: 2\n',
+    'nestedOrdered': POD_STATE + '    2. x: 1\n* tid: 2\n',
+    'nestedLoose': POD_STATE + '\n    * x: 1\n* tid: 2\n',
+    'lazy': POD_STATE + 'lazy line\n  indented\n* tid: 2\n',
+    'paragraph': POD_STATE + '\npara\n* tid: 2\n',
+    'code': POD_STATE + '\npara\n\n    * x: 1\n* tid: 2\n',
+    'setext': POD_STATE + '* tid: 2\nFoo\n---\n### MessageLog\n* m\n',
+    'setextItem': POD_STATE + '\n* tid: 2\n---\nline1\nline2\n---\n* x: 4\n',
+    'setextH1': POD_STATE + '\nSome Title\n===\n* tid: 2\n',
+    'setextPodState': 'Intro\n\nPodState\n---\n* tid: 1\n',
+    'setextRule': POD_STATE + '---\n===\n* tid: 2\n',
+    'rule': POD_STATE + '---\n* tid: 2\n',
+    'ruleStars': POD_STATE + '* * *\n* tid: 2\n',
+    'ruleSpaced': POD_STATE + '\nTitle\n - - -\n* tid: 2\n',
+    'ruleAfterItem': POD_STATE + '* tid: 2\n---\n* x: 4\n',
+    'headingRule': '## Other\n---\n### PodState\n* tid: 1\n',
+    'fixme': POD_STATE + '* tid: 2 ## MessageLog\n* m\n',
+    'fixmeBare': POD_STATE + '* tid: 2 ##\n* m\n',
+    'nestedHeadings': POD_STATE + '# Big\n* tid: 2\n#### Sub\n* x: 3\n',
+    'codeInItem': POD_STATE + '* d\n\n        deep\n* x: 2\n',
+    'codeInItemBlank': POD_STATE + '* d\n\n        deep\n\n        more\n    para\n* x: 2\n',
+    'codeInNestedItem': POD_STATE + '    * e\n\n            deep\n        para\n* x: 2\n',
+    'codeInItemFixme': '  * d\n\n        deep\n* x ## MessageLog',
+}
+
+def _markdownSections(text):
+    return {heading: texts for heading, texts in
+            _parse_filehandle(io.StringIO(text)).items() if texts}
+
+def _streamSections(text):
+    sections = {}
+    for heading, value in _iter_report_sections(io.StringIO(text)):
+        sections.setdefault(heading, []).append(value)
+    return sections
+
+@pytest.mark.parametrize('name', sorted(SNIPPETS))
+def test_sections_match_markdown(name):
+    text = SNIPPETS[name]
+    assert _streamSections(text) == _markdownSections(text)
+
+def test_heading_inside_item():
+    # '* x' lands inside the item above it, so the split off '## MessageLog'
+    #   is an h2 inside that item: markdown counts what follows it in both
+    #   sections, the streaming reader only in the PodState section
+    text = '### PodState\n* d\n\n    para\n* x ## MessageLog\n* m\n'
+    podState = ['d', 'para\n* x', 'MessageLog', 'm']
+    assert _markdownSections(text) == {'PodState': podState, 'MessageLog': ['m']}
+    assert _streamSections(text) == {'PodState': podState}
+
+@pytest.mark.parametrize('kwargs', [
+    dict(podHours=8, seed=1),
+    dict(podHours=8, seed=2, fault=0x14),
+    dict(podHours=8, seed=3, emptyRate=0.1),
+])
+def test_read_file_matches_markdown(tmp_path, kwargs):
+    filename = os.path.join(str(tmp_path), 'Loop_Report.md')
+    loopReportGenerator.writeReport(filename, **kwargs)
+    commands, podDict = read_file(filename)
+    assert len(commands) > 100
+    assert (commands, podDict) == read_file(filename, useMarkdown=True)
+
+def _rowTable(commands, radio_on_time):
+    # generate_table before it was vectorized
+    df = pd.DataFrame(commands)
+    df['time'] = pd.to_datetime(df['time'])
+    df['command'] = df['raw_value'].str[:2].astype(str) + \
+        df['raw_value'].apply(select_extra_command).fillna('').astype(str)
+    df['time_delta'] = (df['time']-df['time'].shift()).dt.seconds.fillna(0).astype(float)
+    df['time_asleep'] = df['time_delta'].loc[df['time_delta'] > radio_on_time] - radio_on_time
+    return df
+
+@pytest.mark.parametrize('timeFormat', [None, '%Y-%m-%dT%H:%M:%SZ', '%d %b %Y %H:%M:%S +0000'])
+def test_generate_table_matches_rows(tmp_path, timeFormat):
+    filename = os.path.join(str(tmp_path), 'Loop_Report.md')
+    loopReportGenerator.writeReport(filename, podHours=12, seed=4, emptyRate=0.02)
+    commands = read_file(filename)[0]
+    # a gap of more than a day, .dt.seconds keeps only the seconds part
+    for command in commands[-20:]:
+        thisTime = pd.Timestamp(command['time']) + pd.Timedelta(days=1, seconds=7)
+        command['time'] = thisTime.strftime('%Y-%m-%d %H:%M:%S +0000')
+    if timeFormat:
+        # not the MessageLog format, generate_table falls back to pd.to_datetime
+        for command in commands:
+            command['time'] = pd.Timestamp(command['time']).strftime(timeFormat)
+        assert parseLogTimes([x['time'] for x in commands]) is None
+    else:
+        assert parseLogTimes([x['time'] for x in commands]) is not None
+    expected = _rowTable([dict(x) for x in commands], 30)
+    assert (expected['command'].str.startswith('1a')).any()
+    pd.testing.assert_frame_equal(generate_table(commands, 30), expected, check_exact=True)
@@ -0,0 +1,128 @@
+# file: test_messagePatternParsing - decode of the parsed types, short messages, the
+#   shared buffer decoders give what processMsg gives for every type
+import os
+
+import numpy as np
+import pytest
+
+import loopReportGenerator
+from messageLogs_functions import read_file, generate_table
+from messageFieldSpecs import msgFieldSpecs
+from messagePatternParsing import processMsg, processMsgRecord, ignoreMsg, decodeMessages, \
+    processMsgAt, processBufferRecords, processMsgRecords, chooseMsgType
+from messageBatchParsing import processMsgBatch, processMsgBuffer, getMsgDict
+from podStateAnalysis import getPodState, getPodStateLoop
+
+# types processMsg ignored before they had a parser
+DECODED = [
+    ('03131f00000e14040c15130a1e0000aa5c00088ce9',
+     {'mtype': 3, 'message_type': '0x3', 'mlen': 19, 'pod_address': '0x1f00000e',
+      'packet_timeout': 4, 'month': 12, 'day': 21, 'year': 19, 'hour': 10, 'minute': 30,
+      'lot': 43612, 'tid': 560361}),
+    ('07041f00000e',
+     {'mtype': 7, 'message_type': '0x7', 'mlen': 4, 'pod_address': '0x1f00000e'}),
+    ('11041234567802',
+     {'mtype': 17, 'message_type': '0x11', 'mlen': 4, 'nonce': 0x12345678,
+      'alerts_bit_mask': 2}),
+    ('190a123456784c0000640102',
+     {'mtype': 25, 'message_type': '0x19', 'mlen': 10, 'nonce': 0x12345678, 'num_alerts': 1,
+      'alert_config': '0x4c0000640102'}),
+    ('1c0412345678',
+     {'mtype': 28, 'message_type': '0x1c', 'mlen': 4, 'nonce': 0x12345678}),
+    ('1e00', {'mtype': 30, 'message_type': '0x1e', 'mlen': 0}),
+]
+
+# too short for their parser => the ignoreMsg msgDict, as before the parsers
+SHORT = ['03', '0313', '03131f00000e14040c15130a1e0000aa5c00088c', '0704', '07041f0000',
+         '110412345678', '19', '190a12345678', '1c041234', '1e']
+
+def _checkBatch(msgList):
+    # every row of the column tables gives processMsg, hex and buffer versions
+    tables = processMsgBatch(msgList)
+    buffer, offsets, lengths = decodeMessages(msgList)
+    bufferTables = processMsgBuffer(np.frombuffer(buffer, dtype=np.uint8), offsets, lengths)
+    assert list(tables) == list(bufferTables)
+    for message_type, table in tables.items():
+        for row, idx in enumerate(table['msg_idx'].tolist()):
+            msgDict = processMsg(msgList[idx])
+            assert getMsgDict(table, row) == msgDict
+            del msgDict['raw_value']
+            assert getMsgDict(bufferTables[message_type], row) == msgDict
+
+@pytest.mark.parametrize('msg, expected', DECODED)
+def test_decode(msg, expected):
+    msgDict = processMsg(msg)
+    assert msgDict == dict(expected, raw_value=msg)
+    assert processMsgRecord(msg).to_dict() == msgDict
+
+@pytest.mark.parametrize('msg', SHORT)
+def test_short_message_is_ignored(msg):
+    assert processMsg(msg) == ignoreMsg(msg)
+    assert processMsgRecord(msg).to_dict() == ignoreMsg(msg)
+
+def test_batch_with_short_messages():
+    msgList = [x[0] for x in DECODED] + SHORT
+    _checkBatch(msgList)
+    assert processMsgBatch(msgList)['0x3']['parsed'].tolist() == [True, False, False, False]
+
+@pytest.mark.parametrize('msg', ['1d00', '1d180a', '0202', '1f', '0e', '06'])
+def test_short_message_of_a_parsed_type_raises(msg):
+    with pytest.raises(ValueError):
+        processMsg(msg)
+    with pytest.raises(ValueError):
+        processMsgRecord(msg)
+    with pytest.raises(ValueError):
+        processMsgBatch([msg])
+
+@pytest.mark.parametrize('msg', ['1a', '1a0e12345678', '1a0e1234567801002a0500000016'])
+def test_short_1a_is_1a13(msg):
+    # no sub-type byte (16) => parse_1a13, which needs more bytes
+    with pytest.raises(ValueError, match='1a13'):
+        processMsg(msg)
+    with pytest.raises(ValueError, match='1a13'):
+        processMsgBatch([msg])
+
+def test_truncated_message_does_not_stop_the_report(tmp_path):
+    filename = os.path.join(str(tmp_path), 'Loop_Report.md')
+    loopReportGenerator.writeReport(filename, podHours=4, seed=0)
+    commands, podDict = read_file(filename)
+    df = generate_table(commands, 30)
+    setupIdx = df.index[df['raw_value'].str.startswith('03')][0]
+    df.loc[setupIdx, 'raw_value'] = df.loc[setupIdx, 'raw_value'][:10]
+    podState = getPodState(df)[0]
+    assert podState.loc[setupIdx, 'message_type'] == '0x3'
+    assert podState.equals(getPodStateLoop(df)[0])
+
+def _reportMessages(tmp_path):
+    # messages of every registered type: generated reports plus DECODED and SHORT
+    msgList = []
+    for seed, kwargs in enumerate([dict(fault=0x14, nonceResyncRate=0.2), dict(bolusRate=0.3)]):
+        filename = os.path.join(str(tmp_path), 'Loop_Report_{:d}.md'.format(seed))
+        loopReportGenerator.writeReport(filename, podHours=12, seed=seed, **kwargs)
+        msgList += [x['raw_value'] for x in read_file(filename)[0] if x['raw_value']]
+    return msgList + [x[0] for x in DECODED] + SHORT
+
+def test_shared_buffer_matches_processMsg(tmp_path):
+    msgList = _reportMessages(tmp_path)
+    expected = [processMsg(x) for x in msgList]
+    assert set(msgFieldSpecs) <= set(x['message_type'] for x in expected)
+
+    buffer, offsets, lengths = decodeMessages(msgList)
+    records = processBufferRecords(buffer, offsets, lengths)
+    payloadRecords = processBufferRecords(np.frombuffer(buffer, dtype=np.uint8), offsets,
+                                          lengths, msgList)
+    for ii, msgDict in enumerate(expected):
+        start, length = int(offsets[ii]), int(lengths[ii])
+        assert processMsgAt(buffer, start, length) == msgDict
+        assert processMsgAt(buffer, start, length, msgList[ii]) == msgDict
+        # raw_value made from the bytes
+        assert records[ii].to_dict() == msgDict
+        assert payloadRecords[ii].to_dict() == msgDict
+    assert [x.to_dict() for x in processMsgRecords(msgList)] == expected
+    _checkBatch(msgList)
+
+def test_chooseMsgType_dispatches_like_processMsg(tmp_path):
+    # the old dispatch table: chooseMsgType.get(mtype, ignoreMsg)(msg)
+    assert set(chooseMsgType) >= {0x02, 0x06, 0x0e, 0x1a, 0x1d, 0x1f}
+    for msg in _reportMessages(tmp_path) + ['0500']:
+        assert chooseMsgType.get(int(msg[:2], 16), ignoreMsg)(msg) == processMsg(msg)
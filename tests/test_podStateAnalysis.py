@@ -0,0 +1,76 @@
+# file: test_podStateAnalysis - the vectorized getPodState gives what getPodStateLoop gives,
+#   the compact schema gives the same report
+import contextlib
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import loopReportGenerator
+from messageLogs_functions import read_file, generate_table
+from podStateAnalysis import getPodState, getPodStateLoop, podStateCompactTypes
+from analyzeMessageLogsRev3 import analyzeLoopReport
+
+@pytest.mark.parametrize('kwargs', [
+    dict(seed=1),
+    dict(seed=2, fault=0x14, emptyRate=0.02),
+    dict(seed=3, fault=0x34, nonceResyncRate=0.1),
+    dict(seed=4, tbRate=0.2, bolusRate=0.3),
+])
+def test_getPodState_matches_loop(tmp_path, kwargs):
+    filename = os.path.join(str(tmp_path), 'Loop_Report.md')
+    loopReportGenerator.writeReport(filename, podHours=24, **kwargs)
+    commands, podDict = read_file(filename)
+    df = generate_table(commands, 30)
+
+    podState, emptyMessageList, faultProcessedMsg = getPodState(df)
+    loopState, loopEmptyList, loopFault = getPodStateLoop(df)
+    pd.testing.assert_frame_equal(podState, loopState, check_exact=True)
+    assert emptyMessageList == loopEmptyList
+    assert faultProcessedMsg == loopFault
+    if kwargs.get('emptyRate'):
+        assert emptyMessageList
+    if kwargs.get('fault'):
+        assert faultProcessedMsg
+
+def _same(a, b):
+    # equal, with nan equal to nan, through dicts and lists
+    if isinstance(a, dict):
+        return isinstance(b, dict) and a.keys() == b.keys() and all(_same(a[x], b[x]) for x in a)
+    if isinstance(a, (list, tuple)):
+        return len(a) == len(b) and all(_same(x, y) for x, y in zip(a, b))
+    if isinstance(a, float) and np.isnan(a):
+        return isinstance(b, float) and np.isnan(b)
+    return a == b
+
+@pytest.mark.parametrize('kwargs', [
+    dict(seed=1),
+    dict(seed=2, fault=0x14, emptyRate=0.02),
+])
+def test_compact_schema_gives_the_same_report(tmp_path, kwargs):
+    thisPath = str(tmp_path)
+    loopReportGenerator.writeReport(os.path.join(thisPath, 'Loop_Report.md'), podHours=24,
+                                    **kwargs)
+    results = []
+    for compact in (False, True):
+        printout = io.StringIO()
+        with contextlib.redirect_stdout(printout):
+            result = analyzeLoopReport(thisPath, 'Loop_Report.md', 'out.csv', compact=compact)
+        results.append(result + (printout.getvalue(),))
+    (df, podState, actionFrame, actionSummary, csvRow, printout), \
+        (compactDf, compactState, compactFrame, compactSummary, compactRow, compactPrintout) = results
+
+    assert compactRow == csvRow
+    assert _same(compactSummary, actionSummary)
+    assert compactPrintout == printout
+    pd.testing.assert_frame_equal(compactFrame, actionFrame, check_exact=True)
+
+    assert 'raw_value' not in compactState
+    for name, dtype in podStateCompactTypes.items():
+        assert compactState[name].dtype == (dtype if dtype == 'category' else np.dtype(dtype))
+    for name in compactState:
+        assert compactState[name].tolist() == podState[name].tolist(), name
+    assert (df.loc[compactState['df_idx'], 'raw_value'].to_numpy() ==
+            podState['raw_value'].to_numpy()).all()
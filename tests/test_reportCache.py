@@ -0,0 +1,45 @@
+# file: test_reportCache - cached reads match read_file, the folder stays under maxBytes
+import os
+
+import loopReportGenerator
+import reportCache
+from messageLogs_functions import read_file
+from reportCache import ReportCache
+
+def _writeReports(thisPath, numReports):
+    fileList = []
+    for seed in range(numReports):
+        filename = os.path.join(thisPath, 'Loop_Report_{:03d}.md'.format(seed))
+        loopReportGenerator.writeReport(filename, podHours=2, seed=seed)
+        fileList.append(filename)
+    return fileList
+
+def _folderBytes(cacheDir):
+    return sum(x.stat().st_size for x in os.scandir(cacheDir) if x.name.endswith('.npz'))
+
+def test_cached_read_matches_read_file(tmp_path):
+    filename = _writeReports(str(tmp_path), 1)[0]
+    cache = ReportCache(str(tmp_path / 'cache'))
+    assert cache.read_file(filename) == read_file(filename)
+    # second read comes from the entry
+    assert cache.read_file(filename) == read_file(filename)
+
+def test_store_lists_the_folder_only_when_needed(tmp_path, monkeypatch):
+    fileList = _writeReports(str(tmp_path), 12)
+    numEvict = []
+    evict = ReportCache.evict
+    monkeypatch.setattr(ReportCache, 'evict', lambda self: numEvict.append(1) or evict(self))
+
+    cache = ReportCache(str(tmp_path / 'cache'), maxBytes=1e9)
+    for filename in fileList:
+        cache.read_file(filename)
+    assert len(numEvict) == 1
+
+    # room for about 3 entries: the folder is trimmed, the newest entry stays
+    cacheDir = str(tmp_path / 'small')
+    cache = ReportCache(cacheDir, maxBytes=3.5 * _folderBytes(cache.cacheDir) / len(fileList))
+    for filename in fileList:
+        cache.read_file(filename)
+        assert _folderBytes(cacheDir) <= cache.maxBytes
+    assert os.path.isfile(cache._entryName(cache.getKey(fileList[-1])))
+    assert reportCache._folderBytes[cacheDir][0] == _folderBytes(cacheDir)
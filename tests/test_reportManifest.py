@@ -0,0 +1,58 @@
+# file: test_reportManifest - only rows of the current code and contents reach the csv
+import os
+
+import loopReportGenerator
+from analyzeMessageLogsRev3 import CSV_HEADER, formatCsvRow
+from reportManifest import ReportManifest
+from summaryAnalysis import summarizeLoopReport
+
+fileList = ['Loop_Report_000.md', 'Loop_Report_001.md']
+
+def _build(thisPath, manifestFile, failed=()):
+    # one incremental run, the reports in failed raise in their analysis
+    manifest = ReportManifest(manifestFile)
+    runList = manifest.getStale(thisPath, fileList)
+    csvRows = {}
+    for thisFile in runList:
+        if thisFile in failed:
+            continue
+        reportResult = summarizeLoopReport(thisPath, thisFile, withDetails=True)
+        manifest.update(thisFile, reportResult)
+        csvRows[thisFile] = formatCsvRow(reportResult.summaryRecord)
+    outFile = os.path.join(thisPath, 'out.csv')
+    manifest.writeCsv(outFile, fileList)
+    manifest.save()
+    with open(outFile) as stream_in:
+        return runList, csvRows, stream_in.read().splitlines()
+
+def test_unchanged_reports_are_not_run_again(tmp_path):
+    thisPath = str(tmp_path)
+    for seed, thisFile in enumerate(fileList):
+        loopReportGenerator.writeReport(os.path.join(thisPath, thisFile), podHours=4, seed=seed)
+    manifestFile = os.path.join(thisPath, 'manifest.json')
+    runList, csvRows, lines = _build(thisPath, manifestFile)
+    assert runList == fileList
+    assert lines == [CSV_HEADER] + [csvRows[x] for x in fileList]
+    runList, _, again = _build(thisPath, manifestFile)
+    assert runList == [] and again == lines
+
+def test_failed_rerun_drops_the_old_row(tmp_path, monkeypatch):
+    thisPath = str(tmp_path)
+    for seed, thisFile in enumerate(fileList):
+        loopReportGenerator.writeReport(os.path.join(thisPath, thisFile), podHours=4, seed=seed)
+    manifestFile = os.path.join(thisPath, 'manifest.json')
+    _, csvRows, _ = _build(thisPath, manifestFile)
+
+    # new code version, the first report fails => no row from the old code
+    monkeypatch.setattr('reportManifest.getCodeVersion', lambda: 'newVersion')
+    runList, newRows, lines = _build(thisPath, manifestFile, failed=fileList[:1])
+    assert runList == fileList
+    assert lines == [CSV_HEADER, newRows[fileList[1]]]
+
+    # edited report whose analysis fails => no row for its old contents
+    monkeypatch.undo()
+    _build(thisPath, manifestFile)
+    loopReportGenerator.writeReport(os.path.join(thisPath, fileList[1]), podHours=6, seed=5)
+    runList, _, lines = _build(thisPath, manifestFile, failed=fileList[1:])
+    assert runList == fileList[1:]
+    assert lines == [CSV_HEADER, csvRows[fileList[0]]]
@@ -0,0 +1,61 @@
+# file: test_resultsDatabase - one row per report file, a rerun replaces its rows
+import os
+import shutil
+
+import loopReportGenerator
+from analyzeMessageLogsRev3 import CSV_HEADER, formatCsvRow
+from resultsDatabase import ResultsDatabase
+from summaryAnalysis import summarizeLoopReport
+
+def _storeAll(resultsDb, thisPath, fileList):
+    reportResults = [summarizeLoopReport(thisPath, x, withDetails=True) for x in fileList]
+    resultsDb.storeReports(reportResults)
+    return [formatCsvRow(x.summaryRecord) for x in reportResults]
+
+def test_changed_report_replaces_its_rows(tmp_path):
+    thisPath = str(tmp_path)
+    fileList = ['Loop_Report_000.md', 'Loop_Report_001.md']
+    for seed, thisFile in enumerate(fileList):
+        loopReportGenerator.writeReport(os.path.join(thisPath, thisFile), podHours=6, seed=seed)
+    resultsDb = ResultsDatabase(os.path.join(thisPath, 'results.db'))
+    _storeAll(resultsDb, thisPath, fileList)
+    oldHash = resultsDb.connection.execute(
+        'SELECT reportHash FROM reports WHERE filename = ?', (fileList[0],)).fetchone()[0]
+
+    # same filename, new contents, then the whole folder again
+    loopReportGenerator.writeReport(os.path.join(thisPath, fileList[0]), podHours=8, seed=7)
+    _storeAll(resultsDb, thisPath, fileList[:1])
+    csvRows = _storeAll(resultsDb, thisPath, fileList)
+
+    outFile = os.path.join(thisPath, 'out.csv')
+    resultsDb.exportCsv(outFile)
+    with open(outFile) as stream_in:
+        assert stream_in.read() == '\n'.join([CSV_HEADER] + csvRows) + '\n'
+    for table in ('reports', 'actions', 'faults'):
+        assert resultsDb.connection.execute(
+            'SELECT COUNT(*) FROM {:s} WHERE reportHash = ?'.format(table),
+            (oldHash,)).fetchone()[0] == 0
+    resultsDb.close()
+
+def test_identical_reports_keep_their_own_rows(tmp_path):
+    thisPath = str(tmp_path)
+    fileList = ['Joe/Loop_Report_000.md', 'Ann/Loop_Report_000.md', 'Ann/Loop_Report_001.md']
+    for thisFile in fileList:
+        os.makedirs(os.path.join(thisPath, os.path.dirname(thisFile)), exist_ok=True)
+    loopReportGenerator.writeReport(os.path.join(thisPath, fileList[0]), podHours=6, seed=0)
+    shutil.copyfile(os.path.join(thisPath, fileList[0]), os.path.join(thisPath, fileList[1]))
+    loopReportGenerator.writeReport(os.path.join(thisPath, fileList[2]), podHours=6, seed=1)
+    resultsDb = ResultsDatabase(os.path.join(thisPath, 'results.db'))
+    csvRows = _storeAll(resultsDb, thisPath, fileList)
+    # again, the rows stay in place
+    _storeAll(resultsDb, thisPath, fileList)
+
+    # same csv as the batch runner writes for this file list
+    outFile = os.path.join(thisPath, 'out.csv')
+    resultsDb.exportCsv(outFile)
+    with open(outFile) as stream_in:
+        assert stream_in.read() == '\n'.join([CSV_HEADER] + csvRows) + '\n'
+    numActions = [resultsDb.connection.execute(
+        'SELECT COUNT(*) FROM actions WHERE filename = ?', (x,)).fetchone()[0] for x in fileList]
+    assert numActions[0] == numActions[1] > 0
+    resultsDb.close()
@@ -0,0 +1,100 @@
+# file: test_streamAnalysis - StreamAnalyzer gives what the batch analysis gives on the whole log
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import loopReportGenerator
+from checkAction import matchActionColumns, processActionFrame
+from messageLogs_functions import read_file, generate_table
+from podStateAnalysis import getPodState, podStateColumnNames
+from streamAnalysis import StreamAnalyzer, PodStateRow, streamLoopReport
+
+def _same(a, b):
+    # equal, with nan equal to nan, through dicts and lists
+    if isinstance(a, dict):
+        return isinstance(b, dict) and a.keys() == b.keys() and all(_same(a[x], b[x]) for x in a)
+    if isinstance(a, (list, tuple)):
+        return len(a) == len(b) and all(_same(x, y) for x, y in zip(a, b))
+    if isinstance(a, float) and np.isnan(a):
+        return isinstance(b, float) and np.isnan(b)
+    return a == b
+
+@pytest.mark.parametrize('kwargs', [
+    dict(seed=1),
+    dict(seed=2, fault=0x14, emptyRate=0.02),
+    dict(seed=3, nonceResyncRate=0.2, bolusRate=0.2),
+])
+def test_stream_matches_batch(tmp_path, kwargs):
+    filename = os.path.join(str(tmp_path), 'Loop_Report.md')
+    loopReportGenerator.writeReport(filename, podHours=24, **kwargs)
+    commands, podDict = read_file(filename)
+    podState, emptyMessageList, faultProcessedMsg = getPodState(generate_table(commands, 30))
+
+    analyzer = StreamAnalyzer()
+    rows, events = [], []
+    messages = ((x['time'], x['type'], x['raw_value']) for x in commands)
+    for item in streamLoopReport(messages, analyzer):
+        (rows if isinstance(item, PodStateRow) else events).append(item)
+
+    streamState = pd.DataFrame(rows, columns=podStateColumnNames)
+    for name in podStateColumnNames:
+        assert streamState[name].tolist() == podState[name].tolist(), name
+
+    actionTable = matchActionColumns(podState['message_type'].to_numpy(),
+                                     podState['timeCumSec'].to_numpy(),
+                                     podState['SchBasal'].to_numpy(dtype=bool))
+    assert sorted((x.actionId, x.startIdx, x.completed) for x in events) == \
+        sorted(zip(actionTable['actionId'].tolist(), actionTable['startIdx'].tolist(),
+                   actionTable['completed'].tolist()))
+    assert _same(analyzer.getActionSummary(), processActionFrame(actionTable, podState))
+    assert _same(analyzer.faultProcessedMsg, faultProcessedMsg)
+    assert analyzer.emptyMessageList == emptyMessageList
+
+def _streamRows(commands, analyzer):
+    rows = []
+    messages = ((x['time'], x['type'], x['raw_value']) for x in commands)
+    for item in streamLoopReport(messages, analyzer):
+        if isinstance(item, PodStateRow):
+            rows.append(item)
+    return pd.DataFrame(rows, columns=podStateColumnNames)
+
+def test_repeated_TB_lists_are_bounded(tmp_path):
+    filename = os.path.join(str(tmp_path), 'Loop_Report.md')
+    loopReportGenerator.writeReport(filename, podHours=24, seed=1)
+    commands, podDict = read_file(filename)
+    podState = getPodState(generate_table(commands, 30))[0]
+    actionTable = matchActionColumns(podState['message_type'].to_numpy(),
+                                     podState['timeCumSec'].to_numpy(),
+                                     podState['SchBasal'].to_numpy(dtype=bool))
+    batchTB = processActionFrame(actionTable, podState)[0]['TB']
+
+    analyzer = StreamAnalyzer(keepRepeated=3)
+    _streamRows(commands, analyzer)
+    streamTB = analyzer.getActionSummary()[0]['TB']
+    assert batchTB['numRepeatedTB'] > 3
+    for name in ('numRepeatedTB', 'numRepeatedShortTB', 'numrepeated19MinTB'):
+        assert streamTB[name] == batchTB[name], name
+    for name in ('repeatedTB', 'repeatedShortTB', 'repeated19MinTB'):
+        assert _same(streamTB[name], batchTB[name][-3:]), name
+
+def test_status_tail_only_on_the_last_message(tmp_path):
+    filename = os.path.join(str(tmp_path), 'Loop_Report.md')
+    loopReportGenerator.writeReport(filename, podHours=4, seed=2)
+    commands, podDict = read_file(filename)
+    podState = getPodState(generate_table(commands, 30))[0]
+
+    # last message, dropped as analyzeLoopReport does
+    commands[-1]['raw_value'] += '\nstatus:'
+    streamState = _streamRows(commands, StreamAnalyzer())
+    assert streamState['raw_value'].tolist() == podState['raw_value'].tolist()
+    assert streamState['pod_progress'].tolist() == podState['pod_progress'].tolist()
+
+    # on any other message the tail is kept, not hex => both raise
+    commands[-1]['raw_value'] = commands[-1]['raw_value'].replace('\nstatus:', '')
+    commands[10]['raw_value'] += '\nstatus:'
+    with pytest.raises(ValueError):
+        getPodState(generate_table(commands, 30))
+    with pytest.raises(ValueError):
+        _streamRows(commands, StreamAnalyzer())
@@ -0,0 +1,29 @@
+# file: test_summaryAnalysis - summarizeLoopReport gives the results of the full analysis
+import contextlib
+import io
+import os
+
+import numpy as np
+import pytest
+
+import loopReportGenerator
+from summaryAnalysis import summarizeLoopReport, analyzeMessageLogsRev3, formatCsvRow
+
+@pytest.mark.parametrize('kwargs', [
+    dict(podHours=12, seed=1),
+    dict(podHours=12, seed=2, fault=0x14),
+])
+def test_report_result_matches_full_analysis(tmp_path, kwargs):
+    thisFile = 'Loop_Report.md'
+    loopReportGenerator.writeReport(os.path.join(str(tmp_path), thisFile), **kwargs)
+    with contextlib.redirect_stdout(io.StringIO()):
+        fullResult = analyzeMessageLogsRev3(str(tmp_path), thisFile, 0, withDetails=True)[4]
+    reportResult = summarizeLoopReport(str(tmp_path), thisFile, withDetails=True)
+
+    assert fullResult.reportHash == reportResult.reportHash
+    assert fullResult.podDict == reportResult.podDict
+    assert formatCsvRow(fullResult.summaryRecord) == formatCsvRow(reportResult.summaryRecord)
+    assert fullResult.faultProcessedMsg == reportResult.faultProcessedMsg
+    assert sorted(fullResult.actionTable) == sorted(reportResult.actionTable)
+    for name, column in reportResult.actionTable.items():
+        np.testing.assert_array_equal(np.asarray(fullResult.actionTable[name]), column)
@@ -65,6 +65,12 @@ def getPodProgessMeaning(thisInt):
 
 def getUnitsFromPulses(pulses):
     # given number of pulses convert to units of insulin
-    #i = Decimal(0.05 * pulses)
-    insulin = round(0.05 * pulses, 2)
+    #   pulses*5/100 is the same float as round(0.05*pulses, 2), works on arrays
+    insulin = pulses * 5 / 100
     return insulin
+
+def getRateFromTenthPulses(tenthPulses):
+    # TB rate (u/hr) from 1/10th pulses per half hour (1a16 firstEntryX10pulses)
+    #   0.05 u per pulse * 0.1 * 2 half hours per hour = 1/100, works on arrays
+    rate = tenthPulses / 100
+    return rate